@@ -0,0 +1,330 @@
+import argparse
+import os
+import re
+from collections import defaultdict
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from compact_table import CompactTable, ValuePool
+from excel_to_csv import iter_workbook_sheets, read_sheet_rows
+from manifest import MANIFEST_NAME, Manifest, hash_rows, read_params_rows
+from merge_corpus import CATEGORY_COLUMNS, build_corpus, read_done_file, write_corpus
+from output_run import OutputRun
+from pipeline import process_state_rows, write_csv, write_done_file
+from process_states_cleaner import read_params_file
+from run_stats import REPORT_NAME, RunStats, StateStats
+from scheduler import iter_completed
+from special_case_cleaning import load_special_rules
+from workbook_cache import CACHE_DIR, WorkbookCache, open_cache
+from indicator_grammar import REVIEW_NAME, IndicatorGrammar, load_grammars, write_review
+import instrumentation
+
+
+# Run the in-memory pipeline for several school levels (MS, HS, ES, ...) at once.
+#
+# Each level is a workbook, a params file and an output folder; its state files
+# get the level as suffix (AL_HS.csv, AL_HS_done.csv). The states are the sheets
+# named after a state abbreviation in state_mapping.md, so overview tabs are
+# left out without listing them anywhere. A level's special case rules and
+# secondary params and indicator grammar are picked up by name if they exist:
+# HS_special_rules.csv, hs_params_secondary.csv, HS_indicator_grammar.csv.
+#
+# Every workbook is read once, even when several levels share it, and the
+# (level, state) jobs of all levels go to one worker pool as the sheets are read,
+# so reading overlaps with processing and the run takes as long as the work
+# divided by the cores, not one level after another. Reading happens in this
+# process, so clean_string's cache stays warm from one workbook to the next; the
+# workers are kept for the whole run, with the special case rules and regexes
+# they have already built.
+#
+# Each level gets its _done.csv files, manifest, run report and indicator review
+# list as with pipeline.py, written to a run folder and published when the run is done;
+# the combined corpus has a level column in front of the usual corpus columns,
+# and the level in front of every standard ID.
+
+STATE_MAPPING_FILE = "state_mapping.md"
+STATE_PATTERN = re.compile(r"'([^']+)':\s*'([A-Z]{2})'")
+
+
+class Level(NamedTuple):
+    name: str
+    excel_file: str
+    params_file: str
+    output_dir: Path
+
+    @property
+    def suffix(self) -> str:
+        return f"_{self.name}"
+
+
+def load_state_abbreviations(path: str = STATE_MAPPING_FILE) -> Dict[str, str]:
+    """
+    Read state_mapping.md, keyed by abbreviation: {'AL': 'Alabama', ...}
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        return {abbreviation: name for name, abbreviation in STATE_PATTERN.findall(f.read())}
+
+
+def level_file(level: str, pattern: str) -> Optional[str]:
+    """
+    A level's optional file, e.g. level_file("HS", "{}_special_rules.csv"), if it exists.
+    """
+    for name in (pattern.format(level), pattern.format(level.lower())):
+        if os.path.exists(name):
+            return name
+    return None
+
+
+def run_state(rows: List[List[str]], stem: str, file_params: Dict[str, bool], special_rules: Dict[str, list],
+              grammars: Dict[str, IndicatorGrammar], output_dir: Path, checkpoints: bool,
+              keep_rows: bool) -> Tuple[Optional[List[List[str]]], StateStats]:
+    """
+    Worker job: clean one state of one level and write its _done.csv file.
+    Returns the final rows (if keep_rows, for the corpus) and the row counts.
+    """
+    if checkpoints:
+        write_csv(rows, output_dir / f"{stem}.csv", encoding='utf-8-sig')
+    stats = StateStats()
+    rows = process_state_rows(rows, stem, file_params, special_rules, output_dir, checkpoints, stats, grammars)
+    write_done_file(rows, output_dir / f"{stem}_done.csv", stem)
+    return (rows if keep_rows else None), stats
+
+
+class BatchRun:
+    """
+    State of one batch run: per-level params, manifests and results.
+    """
+
+    def __init__(self, levels: List[Level], states: Dict[str, str], transliterate: bool = False,
+                 incremental: bool = True, checkpoints: bool = False, corpus: bool = False,
+                 workbook_cache: Optional[WorkbookCache] = None):
+        self.levels = levels
+        self.states = states
+        self.transliterate = transliterate
+        self.incremental = incremental
+        self.checkpoints = checkpoints
+        self.corpus = corpus
+        self.workbook_cache = workbook_cache
+
+        self.params = {}
+        self.params_rows = {}
+        self.special_rules = {}
+        self.grammars = {}
+        for level in levels:
+            level.output_dir.mkdir(parents=True, exist_ok=True)
+            self.params[level.name] = read_params_file(level.params_file)
+            secondary_params = level_file(level.name, "{}_params_secondary.csv")
+            grammar_file = level_file(level.name, "{}_indicator_grammar.csv")
+            rules_file = level_file(level.name, "{}_special_rules.csv")
+            self.params_rows[level.name] = read_params_rows([level.params_file]
+                                                            + [path for path in (secondary_params, rules_file, grammar_file)
+                                                               if path])
+            self.special_rules[level.name] = load_special_rules(rules_file) if rules_file else {}
+            if grammar_file:
+                self.grammars[level.name] = load_grammars(grammar_file)
+            else:
+                print(f"No {level.name}_indicator_grammar.csv found, {level.name} indicators are split with the default rules")
+                self.grammars[level.name] = {}
+        # Opened by run(), one run folder per level (see output_run)
+        self.output_runs: Dict[str, OutputRun] = {}
+        self.manifests: Dict[str, Manifest] = {}
+
+        # Filled in as the jobs are made; results refer to them by index
+        self.jobs: List[Tuple[Level, str, str, str]] = []
+        self.seen = defaultdict(set)
+        self.skipped = defaultdict(list)
+        self.reused = defaultdict(list)
+        self.missing_params = defaultdict(list)
+        self.pool = ValuePool()
+        self.corpus_rows = defaultdict(list)
+        self.sheet_order = defaultdict(list)
+
+    def iter_jobs(self) -> Iterator[tuple]:
+        """
+        Read every workbook once and yield a run_state job for each (level, state)
+        that needs rebuilding.
+        """
+        workbooks = defaultdict(list)
+        for level in self.levels:
+            workbooks[level.excel_file].append(level)
+
+        for excel_file, levels in workbooks.items():
+            print(f"\nReading workbook {excel_file} ({', '.join(level.name for level in levels)})")
+            for sheet, sheet_rows in iter_workbook_sheets(excel_file, self.transliterate, self.workbook_cache):
+                if sheet not in self.states:
+                    continue
+                with instrumentation.stage('read', sheet) as timed:
+                    rows = read_sheet_rows(sheet_rows)
+                    timed.rows = len(rows)
+                for level in levels:
+                    # process_state_rows fills cells in place, so each level gets its own copy
+                    level_rows = [list(row) for row in rows] if len(levels) > 1 else rows
+                    job = self.make_job(level, sheet, level_rows)
+                    if job is not None:
+                        yield job
+
+    def make_job(self, level: Level, sheet: str, rows: List[List[str]]) -> Optional[tuple]:
+        stem = f"{sheet}{level.suffix}"
+        file_params = self.params[level.name].get(f"{stem}.csv")
+        if file_params is None:
+            self.missing_params[level.name].append(stem)
+            return None
+        self.seen[level.name].add(stem)
+
+        if file_params['skip']:
+            self.skipped[level.name].append(stem)
+            return None
+
+        self.sheet_order[level.name].append(sheet)
+        output_run = self.output_runs[level.name]
+        done_path = output_run.path(f"{stem}_done.csv")
+        sheet_hash = hash_rows(rows)
+        params_hash = hash_rows(self.params_rows[level.name].get(stem, []))
+        if self.incremental and self.manifests[level.name].is_current(stem, sheet_hash, params_hash, done_path):
+            self.reused[level.name].append(stem)
+            if self.corpus:
+                self.corpus_rows[level.name].append((sheet, CompactTable(read_done_file(done_path), self.pool)))
+            return None
+
+        self.manifests[level.name].forget(stem)
+        self.jobs.append((level, sheet, sheet_hash, params_hash))
+        rules = self.special_rules[level.name]
+        grammars = self.grammars[level.name]
+        return (rows, stem, file_params, {stem: rules[stem]} if stem in rules else {},
+                {stem: grammars[stem]} if stem in grammars else {},
+                output_run.directory, self.checkpoints, self.corpus)
+
+    def run(self, workers: int) -> Dict[str, RunStats]:
+        """
+        Run every job and record the results per level. Returns the run stats of each level.
+        """
+        run_stats = {level.name: RunStats() for level in self.levels}
+        self.processed = defaultdict(list)
+        self.failed = defaultdict(list)
+        # Every level's files are published once all the jobs are done
+        with ExitStack() as output_runs:
+            for level in self.levels:
+                output_run = output_runs.enter_context(OutputRun(level.output_dir, resumable=True))
+                self.output_runs[level.name] = output_run
+                self.manifests[level.name] = Manifest(output_run.update(MANIFEST_NAME))
+
+            # Each state is recorded in its level's manifest as soon as it is done, so an
+            # interrupted run only redoes the states that weren't finished
+            results = iter_completed(run_state, self.iter_jobs(), workers)
+            try:
+                for index, result, error in results:
+                    level, sheet, sheet_hash, params_hash = self.jobs[index]
+                    stem = f"{sheet}{level.suffix}"
+                    if error is not None:
+                        # The last run's _done.csv is withdrawn too, so the corpus doesn't pick it up
+                        print(f"Error processing {stem}: {str(error)}")
+                        self.failed[level.name].append(stem)
+                        self.output_runs[level.name].remove(f"{stem}_done.csv")
+                        run_stats[level.name].fail(stem, error)
+                        continue
+                    rows, stats = result
+                    self.manifests[level.name].record(stem, sheet_hash, params_hash,
+                                                      self.output_runs[level.name].directory / f"{stem}_done.csv")
+                    run_stats[level.name].add(stem, stats)
+                    self.processed[level.name].append(stem)
+                    if self.corpus:
+                        self.corpus_rows[level.name].append((sheet, CompactTable(rows, self.pool)))
+            finally:
+                # Stops the queued jobs if the run is interrupted
+                results.close()
+
+            for level in self.levels:
+                output_run = self.output_runs[level.name]
+                run_stats[level.name].save(output_run.update(REPORT_NAME))
+                write_review(run_stats[level.name].review, output_run.update(REVIEW_NAME))
+                for state_file in self.params[level.name]:
+                    if Path(state_file).stem not in self.seen[level.name]:
+                        print(f"Warning: Sheet not found for {state_file} in {level.excel_file}")
+        return run_stats
+
+    def build_corpus(self) -> pd.DataFrame:
+        """
+        One corpus for all levels, with a level column. Standard IDs are made per
+        level, as in each level's own corpus, and get the level in front
+        ("HS-CA-3f9a0c51d2e7") so the same indicator in two levels has two IDs.
+        """
+        corpora = []
+        for level in self.levels:
+            # States in workbook order, whether they were rebuilt or reused
+            order = {sheet: index for index, sheet in enumerate(self.sheet_order[level.name])}
+            rows = sorted(self.corpus_rows[level.name], key=lambda item: order[item[0]])
+            if not rows:
+                continue
+            corpus = build_corpus(rows)
+            corpus.insert(0, 'level', level.name)
+            corpus['standard_id'] = f"{level.name}-" + corpus['standard_id']
+            corpora.append(corpus)
+
+        if not corpora:
+            # No level has rows (every state skipped or failed): an empty corpus with the usual columns
+            corpus = build_corpus([])
+            corpus.insert(0, 'level', '')
+            corpora.append(corpus)
+
+        corpus = pd.concat(corpora, ignore_index=True)
+        for column in ['level'] + CATEGORY_COLUMNS:
+            corpus[column] = corpus[column].astype(str).astype('category')
+        return corpus
+
+    def print_summary(self) -> None:
+        print(f"\n{'='*60}")
+        print(f"Batch run complete!")
+        print(f"{'level':8} {'processed':>10} {'reused':>8} {'skipped':>8} {'failed':>8}")
+        for level in self.levels:
+            print(f"{level.name:8} {len(self.processed[level.name]):>10} {len(self.reused[level.name]):>8} "
+                  f"{len(self.skipped[level.name]):>8} {len(self.failed[level.name]):>8}")
+        for level in self.levels:
+            if self.missing_params[level.name]:
+                print(f"{level.name} sheets without a params row: {', '.join(self.missing_params[level.name])}")
+        print(f"{'='*60}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the in-memory pipeline for several school levels at once")
+    parser.add_argument("--level", nargs=4, action="append", metavar=('LEVEL', 'EXCEL_FILE', 'PARAMS_FILE', 'OUTPUT_DIR'),
+                        help="a level to run, e.g. --level HS \"2026-03-01 High School Data.xlsx\" HS_params.csv hs_2026; "
+                             "give it once per level")
+    parser.add_argument("--state-mapping", default=STATE_MAPPING_FILE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes shared by all levels (default: one per core)")
+    parser.add_argument("--corpus", help="also merge every level and state into this corpus file")
+    parser.add_argument("--checkpoints", action="store_true",
+                        help="also write the intermediate state, _edited and _00 files")
+    parser.add_argument("--transliterate", action="store_true",
+                        help="keep curly quotes and dashes as ASCII quotes and dashes instead of spaces")
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild every state, even if its sheet and params are unchanged")
+    parser.add_argument("--workbook-cache", default=CACHE_DIR,
+                        help="folder of the parsed-workbook cache (see workbook_cache); '' to parse the workbook every time")
+    parser.add_argument("--run-log", help="append timing and memory records of every stage and state to this JSON lines file")
+    parser.add_argument("--summary", action="store_true", help="print a table of the run log at the end")
+    args = parser.parse_args()
+    if args.run_log:
+        instrumentation.enable(args.run_log)
+
+    level_args = args.level or [["MS", "2026-02-27 Middle School Data.xlsx", "MS_params.csv", "ms_2026"]]
+    levels = [Level(name, excel_file, params_file, Path(output_dir))
+              for name, excel_file, params_file, output_dir in level_args]
+
+    batch = BatchRun(levels, load_state_abbreviations(args.state_mapping), args.transliterate,
+                     not args.full, args.checkpoints, bool(args.corpus),
+                     open_cache(args.workbook_cache))
+    batch.run(args.workers)
+    if args.corpus:
+        print()
+        write_corpus(batch.build_corpus(), args.corpus)
+    batch.print_summary()
+    if args.summary:
+        instrumentation.print_summary()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+import argparse
+import csv
+import json
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import pandas as pd
+
+from excel_to_csv import clean_string, clean_text
+from indicator_grammar import IndicatorGrammar, grammar_file, load_grammars
+from output_run import current_path
+from process_states_cleaner import (fill_empty_cells, process_split_indicators, read_params_file,
+                                    transpose_columns)
+from special_case_cleaning import apply_special_rules, load_special_rules
+from secondary_cleaning import concat_extra_columns, normalize_na, pad_rows
+
+
+# Benchmark every cleaning step on synthetic state sheets at 1x, 10x and 100x
+# the size of today's sheets.
+#
+# The synthetic sheets are built from real _MS.csv files used as templates:
+# CA (wide, transposed), HI (long) and the special case states. At scale N each
+# template's standard rows are repeated N times; every copy gets a marker word
+# after the first word of each text cell, so the copies are distinct (clean_text's
+# cache can't short-cut them) while indicator prefixes and the delimiters the
+# special case rules split on stay where they were.
+#
+# Each step is timed once without tracing (wall time, rows/sec) and once under
+# tracemalloc (peak memory). For clean_text the "rows" are cells. Results are appended to a JSON lines file together
+# with the date, git commit and Python version, so runs can be compared over time.
+
+TEMPLATE_STATES = ['CA', 'HI', 'AL', 'KY', 'MN', 'MO', 'MA', 'OH']
+RESULTS_FILE = "benchmark_results.jsonl"
+SEED = 20260406
+
+
+def read_template(path: Path) -> List[List[str]]:
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.reader(f))
+
+
+def _mark(cell: str, copy: int) -> str:
+    if copy == 0 or ' ' not in cell:
+        return cell
+    first, rest = cell.split(' ', 1)
+    return f"{first} c{copy} {rest}"
+
+
+def synthetic_sheet(template: List[List[str]], scale: int, rng: random.Random) -> List[List[str]]:
+    """
+    A sheet shaped like the template with its standard rows repeated scale times.
+    Copies keep the template's blank cells and rows (which the fill step relies on)
+    and come in shuffled blocks so keywords don't just repeat in order.
+    """
+    for index, row in enumerate(template):
+        if row and row[0] == "Keyword":
+            head, body = template[:index + 1], template[index + 1:]
+            break
+    else:
+        head, body = [], template
+
+    rows = [list(row) for row in head]
+    blocks = list(range(scale))
+    rng.shuffle(blocks)
+    for copy in blocks:
+        for row in body:
+            rows.append([cell if column < 2 else _mark(cell, copy) for column, cell in enumerate(row)])
+    return rows
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func: Callable[[], int]) -> Dict[str, float]:
+    """
+    Run func (which returns the number of rows it handled) once for time and once for peak memory.
+    """
+    start = time.perf_counter()
+    rows = func()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'rows': rows,
+        'seconds': round(seconds, 6),
+        'rows_per_sec': round(rows / seconds, 1) if seconds > 0 else None,
+        'peak_mb': round(peak / 2**20, 3),
+    }
+
+
+def _cells(sheets: Dict[str, List[List[str]]]) -> int:
+    clean_string.cache_clear()
+    count = 0
+    for rows in sheets.values():
+        for row in rows:
+            for cell in row:
+                clean_text(cell)
+                count += 1
+    return count
+
+
+def _stream(step: Callable, sheets: Dict[str, List[List[str]]], *args) -> int:
+    # fill_empty_cells changes rows in place, so every run gets fresh copies
+    count = 0
+    for rows in sheets.values():
+        for _ in step((list(row) for row in rows), *args):
+            count += 1
+    return count
+
+
+def benchmark_scale(templates: Dict[str, List[List[str]]], params: Dict[str, Dict[str, bool]],
+                    rules: Dict[str, list], scale: int, stages: Optional[List[str]] = None,
+                    grammars: Optional[Dict[str, IndicatorGrammar]] = None) -> List[dict]:
+    """
+    Time every step on the templates repeated scale times. States in grammars
+    are split with their own indicator grammar.
+    """
+    grammars = grammars or {}
+    rng = random.Random(SEED)
+    raw = {state: synthetic_sheet(rows, scale, rng) for state, rows in templates.items()}
+
+    # Each step gets the output of the steps before it, as in process_states_cleaner
+    state_params = {state: params[f"{state}_MS.csv"] for state in raw}
+    filled = {state: [list(row) for row in fill_empty_cells([list(row) for row in rows])]
+              for state, rows in raw.items() if state_params[state]['fill']}
+    to_transpose = {state: filled.get(state, raw[state]) for state in raw if state_params[state]['transpose']}
+    transposed = {state: list(transpose_columns(rows)) for state, rows in to_transpose.items()}
+    to_split = {state: transposed.get(state, filled.get(state, raw[state]))
+                for state in raw if state_params[state]['split']}
+    edited = {}
+    for state in raw:
+        rows = transposed.get(state, filled.get(state, raw[state]))
+        if state_params[state]['split']:
+            rows = list(process_split_indicators(rows, state_params[state]['transpose'],
+                                                 grammars.get(f"{state}_MS")))
+        edited[state] = rows
+    cleaned = {state: list(apply_special_rules(rows, rules.get(f"{state}_MS", [])))
+               for state, rows in edited.items()}
+
+    steps = {
+        'clean_text': lambda: _cells(raw),
+        'fill_empty_cells': lambda: _stream(fill_empty_cells, raw),
+        'transpose_columns': lambda: _stream(transpose_columns, to_transpose),
+        'process_split_indicators': lambda: sum(_stream(process_split_indicators, {state: rows},
+                                                        state_params[state]['transpose'],
+                                                        grammars.get(f"{state}_MS"))
+                                                for state, rows in to_split.items()),
+    }
+    for state, rows in edited.items():
+        state_rules = rules.get(f"{state}_MS")
+        if state_rules:
+            steps[f"special:{state}_MS"] = (lambda rows=rows, state_rules=state_rules:
+                                            _stream(apply_special_rules, {'': rows}, state_rules))
+    steps['secondary_concat'] = lambda: sum(
+        len(concat_extra_columns(normalize_na(pd.DataFrame(pad_rows(rows), dtype=str))))
+        for rows in cleaned.values() if rows)
+
+    results = []
+    for name, func in steps.items():
+        if stages and not any(name.startswith(stage) for stage in stages):
+            continue
+        result = {'stage': name, 'scale': scale, **measure(func)}
+        results.append(result)
+        print(f"  {name:28} {result['rows']:>9} rows  {result['seconds']:>9.4f}s  "
+              f"{result['rows_per_sec'] or 0:>12,.0f} rows/s  {result['peak_mb']:>8.2f} MB")
+    return results
+
+
+def previous_run(results_file: Path) -> Dict[tuple, dict]:
+    """
+    Results of the last run saved in the results file, keyed by (stage, scale).
+    """
+    if not results_file.exists():
+        return {}
+    with open(results_file, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        return {}
+    last = records[-1]['run']
+    return {(record['stage'], record['scale']): record for record in records if record['run'] == last}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cleaning steps on synthetic sheets")
+    parser.add_argument("--scales", type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument("--templates", default="ms_2026", help="folder with the template _MS.csv files")
+    parser.add_argument("--params-file", default="MS_params.csv")
+    parser.add_argument("--special-rules-file", default="MS_special_rules.csv")
+    parser.add_argument("--indicator-grammar-file", default=grammar_file)
+    parser.add_argument("--stage", action="append", help="only run stages starting with this name")
+    parser.add_argument("--output", default=RESULTS_FILE, help="JSON lines file the results are appended to")
+    args = parser.parse_args()
+
+    templates = {}
+    for state in TEMPLATE_STATES:
+        path = current_path(args.templates, f"{state}_MS.csv")
+        if path.exists():
+            templates[state] = read_template(path)
+        else:
+            print(f"Warning: template {path} not found")
+    params = read_params_file(args.params_file)
+    rules = load_special_rules(args.special_rules_file)
+    grammars = load_grammars(args.indicator_grammar_file)
+
+    output = Path(args.output)
+    previous = previous_run(output)
+    run = {
+        'run': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+    }
+
+    results = []
+    for scale in args.scales:
+        print(f"\nScale {scale}x")
+        results.extend(benchmark_scale(templates, params, rules, scale, args.stage, grammars))
+
+    with open(output, 'a', encoding='utf-8') as f:
+        for result in results:
+            f.write(json.dumps({**run, **result}) + '\n')
+    print(f"\nResults appended to {output}")
+
+    if previous:
+        print(f"\nCompared with the previous run ({next(iter(previous.values()))['run']}):")
+        for result in results:
+            before = previous.get((result['stage'], result['scale']))
+            if before and before['seconds']:
+                print(f"  {result['stage']:28} {result['scale']:>4}x  {result['seconds'] / before['seconds']:6.2f}x time")
+
+
+if __name__ == "__main__":
+    main()
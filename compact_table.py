@@ -0,0 +1,138 @@
+from array import array
+from typing import Iterable, Iterator, List, Optional, Union
+
+
+# A compact in-memory table for rows that are held for a while (e.g. every
+# state's rows kept for the corpus at the end of a pipeline run).
+#
+# After fill and transpose most cells repeat the row above (keyword, grade,
+# course), and a list of Python lists costs a list object and a pointer per cell
+# for every row. Here each column keeps a dictionary of its distinct values, and
+# each row is stored as one small integer code per column in typed arrays. Code 0
+# is always ''. Rows keep their own width, so ragged rows come back exactly as
+# they went in; strings are only put back together when rows are read out.
+#
+# States can share one ValuePool, so a keyword used by every state is stored once.
+
+CODE_TYPE = 'I'
+WIDTH_TYPE = 'H'
+
+
+class ValuePool:
+    """
+    Per-column dictionaries of distinct values: value -> code and code -> value.
+    """
+    __slots__ = ('codes', 'values')
+
+    def __init__(self):
+        self.codes = []
+        self.values = []
+
+    def encode(self, column: int, value: str) -> int:
+        while column >= len(self.codes):
+            self.codes.append({'': 0})
+            self.values.append([''])
+        codes = self.codes[column]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.values[column])
+            self.values[column].append(value)
+        return code
+
+    def __len__(self) -> int:
+        return sum(len(values) for values in self.values)
+
+
+class RowView:
+    """
+    One row of a CompactTable, read without building a list.
+    """
+    __slots__ = ('table', 'index')
+
+    def __init__(self, table: 'CompactTable', index: int):
+        self.table = table
+        self.index = index
+
+    def __len__(self) -> int:
+        return self.table.widths[self.index]
+
+    def __getitem__(self, column: Union[int, slice]):
+        if isinstance(column, slice):
+            return self.to_list()[column]
+        if column < 0:
+            column += len(self)
+        if not 0 <= column < len(self):
+            raise IndexError("row index out of range")
+        return self.table.pool.values[column][self.table.columns[column][self.index]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.to_list())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, RowView):
+            other = other.to_list()
+        return self.to_list() == other
+
+    def to_list(self) -> List[str]:
+        return self.table.row(self.index)
+
+    def __repr__(self) -> str:
+        return f"RowView({self.to_list()!r})"
+
+
+class CompactTable:
+    """
+    Rows of strings stored as per-column integer codes.
+    """
+    __slots__ = ('pool', 'widths', 'columns')
+
+    def __init__(self, rows: Iterable[List[str]] = (), pool: Optional[ValuePool] = None):
+        self.pool = pool if pool is not None else ValuePool()
+        self.widths = array(WIDTH_TYPE)
+        self.columns = []
+        self.extend(rows)
+
+    def append(self, row: List[str]) -> None:
+        count = len(self.widths)
+        while len(row) > len(self.columns):
+            # A new column starts out as '' for the rows already stored
+            self.columns.append(array(CODE_TYPE, bytes(array(CODE_TYPE).itemsize * count)))
+
+        encode = self.pool.encode
+        for column, codes in enumerate(self.columns):
+            codes.append(encode(column, row[column]) if column < len(row) else 0)
+        self.widths.append(len(row))
+
+    def extend(self, rows: Iterable[List[str]]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def __len__(self) -> int:
+        return len(self.widths)
+
+    def row(self, index: int) -> List[str]:
+        """
+        Materialize one row as a list of strings.
+        """
+        values = self.pool.values
+        columns = self.columns
+        return [values[column][columns[column][index]] for column in range(self.widths[index])]
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            return [self.row(i) for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("table index out of range")
+        return RowView(self, index)
+
+    def __iter__(self) -> Iterator[List[str]]:
+        for index in range(len(self)):
+            yield self.row(index)
+
+    def nbytes(self) -> int:
+        """
+        Size of the code arrays (the shared dictionaries are not counted).
+        """
+        return self.widths.itemsize * len(self.widths) + sum(codes.itemsize * len(codes) for codes in self.columns)
@@ -0,0 +1,324 @@
+import argparse
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from grades import GRADE_NAMES, parse_grades
+from merge_corpus import is_arrow_path
+
+
+# Query the merged corpus from Python without loading it all:
+#
+#     from corpus_query import Corpus
+#     corpus = Corpus.open("ms_corpus.parquet")
+#     query = corpus.filter(state=["AL", "GA"], grade=7, keyword="Islam").text_contains("pilgrimage")
+#     len(query); query.to_frame(); for standard in query: ...
+#
+# The corpus file is memory-mapped and each column is only read the first time a
+# query needs it. Filters on state, keyword, course (and level, in a batch_runner
+# corpus) and on the normalized grades use indexes instead of a scan:
+#   - per column, the row numbers sorted by value and the offset of each value's
+#     block in them, plus a value -> block lookup, so the rows of a value are one
+#     dictionary lookup and one slice
+#   - per grade level, the rows whose grade_mask covers it
+# The indexes are built the first time a corpus is opened and saved next to it
+# (<corpus>.index.npz); they are rebuilt when the corpus file changes.
+#
+# A query is a sorted array of row numbers; filters narrow it down. Results come
+# back as a DataFrame or as dicts streamed in batches.
+
+INDEX_VERSION = 1
+INDEXED_COLUMNS = ['level', 'state', 'keyword', 'course']
+GRADE_COLUMN = 'grade_mask'
+BATCH_ROWS = 10000
+
+Values = Union[str, Iterable[str]]
+
+
+def index_path(corpus_path: str) -> Path:
+    return Path(f"{corpus_path}.index.npz")
+
+
+class ValueIndex:
+    """
+    Row numbers of one column sorted by value, with a value -> block lookup.
+    """
+
+    def __init__(self, values: List[str], order: np.ndarray, offsets: np.ndarray):
+        self.values = values
+        self.codes = {value: code for code, value in enumerate(values)}
+        self.order = order
+        self.offsets = offsets
+
+    @classmethod
+    def build(cls, column: pa.ChunkedArray) -> 'ValueIndex':
+        column = column.combine_chunks()
+        if not pa.types.is_dictionary(column.type):
+            column = column.dictionary_encode()
+        column = column.cast(pa.dictionary(pa.int32(), pa.string()))
+        codes = column.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+        values = column.dictionary.to_pylist()
+
+        # A stable sort keeps the rows of each value in row order
+        order = np.argsort(codes, kind='stable').astype(np.int64)
+        offsets = np.searchsorted(codes[order], np.arange(len(values) + 1))
+        return cls(values, order, offsets)
+
+    def rows(self, values: Values) -> np.ndarray:
+        """
+        Sorted row numbers of the rows holding any of the values.
+        """
+        if isinstance(values, str):
+            values = [values]
+        blocks = [self.order[self.offsets[code]:self.offsets[code + 1]]
+                  for code in (self.codes.get(value) for value in values) if code is not None]
+        if not blocks:
+            return np.empty(0, dtype=np.int64)
+        if len(blocks) == 1:
+            return blocks[0]
+        return np.sort(np.concatenate(blocks))
+
+    def counts(self) -> Dict[str, int]:
+        return {value: int(self.offsets[code + 1] - self.offsets[code]) for code, value in enumerate(self.values)}
+
+
+class Corpus:
+    """
+    A merged corpus file (see merge_corpus) opened for querying.
+    """
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        self._loaded: Dict[str, pa.ChunkedArray] = {}
+        if is_arrow_path(self.path):
+            with pa.memory_map(self.path) as source:
+                reader = pa.ipc.open_file(source)
+                self.columns = reader.schema.names
+                # Batch lengths come from the file's metadata; no column is read
+                self.num_rows = sum(reader.get_batch(i).num_rows for i in range(reader.num_record_batches))
+        else:
+            self._parquet = pq.ParquetFile(self.path, memory_map=True)
+            self.columns = self._parquet.schema_arrow.names
+            self.num_rows = self._parquet.metadata.num_rows
+        self.indexes: Dict[str, ValueIndex] = {}
+        self.grade_rows: List[np.ndarray] = []
+
+    @classmethod
+    def open(cls, path: str) -> 'Corpus':
+        """
+        Open a corpus file, loading its indexes or building (and saving) them.
+        """
+        corpus = cls(path)
+        if not corpus._load_indexes():
+            corpus._build_indexes()
+            corpus._save_indexes()
+        return corpus
+
+    def column(self, name: str) -> pa.ChunkedArray:
+        """
+        One column of the corpus, read on first use.
+        """
+        if name not in self._loaded:
+            if is_arrow_path(self.path):
+                table = feather.read_table(self.path, columns=[name], memory_map=True)
+            else:
+                table = self._parquet.read(columns=[name])
+            self._loaded[name] = table.column(name)
+        return self._loaded[name]
+
+    def _file_key(self) -> np.ndarray:
+        stat = os.stat(self.path)
+        return np.array([INDEX_VERSION, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+    def _build_indexes(self) -> None:
+        for name in INDEXED_COLUMNS:
+            if name in self.columns:
+                self.indexes[name] = ValueIndex.build(self.column(name))
+        if GRADE_COLUMN in self.columns:
+            masks = self.column(GRADE_COLUMN).to_numpy()
+            self.grade_rows = [np.flatnonzero(masks & (1 << grade)) for grade in range(len(GRADE_NAMES))]
+
+    def _save_indexes(self) -> None:
+        arrays = {'key': self._file_key()}
+        for name, index in self.indexes.items():
+            arrays[f"{name}.values"] = np.array(index.values, dtype=str)
+            arrays[f"{name}.order"] = index.order
+            arrays[f"{name}.offsets"] = index.offsets
+        for grade, rows in enumerate(self.grade_rows):
+            arrays[f"grade.{grade}"] = rows
+        try:
+            with open(index_path(self.path), 'wb') as f:
+                np.savez(f, **arrays)
+        except OSError as e:
+            print(f"Could not save the corpus indexes: {e}")
+
+    def _load_indexes(self) -> bool:
+        path = index_path(self.path)
+        if not path.exists():
+            return False
+        with np.load(path, allow_pickle=False) as data:
+            if not np.array_equal(data['key'], self._file_key()):
+                return False
+            for name in INDEXED_COLUMNS:
+                if f"{name}.values" in data:
+                    self.indexes[name] = ValueIndex(data[f"{name}.values"].tolist(), data[f"{name}.order"],
+                                                    data[f"{name}.offsets"])
+            self.grade_rows = [data[f"grade.{grade}"] for grade in range(len(GRADE_NAMES)) if f"grade.{grade}" in data]
+        return True
+
+    def all(self) -> 'Query':
+        return Query(self, np.arange(self.num_rows, dtype=np.int64))
+
+    def filter(self, **filters) -> 'Query':
+        """
+        Query of the standards matching every filter; see Query.filter.
+        """
+        return self.all().filter(**filters)
+
+    def values(self, name: str) -> Dict[str, int]:
+        """
+        The distinct values of an indexed column with their number of standards.
+        """
+        return self.indexes[name].counts()
+
+
+class Query:
+    """
+    A selection of corpus rows (sorted row numbers), narrowed down by filters.
+    """
+
+    def __init__(self, corpus: Corpus, rows: np.ndarray):
+        self.corpus = corpus
+        self.rows = rows
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def filter(self, grade: Union[int, str, Iterable[int], None] = None, all_grades: bool = False,
+               **filters: Values) -> 'Query':
+        """
+        Keep the rows where each named column holds the value (or any of the
+        values, for a list): filter(state="AL", keyword=["Islam", "Muslim"]).
+        grade takes a grade number, a list of them, or a grade string parsed like
+        the grade column ("6-8", "K"); rows covering any of them match, or all of
+        them with all_grades=True.
+        Indexed columns use the indexes; other columns are compared row by row.
+        """
+        rows = self.rows
+        for name, values in filters.items():
+            if name in self.corpus.indexes:
+                matching = self.corpus.indexes[name].rows(values)
+                # Nothing to intersect with while the query still holds every row
+                rows = matching if len(rows) == self.corpus.num_rows else np.intersect1d(rows, matching, assume_unique=True)
+            else:
+                if isinstance(values, str):
+                    values = [values]
+                column = self.corpus.column(name).take(pa.array(rows))
+                keep = pc.is_in(column.cast(pa.string()), value_set=pa.array(list(values), type=pa.string()))
+                rows = rows[keep.to_numpy(zero_copy_only=False)]
+
+        if grade is not None:
+            if not self.corpus.grade_rows:
+                raise ValueError(f"{self.corpus.path} has no {GRADE_COLUMN} column to filter grades on")
+            grade_rows = [self.corpus.grade_rows[number] for number in _grade_numbers(grade)]
+            if not grade_rows:
+                rows = rows[:0]
+            elif all_grades:
+                for matching in grade_rows:
+                    rows = np.intersect1d(rows, matching, assume_unique=True)
+            else:
+                rows = np.intersect1d(rows, np.unique(np.concatenate(grade_rows)), assume_unique=True)
+        return Query(self.corpus, rows)
+
+    def text_contains(self, text: str, column: str = 'standard', case: bool = False, regex: bool = False) -> 'Query':
+        """
+        Keep the rows whose standard text (or another column) contains the text,
+        ignoring case unless case=True. With regex=True the text is a regular expression.
+        """
+        values = self.corpus.column(column).take(pa.array(self.rows)).cast(pa.string())
+        match = pc.match_substring_regex if regex else pc.match_substring
+        keep = match(values, pattern=text, ignore_case=not case).fill_null(False)
+        return Query(self.corpus, self.rows[keep.to_numpy(zero_copy_only=False)])
+
+    def head(self, count: int = 10) -> 'Query':
+        return Query(self.corpus, self.rows[:count])
+
+    def _table(self, rows: np.ndarray, columns: Optional[List[str]]) -> pa.Table:
+        columns = columns or self.corpus.columns
+        indices = pa.array(rows)
+        return pa.table({name: self.corpus.column(name).take(indices) for name in columns})
+
+    def to_frame(self, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        The matching standards as a DataFrame (index = row number in the corpus).
+        """
+        frame = self._table(self.rows, columns).to_pandas()
+        frame.index = self.rows
+        return frame
+
+    def iter_rows(self, columns: Optional[List[str]] = None, batch_rows: int = BATCH_ROWS) -> Iterator[dict]:
+        """
+        Stream the matching standards as dicts, reading batch_rows at a time.
+        """
+        for start in range(0, len(self.rows), batch_rows):
+            yield from self._table(self.rows[start:start + batch_rows], columns).to_pylist()
+
+    def __iter__(self) -> Iterator[dict]:
+        return self.iter_rows()
+
+    def count_by(self, name: str) -> Dict[str, int]:
+        """
+        Number of matching standards per value of a column, largest first.
+        """
+        counts = pc.value_counts(self.corpus.column(name).take(pa.array(self.rows)).cast(pa.string()))
+        return dict(sorted(((item['values'], item['counts']) for item in counts.to_pylist()), key=lambda item: -item[1]))
+
+
+def _grade_numbers(grade: Union[int, str, Iterable[int]]) -> List[int]:
+    if isinstance(grade, str):
+        return sorted(parse_grades(grade))
+    numbers = [int(grade)] if isinstance(grade, (int, np.integer)) else [int(number) for number in grade]
+    for number in numbers:
+        if not 0 <= number < len(GRADE_NAMES):
+            raise ValueError(f"grade {number} is out of range: grade numbers go from 0 ({GRADE_NAMES[0]}) "
+                             f"to {len(GRADE_NAMES) - 1}")
+    return numbers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the merged corpus")
+    parser.add_argument("--corpus", default="ms_corpus.parquet")
+    parser.add_argument("--state", action="append", help="can be given more than once")
+    parser.add_argument("--keyword", action="append", help="can be given more than once")
+    parser.add_argument("--course", action="append")
+    parser.add_argument("--level", action="append")
+    parser.add_argument("--grade", help="e.g. 7, 6-8 or K")
+    parser.add_argument("--text", help="only standards whose text contains this (ignoring case)")
+    parser.add_argument("--output", help="save the matching standards to this CSV file")
+    parser.add_argument("--limit", type=int, default=20, help="number of standards to print")
+    args = parser.parse_args()
+
+    corpus = Corpus.open(args.corpus)
+    filters = {name: getattr(args, name) for name in ('state', 'keyword', 'course', 'level') if getattr(args, name)}
+    query = corpus.filter(grade=args.grade, **filters)
+    if args.text:
+        query = query.text_contains(args.text)
+
+    print(f"{len(query)} of {corpus.num_rows} standards match")
+    for standard in query.head(args.limit):
+        print(f"  {standard['state']:3} {str(standard['grade'])[:12]:12} {standard['indicator'][:16]:16} "
+              f"{standard['standard'][:80]}")
+    if args.output:
+        query.to_frame().to_csv(args.output, index=False, encoding='utf-8')
+        print(f"Saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
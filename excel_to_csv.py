@@ -1,6 +1,13 @@
 import pandas as pd
 import os
+import csv
 import unicodedata
+from functools import lru_cache
+from openpyxl import load_workbook
+
+from instrumentation import stage
+from output_run import OutputRun
+from workbook_cache import CACHE_DIR, open_cache
 
 
 ### KNOWN ISSUE: when viewing the resulting CSV files in excel, 
@@ -8,6 +15,57 @@ import unicodedata
 ## to prevent, view the CSV in another application. 
 ## Do not try to change the data type in excel, it will not translate it back to the range appropriately
 
+# Size of the cleaned-string cache shared by every sheet (and workbook) in a run
+CLEAN_CACHE_SIZE = 65536
+
+# Typographic characters that lossless transliteration keeps as their ASCII
+# equivalent instead of turning into a space
+TRANSLITERATIONS = str.maketrans({
+    '\u2018': "'", '\u2019': "'", '\u201a': "'", '\u201b': "'", '\u2032': "'",
+    '\u201c': '"', '\u201d': '"', '\u201e': '"', '\u201f': '"', '\u2033': '"',
+    '\u00ab': '"', '\u00bb': '"',
+    '\u2010': '-', '\u2011': '-', '\u2012': '-', '\u2013': '-', '\u2014': '-',
+    '\u2015': '-', '\u2212': '-',
+    '\u2022': '-', '\u00b7': '-',
+})
+
+
+class _NonAsciiToSpace(dict):
+    """
+    str.translate table that maps every non-ASCII character to a space and
+    leaves ASCII characters alone. Entries are added the first time a character is seen.
+    """
+    def __missing__(self, key):
+        if key < 128:
+            raise LookupError(key)
+        self[key] = ' '
+        return ' '
+
+
+NON_ASCII_TO_SPACE = _NonAsciiToSpace()
+
+
+@lru_cache(maxsize=CLEAN_CACHE_SIZE)
+def clean_string(text, transliterate=False):
+    """
+    Cached cleaning of a single string; see clean_text.
+    With transliterate=True, curly quotes, dashes and bullets become their ASCII
+    equivalent instead of a space.
+    """
+    if not text.isascii():
+        if transliterate:
+            text = text.translate(TRANSLITERATIONS)
+
+        # Normalize Unicode characters
+        normalized = unicodedata.normalize('NFKD', text)
+
+        # Replace any remaining non-ASCII characters with a space
+        text = normalized.translate(NON_ASCII_TO_SPACE)
+
+    # Remove multiple spaces
+    return ' '.join(text.split())
+
+
 def clean_text(text):
     """
     Clean text by removing or replacing problematic characters.
@@ -17,19 +75,112 @@ def clean_text(text):
         return text
     
     # Convert to string if not already
-    text = str(text)
-    
-    # Normalize Unicode characters
-    normalized = unicodedata.normalize('NFKD', text)
-    
-    # Replace or remove problematic characters
-    # Keep only ASCII characters, replace others with closest equivalent
-    cleaned = ''.join(char if ord(char) < 128 else ' ' for char in normalized)
-    
-    # Remove multiple spaces
-    cleaned = ' '.join(cleaned.split())
-    
-    return cleaned
+    return clean_string(str(text))
+
+
+def clean_values(values, transliterate=False):
+    """
+    Clean a batch of cell values, cleaning each distinct value only once.
+    Returns a list of strings in the same order.
+    """
+    # Keyed by type too: True, 1 and 1.0 are equal as dict keys but not as text
+    cleaned = {}
+    for value in values:
+        key = (type(value), value)
+        if key not in cleaned:
+            cleaned[key] = cell_to_text(value, transliterate)
+    return [cleaned[(type(value), value)] for value in values]
+
+
+# Rows 2-4 of every sheet hold metadata (last updated, document length, format)
+# and are dropped; row 1 (state name) and everything from the Keyword row on is kept
+DROPPED_ROWS = {1, 2, 3}
+
+
+# Strings pd.read_excel treats as missing by default; these cells come out empty
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+
+
+def cell_to_text(value, transliterate=False):
+    """
+    Convert a raw cell value to the cleaned string pd.read_excel(dtype=str) + clean_text would give.
+    Empty cells become ''.
+    """
+    if value is None or (isinstance(value, str) and value in NA_STRINGS):
+        return ''
+
+    # Whole-number floats are written without the trailing .0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+
+    return clean_string(str(value), transliterate)
+
+
+def iter_sheet_rows(worksheet, transliterate=False):
+    """
+    Stream the rows of a worksheet, dropping the metadata rows and cleaning each cell.
+    Trailing empty cells and trailing empty rows are left out, like pd.read_excel does.
+    """
+    return iter_grid_rows(worksheet.iter_rows(values_only=True), transliterate)
+
+
+def iter_grid_rows(grid, transliterate=False):
+    """
+    iter_sheet_rows for rows of raw cell values, from a worksheet or the workbook cache.
+    """
+    blank_rows = 0
+    for index, row in enumerate(grid):
+        if index in DROPPED_ROWS:
+            continue
+
+        # Trim trailing empty cells
+        end = len(row)
+        while end and (row[end - 1] is None or row[end - 1] == ''):
+            end -= 1
+
+        if not end:
+            # Hold blank rows back until we know they are not trailing
+            blank_rows += 1
+            continue
+
+        for _ in range(blank_rows):
+            yield []
+        blank_rows = 0
+
+        yield clean_values(row[:end], transliterate)
+
+
+def iter_workbook_sheets(excel_file, transliterate=False, cache=None):
+    """
+    Open the workbook once in read-only mode and yield (sheet name, row generator)
+    for every sheet. Each sheet's rows must be consumed before moving on to the next sheet.
+    Pass transliterate=True to keep curly quotes and dashes as ASCII quotes and dashes.
+    With a WorkbookCache (see workbook_cache), the sheets are read from the cache
+    when it has this workbook, and saved to it when it doesn't.
+    """
+    if cache is not None:
+        for sheet, grid in cache.iter_raw_sheets(excel_file):
+            yield sheet, iter_grid_rows(grid, transliterate)
+        return
+
+    workbook = load_workbook(excel_file, read_only=True, data_only=True, keep_links=False)
+    try:
+        for sheet in workbook.sheetnames:
+            yield sheet, iter_sheet_rows(workbook[sheet], transliterate)
+    finally:
+        workbook.close()
+
+
+def read_sheet_rows(rows):
+    """
+    Collect a sheet's streamed rows, padded to the same width as a DataFrame would be.
+    """
+    rows = list(rows)
+    width = max((len(row) for row in rows), default=0)
+    return [row + [''] * (width - len(row)) for row in rows]
 
 
 def convert_excel_sheets_to_csv():
@@ -48,36 +199,31 @@ def convert_excel_sheets_to_csv():
 
   
     try:
-        # Read all sheets from the Excel file
-        excel = pd.ExcelFile(excel_file)
+        sheet_count = 0
         
-        # Get list of sheet names
-        sheet_names = excel.sheet_names
-        
-        # Process each sheet
-        for sheet in sheet_names:
-            # Read the sheet into a DataFrame with header=None to avoid treating first row as header
-            df = pd.read_excel(excel_file, sheet_name=sheet, header=None, dtype=str)
-            
-            # Delete the first 5 rows
-            df = df.drop([1,2,3]).reset_index(drop=True)
-            
-            
-            # Clean all string columns
-            for column in df.columns:
-                if df[column].dtype == 'object':  # Only clean string/object columns
-                    df[column] = df[column].apply(clean_text)
-            
-            # Create output filename
-            # CHANGE SUFFIX AS NEEDED
-            csv_filename = f"{sheet}_MS.csv"
-            csv_path = os.path.join(output_dir, csv_filename)
-            
-            # Save to CSV with UTF-8-sig encoding
-            df.to_csv(csv_path, index=False, header=False, encoding='utf-8-sig')
-            print(f"Created: {csv_filename}")
+        # Open the Excel file once and stream each sheet's rows
+        # (from the parsed-workbook cache next to it if this workbook was read before).
+        # The files are written to a run folder and published together (see output_run)
+        with OutputRun(output_dir) as output_run:
+            for sheet, sheet_rows in iter_workbook_sheets(excel_file, cache=open_cache(os.path.join(base_dir, CACHE_DIR))):
+                with stage('excel_to_csv', sheet) as timed:
+                    # Metadata rows are dropped and the text is cleaned as the rows stream in
+                    rows = read_sheet_rows(sheet_rows)
+                    
+                    # Create output filename
+                    # CHANGE SUFFIX AS NEEDED
+                    csv_filename = f"{sheet}_MS.csv"
+                    csv_path = output_run.directory / csv_filename
+                    
+                    # Save to CSV with UTF-8-sig encoding
+                    with open(csv_path, 'w', encoding='utf-8-sig', newline='') as f:
+                        writer = csv.writer(f)
+                        writer.writerows(rows)
+                    timed.rows = len(rows)
+                print(f"Created: {csv_filename}")
+                sheet_count += 1
             
-        print(f"\nSuccessfully processed {len(sheet_names)} sheets.")
+        print(f"\nSuccessfully processed {sheet_count} sheets.")
         
     except Exception as e:
         print(f"An error occurred: {str(e)}")
@@ -0,0 +1,183 @@
+import argparse
+import re
+from functools import lru_cache
+from typing import FrozenSet, Iterable
+
+import numpy as np
+import pandas as pd
+
+
+# Normalize the raw grade column ("Grade Six", "6-8", "7/8", "Grades 6&7",
+# "2024-07-08 00:00:00", ...) to the set of grade levels it covers.
+#
+# A set of grades is stored as a bitmask: bit 0 is kindergarten and bit n is
+# grade n, so "6-8" is 0b111000000. The corpus keeps one mask per standard in
+# a grade_mask column, and "every grade 7 standard" is a bitwise AND over that
+# column instead of parsing strings. Values that are not grades ("Utah History",
+# "no_content", "N/a") get an empty mask.
+#
+# Each distinct raw value is parsed only once (values repeat across thousands of rows).
+
+GRADE_NAMES = ['K'] + [str(grade) for grade in range(1, 13)]
+MASK_DTYPE = np.uint16
+
+# Excel turns a range like "7-8" typed into a cell into a date (July 8th), which
+# excel_to_csv reads back as "2024-07-08 00:00:00": the month and day are the range.
+EXCEL_DATE_PATTERN = re.compile(r"^\d{4}-(\d{1,2})-(\d{1,2})(?: 00:00:00)?$")
+
+# Number words and ordinals, replaced by digits before the grade pattern is matched
+GRADE_WORDS = {
+    'kindergarten': 'k',
+    'one': '1', 'first': '1', 'two': '2', 'second': '2', 'three': '3', 'third': '3',
+    'four': '4', 'fourth': '4', 'five': '5', 'fifth': '5', 'six': '6', 'sixth': '6',
+    'seven': '7', 'seventh': '7', 'eight': '8', 'eighth': '8', 'nine': '9', 'ninth': '9',
+    'ten': '10', 'tenth': '10', 'eleven': '11', 'eleventh': '11', 'twelve': '12', 'twelfth': '12',
+}
+GRADE_WORD_PATTERN = re.compile(r"\b(" + "|".join(GRADE_WORDS) + r")\b")
+ORDINAL_PATTERN = re.compile(r"\b(\d{1,2})(?:st|nd|rd|th)\b")
+
+# Words around the grades that carry no information ("Grades 6-8", "by the end of 8")
+FILLER_PATTERN = re.compile(r"\b(?:grades?|gr|by the end of|overview of)\b|:")
+
+RANGE_PATTERN = re.compile(r"\s*(?:-|–|\bto\b|\bthrough\b|\bthru\b)\s*")
+LIST_PATTERN = re.compile(r"\s*(?:,|&|/|\band\b|\s)\s*")
+ITEM_PATTERN = re.compile(r"^(k|\d{1,2})(?:-(k|\d{1,2}))?$")
+
+
+def _grade_number(token: str) -> int:
+    return 0 if token == 'k' else int(token)
+
+
+def _grade_range(first: int, last: int) -> FrozenSet[int]:
+    if not 0 <= first <= last <= 12:
+        return frozenset()
+    return frozenset(range(first, last + 1))
+
+
+@lru_cache(maxsize=None)
+def parse_grades(value: str) -> FrozenSet[int]:
+    """
+    The grade levels (0 for kindergarten) a raw grade value covers, or an empty
+    set if the value is not a grade.
+    """
+    text = value.strip().lower()
+
+    match = EXCEL_DATE_PATTERN.match(text)
+    if match:
+        return _grade_range(int(match.group(1)), int(match.group(2)))
+
+    text = GRADE_WORD_PATTERN.sub(lambda m: GRADE_WORDS[m.group(1)], text)
+    text = ORDINAL_PATTERN.sub(r"\1", text)
+    text = FILLER_PATTERN.sub(" ", text)
+    text = RANGE_PATTERN.sub("-", text).strip()
+    if not text:
+        return frozenset()
+
+    # What is left must be a list of grades or ranges: "6", "6-8", "6 7", "7/8", "6-7, 8"
+    grades = set()
+    for item in LIST_PATTERN.split(text):
+        match = ITEM_PATTERN.match(item)
+        if not match:
+            return frozenset()
+        first = _grade_number(match.group(1))
+        last = _grade_number(match.group(2)) if match.group(2) else first
+        item_grades = _grade_range(first, last)
+        if not item_grades:
+            return frozenset()
+        grades |= item_grades
+    return frozenset(grades)
+
+
+@lru_cache(maxsize=None)
+def grade_mask(value: str) -> int:
+    """
+    Bitmask of the grade levels of a raw grade value.
+    """
+    return mask_of(parse_grades(value))
+
+
+def mask_of(grades: Iterable[int]) -> int:
+    """
+    Bitmask of a set of grade levels (0 for kindergarten).
+    """
+    mask = 0
+    for grade in grades:
+        mask |= 1 << grade
+    return mask
+
+
+def grade_masks(values: pd.Series) -> np.ndarray:
+    """
+    Grade bitmask of every value in a column, parsing each distinct value once.
+    """
+    codes, uniques = pd.factorize(values.astype(str))
+    unique_masks = np.array([grade_mask(value) for value in uniques], dtype=MASK_DTYPE)
+    return unique_masks[codes]
+
+
+def has_grades(masks: np.ndarray, grades: Iterable[int], match_all: bool = False) -> np.ndarray:
+    """
+    Boolean array of the rows whose mask covers any (or, with match_all, every) of the grades.
+    """
+    wanted = MASK_DTYPE(mask_of(grades))
+    if match_all:
+        return (masks & wanted) == wanted
+    return (masks & wanted) != 0
+
+
+def grade_label(mask: int) -> str:
+    """
+    Readable form of a grade mask, e.g. "6-8" or "K, 6-7".
+    """
+    grades = [grade for grade in range(len(GRADE_NAMES)) if mask & (1 << grade)]
+    runs = []
+    for grade in grades:
+        if runs and grade == runs[-1][1] + 1:
+            runs[-1][1] = grade
+        else:
+            runs.append([grade, grade])
+    return ", ".join(GRADE_NAMES[first] if first == last else f"{GRADE_NAMES[first]}-{GRADE_NAMES[last]}"
+                     for first, last in runs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how the raw grade values of the corpus are normalized")
+    parser.add_argument("--corpus", default="ms_corpus.parquet")
+    parser.add_argument("--grade", action="append",
+                        help="count the standards of these grades by state instead (a grade value such as 7, K, "
+                             "seventh or 6-8; can be given more than once)")
+    args = parser.parse_args()
+
+    # Read like the grade column, so a value the corpus would take is taken here too
+    grades = set()
+    for value in args.grade or []:
+        value_grades = parse_grades(value)
+        if not value_grades:
+            parser.error(f"--grade {value!r} is not a grade from K to 12")
+        grades |= value_grades
+
+    # merge_corpus imports from this module
+    from merge_corpus import load_corpus
+
+    corpus = load_corpus(args.corpus, ['state', 'grade', 'grade_mask'])
+
+    if args.grade:
+        selected = corpus[has_grades(corpus['grade_mask'].to_numpy(), grades)]
+        counts = selected['state'].value_counts(sort=False)
+        for state, count in counts[counts > 0].sort_index().items():
+            print(f"{state}: {count}")
+        print(f"\n{len(selected)} standard(s) for grade {grade_label(mask_of(grades))}")
+        return
+
+    values = corpus.groupby(['grade', 'grade_mask'], observed=True).size().reset_index(name='rows')
+    unmatched = 0
+    for grade, mask, rows in values.sort_values('rows', ascending=False).itertuples(index=False):
+        label = grade_label(int(mask)) or '(not a grade)'
+        print(f"{rows:6d}  {grade!r:45} -> {label}")
+        if not mask:
+            unmatched += rows
+    print(f"\n{len(values)} distinct values, {unmatched} standard(s) without a grade")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import csv
+import re
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Pattern, Tuple
+
+
+# The split of the indicator column (column 4) into indicator code and standard
+# text, as a grammar of named regex rules.
+#
+# A rule is a regex over the whole cell with a group named code and a group named
+# text (a missing code group means no code, a missing text group means the whole
+# cell is the text). The rules are tried in order and the first one that matches
+# splits the cell; a state's own rules from the grammar file come before the
+# default rules. All of a state's rules are compiled into one alternation, so
+# each cell is split with a single regex match as the rows stream through.
+#
+# Rules marked as fallback (split at the first space) match nearly anything, so
+# every cell is split as before; a cell that only a fallback rule matches is
+# listed in the review file for a person to look at, and so is a cell split by
+# one of the state's own rules that a later non-fallback rule of the state's own
+# would split differently. A state's own rules are there to override the
+# default rules, so they are not checked against them; the default rules don't
+# overlap each other, so cells they split are not checked again either. They
+# split exactly like the old prefix checks:
+#
+#   theme_heading   "Theme 3"              -> no code
+#   prefixed        "Era 2 The colonies"   -> "Era 2" | "The colonies"
+#   list_of_topics  "LIST OF TOPICS ..."   -> "LIST OF" | "TOPICS ..."
+#   narrative       "Students will ..."    -> no code
+#   indicator       "7.1.2 Analyze ..."    -> "7.1.2" | "Analyze ..."
+#   indicator_only  "7.1.2"                -> "7.1.2" | ""
+#   first_word      "Analyze the ..."      -> "Analyze" | "the ..."   (fallback)
+#   single_word     "Analyze"              -> "Analyze" | ""          (fallback)
+#
+# An empty cell matches no rule and stays empty.
+#
+# Grammar file columns: state, name, pattern, fallback (1 for a fallback rule).
+# Flags go in a group, e.g. (?i:grade) rather than (?i)grade.
+
+grammar_file = "MS_indicator_grammar.csv"
+REVIEW_NAME = "indicator_review.csv"
+REVIEW_COLUMNS = ['state', 'row', 'status', 'rules', 'code', 'text']
+GROUP_NAME = re.compile(r"\(\?P([<=])(code|text)\b")
+
+
+class GrammarRule(NamedTuple):
+    name: str
+    pattern: str
+    fallback: bool = False
+
+
+DEFAULT_RULES = [
+    GrammarRule('theme_heading', r"(?:Theme|Era|SS) [^ ]*"),
+    GrammarRule('prefixed', r"(?P<code>(?:Theme|Era|SS) [^ ]*) (?P<text>.*)"),
+    GrammarRule('list_of_topics', r"(?P<code>LIST OF) (?P<text>TOPICS.*)"),
+    GrammarRule('narrative', r"(?:The|Students) .*"),
+    GrammarRule('indicator', r"(?P<code>[^ ]*[0-9][^ ]*) (?P<text>.*)"),
+    GrammarRule('indicator_only', r"(?P<code>[^ ]*[0-9][^ ]*)(?P<text>)"),
+    GrammarRule('first_word', r"(?P<code>[^ ]*) (?P<text>.*)", fallback=True),
+    GrammarRule('single_word', r"(?P<code>[^ ]+)(?P<text>)", fallback=True),
+]
+
+
+def compile_rule(pattern: str) -> Pattern:
+    """
+    A rule's pattern matched against the whole cell, '.' also matching line breaks.
+    """
+    return re.compile(f"(?s)(?:{pattern})\\Z")
+
+
+def _branch(rule: GrammarRule, index: int) -> str:
+    # Rule i is group r{i} of the alternation, its code and text groups c{i} and t{i}
+    pattern = GROUP_NAME.sub(lambda match: f"(?P{match.group(1)}{match.group(2)[0]}{index}", rule.pattern)
+    return f"(?P<r{index}>{pattern})"
+
+
+class IndicatorGrammar:
+    """
+    Ordered split rules for one state, compiled once. The first own_rules rules
+    are the state's own; cells they split are checked against the state's later
+    own rules, not against the default rules after them.
+    """
+
+    def __init__(self, rules: List[GrammarRule], own_rules: int = 0):
+        self.rules = rules
+        self.compiled = [compile_rule(rule.pattern) for rule in rules]
+        self.first_match = re.compile(f"(?s)(?:{'|'.join(_branch(rule, i) for i, rule in enumerate(rules))})\\Z")
+        groups = self.first_match.groupindex
+        # Per rule, by the number of its group in the alternation: its index, the
+        # numbers of its code and text groups (0, the whole cell, when it has none),
+        # whether it is a fallback and the later rules to check its cells against
+        self.by_group = {}
+        for i, rule in enumerate(rules):
+            later = [j for j in range(i + 1, own_rules) if not rules[j].fallback]
+            self.by_group[groups[f"r{i}"]] = (i, groups.get(f"c{i}", 0), groups.get(f"t{i}", 0),
+                                              rule.fallback, later)
+
+    def split(self, text: str) -> Tuple[str, str, Optional[Tuple[str, List[str]]]]:
+        """
+        Split one cell into (code, text, finding). finding is None, or for a cell
+        to review (status, names of the rules involved), status being "no_rule"
+        (only a fallback rule matched, or none) or "ambiguous".
+        """
+        match = self.first_match.match(text)
+        if match is None:
+            return '', text, (('no_rule', []) if text else None)
+        # The rule's own group closes last
+        rule, code_group, text_group, fallback, later = self.by_group[match.lastindex]
+        code = (match.group(code_group) or '') if code_group else ''
+        # Group 0 is the whole cell
+        description = match.group(text_group) or ''
+        if fallback:
+            return code, description, ('no_rule', [self.rules[rule].name])
+
+        for other in later:
+            if self._split_with(other, text) not in (None, (code, description)):
+                return code, description, ('ambiguous', [self.rules[rule].name, self.rules[other].name])
+        return code, description, None
+
+    def _split_with(self, index: int, text: str) -> Optional[Tuple[str, str]]:
+        """
+        The (code, text) split of one rule, or None if it doesn't match.
+        """
+        match = self.compiled[index].match(text)
+        if match is None:
+            return None
+        groups = match.groupdict()
+        return groups.get('code') or '', (groups['text'] or '') if 'text' in groups else text
+
+
+DEFAULT_GRAMMAR = IndicatorGrammar(DEFAULT_RULES)
+
+
+def load_grammars(path: str = grammar_file) -> Dict[str, IndicatorGrammar]:
+    """
+    Read the grammar file and compile each state's grammar (its own rules, then
+    the default rules), keyed by file stem (e.g. "AL_MS"). States without rules
+    use DEFAULT_GRAMMAR. A missing file is an error, as for the special case rules:
+    the states that split with their own rules would quietly get the default ones.
+    """
+    state_rules = {}
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            rule = GrammarRule(row['name'], row['pattern'], row.get('fallback') == '1')
+            try:
+                compile_rule(_branch(rule, 0))
+            except re.error as e:
+                raise ValueError(f"{path} line {line}: {e}")
+            state_rules.setdefault(row['state'], []).append(rule)
+    return {state: IndicatorGrammar(rules + DEFAULT_RULES, len(rules)) for state, rules in state_rules.items()}
+
+
+def write_review(review: Dict[str, List[dict]], path: Path) -> int:
+    """
+    Write the cells to review of every state processed in this run. States in an
+    existing review file that were not processed this time keep their rows.
+    Returns the number of rows in the file.
+    """
+    path = Path(path)
+    rows = []
+    if path.exists():
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            rows = [row for row in csv.DictReader(f) if row['state'] not in review]
+    for state in sorted(review):
+        rows.extend({'state': state, **finding} for finding in review[state])
+    rows.sort(key=lambda row: (row['state'], int(row['row'])))
+
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REVIEW_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Indicator review list saved to {path} ({len(rows)} rows)")
+    return len(rows)
@@ -0,0 +1,189 @@
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# Timing and memory records for each stage of each state, written as JSON lines
+# so a run can be summed up afterwards (which states and stages take the time).
+#
+#     with stage('special_case_cleaning', 'AL_MS') as timed:
+#         rows = ...
+#         timed.rows = len(rows)
+#
+# Every record holds the wall time, CPU time and rows processed, the peak RSS of
+# the process so far and how much the stage raised it. The process peak only
+# ever grows, so a stage that stays under an earlier stage's peak shows a rise of
+# 0 even if it used a lot of memory; the rise marks the stages that set a new
+# high. Logging is turned on with enable() (or the --run-log option
+# of the scripts); the log path is kept in an environment variable so worker
+# processes log to the same file. When it is off, stage() returns a shared object
+# that does nothing.
+#
+# Peak RSS needs the resource module (Linux, macOS) or, on Windows, psutil;
+# without either it is left out.
+
+RUN_LOG_ENV = "SS_STANDARDS_RUN_LOG"
+RUN_ID_ENV = "SS_STANDARDS_RUN_ID"
+
+
+def enable(path: str) -> str:
+    """
+    Turn on logging to a JSON lines file (appended to) for this process and its
+    workers. Returns the run ID that tags this run's records.
+    """
+    run_id = datetime.now().isoformat(timespec='seconds')
+    os.environ[RUN_LOG_ENV] = str(path)
+    os.environ[RUN_ID_ENV] = run_id
+    return run_id
+
+
+def disable() -> None:
+    os.environ.pop(RUN_LOG_ENV, None)
+    os.environ.pop(RUN_ID_ENV, None)
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Largest resident memory of this process so far, in MB.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, 'peak_wset', info.rss) / 2**20
+    return None
+
+
+class _Stage:
+    """
+    One timed stage; set rows to the number of rows it processed.
+    """
+
+    def __init__(self, log_path: str, name: str, state: Optional[str]):
+        self.log_path = log_path
+        self.name = name
+        self.state = state
+        self.rows = None
+
+    def __enter__(self) -> '_Stage':
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.peak_start = peak_rss_mb()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        wall = time.perf_counter() - self.wall_start
+        cpu = time.process_time() - self.cpu_start
+        peak = peak_rss_mb()
+        record = {
+            'run': os.environ.get(RUN_ID_ENV),
+            'stage': self.name,
+            'state': self.state,
+            'wall_s': round(wall, 6),
+            'cpu_s': round(cpu, 6),
+            'rows': self.rows,
+            'process_peak_rss_mb': round(peak, 1) if peak is not None else None,
+            'peak_rss_rise_mb': round(peak - self.peak_start, 1) if peak is not None else None,
+            'pid': os.getpid(),
+            'ok': exc_type is None,
+        }
+        # One short append per record, so worker processes can share the file
+        with open(self.log_path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+
+
+class _NoStage:
+    """
+    Stand-in when logging is off.
+    """
+    rows = None
+
+    def __enter__(self) -> '_NoStage':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        pass
+
+    def __setattr__(self, name, value) -> None:
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str, state: Optional[str] = None):
+    """
+    Context manager timing one stage (of one state, if given).
+    """
+    log_path = os.environ.get(RUN_LOG_ENV)
+    if not log_path:
+        return _NO_STAGE
+    return _Stage(log_path, name, state)
+
+
+def read_run_log(path: str, run_id: Optional[str] = None) -> List[dict]:
+    """
+    Records of one run of the log (the last run if run_id is not given).
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records:
+        return []
+    run_id = run_id or records[-1]['run']
+    return [record for record in records if record['run'] == run_id]
+
+
+def print_summary(path: Optional[str] = None, run_id: Optional[str] = None, top: int = 10) -> None:
+    """
+    Print the time per stage and the slowest states of a run.
+    """
+    path = path or os.environ.get(RUN_LOG_ENV)
+    if not path or not Path(path).exists():
+        return
+    records = read_run_log(path, run_id or os.environ.get(RUN_ID_ENV))
+
+    stages: Dict[str, Dict[str, float]] = defaultdict(lambda: {'count': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows': 0,
+                                                               'rise_mb': 0.0})
+    peak = 0.0
+    for record in records:
+        totals = stages[record['stage']]
+        totals['count'] += 1
+        totals['wall_s'] += record['wall_s']
+        totals['cpu_s'] += record['cpu_s']
+        totals['rows'] += record['rows'] or 0
+        totals['rise_mb'] = max(totals['rise_mb'], record.get('peak_rss_rise_mb') or 0)
+        peak = max(peak, record.get('process_peak_rss_mb') or 0)
+
+    print(f"\n{'='*60}")
+    print("TIME BY STAGE")
+    print(f"{'='*60}")
+    print(f"{'stage':28} {'calls':>6} {'wall s':>9} {'cpu s':>9} {'rows':>9} {'peak +MB':>9}")
+    for name, totals in sorted(stages.items(), key=lambda item: -item[1]['wall_s']):
+        print(f"{name:28} {totals['count']:>6} {totals['wall_s']:>9.3f} {totals['cpu_s']:>9.3f} {int(totals['rows']):>9} {totals['rise_mb']:>9.1f}")
+
+    slowest = sorted((record for record in records if record['state']), key=lambda record: -record['wall_s'])[:top]
+    if slowest:
+        print(f"\nSlowest states:")
+        for record in slowest:
+            print(f"  {record['state']:12} {record['stage']:28} {record['wall_s']:>9.3f}s")
+    if peak:
+        print(f"\nProcess peak RSS: {peak:.1f} MB (largest of any process)")
+    print(f"Run log: {path}")
+    print(f"{'='*60}")
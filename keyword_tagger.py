@@ -0,0 +1,202 @@
+import argparse
+import re
+from collections import deque
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+import pandas as pd
+
+from excel_to_csv import clean_string
+from merge_corpus import load_corpus
+
+
+# Tag every standard with the keywords of Key_Words.xlsx that appear in its text,
+# and compare the tags with the keywords the coders entered by hand.
+#
+# A keyword is one entry of the "Original Key Words" column; its variants are
+# the parts between slashes ("Religion/Religious" -> religion, religious). All
+# variants of all keywords are compiled into one Aho-Corasick automaton, so each
+# standard's text is scanned once no matter how long the keyword list is.
+# A variant only matches whole words, optionally followed by a plural s / es.
+
+KEYWORDS_FILE = "Key_Words.xlsx"
+KEYWORD_COLUMN = "Original Key Words"
+
+TERM_SEPARATOR_PATTERN = re.compile(r"[/&]")
+SPACE_PATTERN = re.compile(r"\s+")
+
+
+def normalize_term(term: str) -> str:
+    """
+    Clean a variant the same way the standard text was cleaned, lowercased.
+    """
+    return SPACE_PATTERN.sub(" ", clean_string(term)).strip().lower()
+
+
+def keyword_terms(keyword: str) -> Set[str]:
+    """
+    The variants of a keyword: "Tao/Taoism/Dao/" -> {"tao", "taoism", "dao"}
+    """
+    return {term for term in (normalize_term(part) for part in TERM_SEPARATOR_PATTERN.split(keyword)) if term}
+
+
+def load_keywords(path: str = KEYWORDS_FILE) -> Dict[str, Set[str]]:
+    """
+    Read the keyword list, keyed by keyword as written in the file (e.g. "Religion/Religious").
+    """
+    sheet = pd.read_excel(path, dtype=str)
+    keywords = {}
+    for keyword in sheet[KEYWORD_COLUMN].dropna():
+        keyword = keyword.strip()
+        terms = keyword_terms(keyword)
+        if terms:
+            keywords.setdefault(keyword, set()).update(terms)
+    return keywords
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over the variants of every keyword.
+    """
+
+    def __init__(self, keywords: Dict[str, Set[str]]):
+        # State 0 is the root; goto[state] maps a character to the next state
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for keyword, terms in keywords.items():
+            for term in terms:
+                state = 0
+                for char in term:
+                    next_state = self.goto[state].get(char)
+                    if next_state is None:
+                        next_state = len(self.goto)
+                        self.goto[state][char] = next_state
+                        self.goto.append({})
+                        self.fail.append(0)
+                        self.output.append([])
+                    state = next_state
+                self.output[state].append((term, keyword))
+
+        # Breadth-first: a state's failure link is the longest proper suffix that is also a prefix
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find(self, text: str) -> Iterator[Tuple[str, str, int, int]]:
+        """
+        Yield (keyword, term, start, end) for every whole-word variant in a lowercased text.
+        """
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for term, keyword in output[state]:
+                start = index - len(term) + 1
+                end = _word_end(text, index + 1)
+                if end is not None and (start == 0 or not text[start - 1].isalnum()):
+                    yield keyword, term, start, end
+
+
+def _word_end(text: str, end: int) -> Optional[int]:
+    """
+    End of the match if it ends a word, allowing a plural s / es; None if it doesn't.
+    """
+    for suffix in ('', 's', 'es'):
+        stop = end + len(suffix)
+        if text.startswith(suffix, end) and (stop == len(text) or not text[stop].isalnum()):
+            return stop
+    return None
+
+
+def tag_standards(corpus: pd.DataFrame, keywords: Dict[str, Set[str]]) -> pd.DataFrame:
+    """
+    Scan the text of every standard once and return one row per match:
+    state, standard_id, keyword, term, start, end (character offsets in the standard text).
+    """
+    automaton = KeywordAutomaton(keywords)
+    standards = corpus.drop_duplicates(['standard_id', 'standard'])
+
+    records = []
+    for state, standard_id, text in zip(standards['state'], standards['standard_id'], standards['standard']):
+        for keyword, term, start, end in automaton.find(str(text).lower()):
+            records.append((state, standard_id, keyword, term, start, end))
+
+    return pd.DataFrame(records, columns=['state', 'standard_id', 'keyword', 'term', 'start', 'end'])
+
+
+def compare_keywords(corpus: pd.DataFrame, tags: pd.DataFrame, keywords: Dict[str, Set[str]]) -> pd.DataFrame:
+    """
+    Compare the automatic tags of each standard with its manual keywords. A manual
+    keyword agrees with a keyword of the list when they share a variant
+    ("Muslim/Islam/Ramadan" agrees with "Islam/"). Returns state, standard_id,
+    keyword and status: "both", "auto_only" (possibly missed by the coders) or
+    "manual_only" (the keyword isn't in the text, or isn't in the list).
+    """
+    # Keyword rows without a standard ("no_content") have nothing to compare
+    has_text = corpus['standard'].astype(str).str.strip() != ''
+    manual = corpus.loc[has_text, ['state', 'standard_id', 'keyword']].astype(str).drop_duplicates()
+    manual = manual[manual['keyword'].str.strip() != '']
+    manual_keywords = {}
+    for state, standard_id, keyword in manual.itertuples(index=False):
+        manual_keywords.setdefault((state, standard_id), set()).add(keyword)
+
+    auto_keywords = {}
+    for state, standard_id, keyword in tags[['state', 'standard_id', 'keyword']].drop_duplicates().itertuples(index=False):
+        auto_keywords.setdefault((str(state), standard_id), set()).add(keyword)
+
+    manual_terms = {keyword: keyword_terms(keyword) for keyword in manual['keyword'].unique()}
+
+    records = []
+    for key in sorted(set(manual_keywords) | set(auto_keywords)):
+        entered = manual_keywords.get(key, set())
+        found = auto_keywords.get(key, set())
+        entered_terms = set().union(*(manual_terms[keyword] for keyword in entered))
+        found_terms = set().union(*(keywords[keyword] for keyword in found))
+
+        for keyword in sorted(found):
+            status = 'both' if keywords[keyword] & entered_terms else 'auto_only'
+            records.append(key + (keyword, status))
+        for keyword in sorted(entered):
+            if not manual_terms[keyword] & found_terms:
+                records.append(key + (keyword, 'manual_only'))
+
+    return pd.DataFrame(records, columns=['state', 'standard_id', 'keyword', 'status'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tag the standards with the keywords of Key_Words.xlsx")
+    parser.add_argument("--corpus", default="ms_corpus.parquet")
+    parser.add_argument("--keywords", default=KEYWORDS_FILE)
+    parser.add_argument("--output", default="keyword_tags.csv", help="one row per keyword found in a standard")
+    parser.add_argument("--comparison", default="keyword_comparison.csv",
+                        help="automatic tags compared with the manual keywords")
+    args = parser.parse_args()
+
+    keywords = load_keywords(args.keywords)
+    corpus = load_corpus(args.corpus, ['state', 'keyword', 'standard_id', 'standard'])
+
+    tags = tag_standards(corpus, keywords)
+    tags.to_csv(args.output, index=False, encoding='utf-8')
+    print(f"Found {len(tags)} keyword matches in {tags['standard_id'].nunique()} standards "
+          f"({len(keywords)} keywords), saved to {args.output}")
+
+    comparison = compare_keywords(corpus, tags, keywords)
+    comparison.to_csv(args.comparison, index=False, encoding='utf-8')
+    counts = comparison['status'].value_counts()
+    print(f"{counts.get('both', 0)} agree with the manual keywords, "
+          f"{counts.get('auto_only', 0)} only found automatically, "
+          f"{counts.get('manual_only', 0)} only entered by hand; saved to {args.comparison}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import csv
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+# The manifest records, for every state the pipeline has finished, a hash of
+# the state's cleaned sheet content and a hash of its rows in the params files.
+# On the next run a state whose hashes still match (and whose output file is
+# still there) is not processed again. The manifest is saved after every state,
+# so an interrupted run picks up where it stopped.
+
+MANIFEST_NAME = "pipeline_manifest.json"
+
+# Bump this when a cleaning step changes its output, so every state is rebuilt
+MANIFEST_VERSION = 1
+
+
+def hash_rows(rows: List[List[str]]) -> str:
+    """
+    Hash a table of cleaned cell values.
+    """
+    digest = hashlib.sha256()
+    for row in rows:
+        # Unit/record separators can't appear in cleaned text
+        digest.update('\x1f'.join(row).encode('utf-8'))
+        digest.update(b'\x1e')
+    return digest.hexdigest()
+
+
+def read_params_rows(params_files: List[str]) -> Dict[str, List[List[str]]]:
+    """
+    Read the raw rows of each params file, keyed by state file stem (e.g. "AK_MS").
+    Works for MS_params.csv ("AK_MS") and ms_params_secondary.csv ("AK_MS_edited.csv").
+    """
+    params_rows = {}
+    for params_file in params_files:
+        with open(params_file, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            for row in reader:
+                if not row or not row[0]:
+                    continue
+                stem = row[0]
+                if stem.endswith('.csv'):
+                    stem = stem[:-len('.csv')]
+                if stem.endswith('_edited'):
+                    stem = stem[:-len('_edited')]
+                params_rows.setdefault(stem, []).append([os.path.basename(params_file)] + header + row)
+    return params_rows
+
+
+class Manifest:
+    """
+    Per-state sheet and params hashes for incremental pipeline runs.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.states = {}
+
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                self.states = data.get('states', {})
+            else:
+                print(f"Manifest {self.path.name} is from another pipeline version, rebuilding all states")
+
+    def is_current(self, stem: str, sheet_hash: str, params_hash: str, output_path: Path) -> bool:
+        """
+        True if the state was already built from this sheet content and these params.
+        """
+        entry = self.states.get(stem)
+        return (entry is not None
+                and entry['sheet_hash'] == sheet_hash
+                and entry['params_hash'] == params_hash
+                and entry['output'] == output_path.name
+                and output_path.exists())
+
+    def record(self, stem: str, sheet_hash: str, params_hash: str, output_path: Optional[Path]) -> None:
+        """
+        Record a finished state and save the manifest right away.
+        """
+        self.states[stem] = {
+            'sheet_hash': sheet_hash,
+            'params_hash': params_hash,
+            'output': output_path.name if output_path else None,
+        }
+        self.save()
+
+    def forget(self, stem: str) -> None:
+        """
+        Drop a state before its output is rewritten, so a half-written file is never
+        taken for a finished one.
+        """
+        if self.states.pop(stem, None) is not None:
+            self.save()
+
+    def save(self) -> None:
+        """
+        Write the manifest through a temporary file so it is never left half written.
+        """
+        temp_path = self.path.parent / f"temp_{self.path.name}"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'states': self.states}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
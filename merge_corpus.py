@@ -0,0 +1,109 @@
+import argparse
+import csv
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+import pandas as pd
+
+from grades import grade_masks
+from output_run import glob_current
+from pipeline import standard_rows
+from schema import STANDARD_WIDTH
+from standard_ids import standard_ids
+
+
+# Merge every state's _done.csv file into one national corpus with a state column.
+# The corpus is written as a single compressed columnar file (Parquet, or Arrow IPC
+# for a .arrow/.feather path). Keyword, grade, course and state are stored as
+# categoricals, so they are dictionary-encoded on disk. The grade_mask column
+# holds the normalized grades of each standard as a bitmask (see grades), and
+# standard_id a stable ID for each standard (see standard_ids).
+# Writing Parquet / Arrow files needs the pyarrow package.
+
+CORPUS_COLUMNS = ['state', 'keyword', 'grade', 'course', 'indicator', 'standard']
+CATEGORY_COLUMNS = ['state', 'keyword', 'grade', 'course']
+
+
+def read_done_file(done_file: Path) -> List[List[str]]:
+    """
+    Read a _done.csv file, leaving out the header row of column numbers.
+    """
+    with open(done_file, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    return rows[1:]
+
+
+def iter_done_files(folder: str, suffix: str = "_MS") -> Iterator[Tuple[str, List[List[str]]]]:
+    """
+    Yield (state, rows) for the current version of every _done.csv file in the folder.
+    """
+    for done_file in glob_current(folder, f"*{suffix}_done.csv"):
+        state = done_file.name[:-len(f"{suffix}_done.csv")]
+        yield state, read_done_file(done_file)
+
+
+def build_corpus(state_rows: Iterable[Tuple[str, List[List[str]]]]) -> pd.DataFrame:
+    """
+    Merge the rows of every state into one DataFrame with the corpus columns,
+    the grade mask and the standard IDs.
+    Files with more than five columns only keep the first five; any states where
+    the extra columns hold text are reported.
+    """
+    records = []
+    for state, rows in state_rows:
+        extra_columns = False
+        for row in standard_rows(rows):
+            if any(cell.strip() for cell in row[STANDARD_WIDTH:]):
+                extra_columns = True
+            row = (row + [''] * STANDARD_WIDTH)[:STANDARD_WIDTH]
+            records.append([state] + row)
+
+        if extra_columns:
+            print(f"Warning: {state} has text beyond column {STANDARD_WIDTH}; that text was left out of the corpus")
+
+    corpus = pd.DataFrame(records, columns=CORPUS_COLUMNS)
+    for column in CATEGORY_COLUMNS:
+        corpus[column] = corpus[column].astype('category')
+    corpus['grade_mask'] = grade_masks(corpus['grade'])
+    corpus['standard_id'] = standard_ids(corpus)
+    return corpus
+
+
+def is_arrow_path(path: Path) -> bool:
+    return Path(path).suffix in ('.arrow', '.feather')
+
+
+def write_corpus(corpus: pd.DataFrame, output_path: str) -> None:
+    """
+    Write the corpus as compressed Parquet, or Arrow IPC for a .arrow/.feather path.
+    """
+    if is_arrow_path(output_path):
+        corpus.to_feather(output_path, compression='zstd')
+    else:
+        corpus.to_parquet(output_path, compression='zstd', index=False)
+    print(f"Saved corpus of {len(corpus)} standards from {corpus['state'].nunique()} states to {output_path}")
+
+
+def load_corpus(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load the corpus, or only the given columns of it.
+    """
+    if is_arrow_path(path):
+        return pd.read_feather(path, columns=columns)
+    return pd.read_parquet(path, columns=columns)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge every state's _done.csv file into one corpus file")
+    parser.add_argument("--folder", default="ms_2026")
+    parser.add_argument("--suffix", default="_MS")
+    parser.add_argument("--output", default="ms_corpus.parquet",
+                        help="corpus file; use a .arrow or .feather name for Arrow IPC")
+    args = parser.parse_args()
+
+    corpus = build_corpus(iter_done_files(args.folder, args.suffix))
+    write_corpus(corpus, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import argparse
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from merge_corpus import load_corpus
+from standard_ids import normalize_text
+
+
+# Find standards that were copied (or lightly edited) between states, without
+# comparing every pair of standards.
+#
+#   1. Each standard's normalized text is cut into shingles (runs of SHINGLE_SIZE words).
+#   2. MinHash: NUM_PERMUTATIONS hash functions are applied to every shingle and the
+#      smallest value per function is kept. The share of positions where two
+#      signatures agree estimates the Jaccard similarity of their shingle sets.
+#      Signatures are computed for batches of standards at once with numpy.
+#   3. LSH: signatures are cut into bands; standards that share any whole band land
+#      in the same bucket and become candidate pairs. Only candidates are compared.
+#   4. Candidate pairs at or above the threshold are joined into clusters.
+#
+# Work grows with the number of standards, not the number of pairs, so the same
+# code runs on the MS, HS and ES corpora together.
+
+SHINGLE_SIZE = 3
+NUM_PERMUTATIONS = 128
+BANDS = 32
+SEED = 20260406
+
+# Universal hashing modulo a Mersenne prime keeps a * x + b below 2**62
+MERSENNE_PRIME = (1 << 31) - 1
+
+# Upper bound on the permutation x shingle matrix built per batch
+BATCH_CELLS = 1 << 23
+
+# Buckets bigger than this (boilerplate text) are compared against their first member only
+MAX_BUCKET_PAIRS = 64
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> List[int]:
+    """
+    32-bit hashes of the distinct word shingles of a normalized text.
+    Texts shorter than one shingle are a single shingle.
+    """
+    words = text.split()
+    if not words:
+        return []
+    shingles = {' '.join(words[i:i + size]) for i in range(max(1, len(words) - size + 1))}
+    return [zlib.crc32(shingle.encode('utf-8')) & MERSENNE_PRIME for shingle in shingles]
+
+
+def permutations(num_permutations: int = NUM_PERMUTATIONS, seed: int = SEED) -> Tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+    b = rng.integers(0, MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(shingle_sets: List[List[int]], num_permutations: int = NUM_PERMUTATIONS,
+                       seed: int = SEED) -> np.ndarray:
+    """
+    MinHash signature of every shingle set, one row per set. Every set must be non-empty.
+    """
+    a, b = permutations(num_permutations, seed)
+    signatures = np.empty((len(shingle_sets), num_permutations), dtype=np.uint32)
+
+    start = 0
+    while start < len(shingle_sets):
+        # Take as many sets as fit in one batch (at least one)
+        end, cells = start, 0
+        while end < len(shingle_sets) and (end == start or cells + len(shingle_sets[end]) * num_permutations <= BATCH_CELLS):
+            cells += len(shingle_sets[end]) * num_permutations
+            end += 1
+
+        batch = shingle_sets[start:end]
+        hashes = np.fromiter((h for shingles in batch for h in shingles), dtype=np.uint64)
+        offsets = np.cumsum([0] + [len(shingles) for shingles in batch[:-1]])
+
+        permuted = (a[:, None] * hashes[None, :] + b[:, None]) % MERSENNE_PRIME
+        signatures[start:end] = np.minimum.reduceat(permuted, offsets, axis=1).T
+        start = end
+
+    return signatures
+
+
+def candidate_pairs(signatures: np.ndarray, bands: int = BANDS) -> np.ndarray:
+    """
+    Pairs of rows that share at least one whole band of their signatures, as an (n, 2) array.
+    """
+    rows = signatures.shape[1] // bands
+    pairs = []
+    for band in range(bands):
+        keys = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * rows))).ravel()
+        _, bucket, counts = np.unique(keys, return_inverse=True, return_counts=True)
+
+        shared = np.flatnonzero(counts[bucket] > 1)
+        order = shared[np.argsort(bucket[shared], kind='stable')]
+        groups = np.split(order, np.flatnonzero(np.diff(bucket[order])) + 1)
+        for members in groups:
+            if len(members) < 2:
+                continue
+            if len(members) * (len(members) - 1) // 2 <= MAX_BUCKET_PAIRS:
+                first, second = np.triu_indices(len(members), k=1)
+                pairs.append(np.column_stack((members[first], members[second])))
+            else:
+                pairs.append(np.column_stack((np.full(len(members) - 1, members[0]), members[1:])))
+
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(pairs), axis=0)
+
+
+def similarities(signatures: np.ndarray, pairs: np.ndarray) -> np.ndarray:
+    """
+    Estimated Jaccard similarity of each pair.
+    """
+    if len(pairs) == 0:
+        return np.empty(0)
+    return (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+
+
+def _clusters(count: int, pairs: np.ndarray) -> np.ndarray:
+    """
+    Cluster number of each row, joining the rows of every pair (union-find).
+    """
+    parent = np.arange(count)
+
+    def find(row):
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    for first, second in pairs:
+        root_first, root_second = find(first), find(second)
+        if root_first != root_second:
+            parent[max(root_first, root_second)] = min(root_first, root_second)
+
+    return np.array([find(row) for row in range(count)])
+
+
+def find_near_duplicates(corpus: pd.DataFrame, threshold: float = 0.8, cross_state: bool = True,
+                         bands: int = BANDS) -> pd.DataFrame:
+    """
+    Cluster the near-identical standards of the corpus. Returns one row per
+    standard in a cluster: cluster, state, grade, standard_id, indicator, similarity
+    (to the first standard of the cluster) and standard. With cross_state, only
+    clusters spanning two or more states are kept.
+    """
+    # One document per standard, not per keyword row
+    standards = corpus.drop_duplicates(['standard_id', 'standard']).reset_index(drop=True)
+    texts = standards['standard'].astype(str).map(normalize_text)
+    shingle_sets = [shingle_hashes(text) for text in texts]
+    keep = np.array([bool(shingles) for shingles in shingle_sets], dtype=bool)
+    standards = standards[keep].reset_index(drop=True)
+    shingle_sets = [shingles for shingles in shingle_sets if shingles]
+
+    columns = ['cluster', 'state', 'grade', 'standard_id', 'indicator', 'similarity', 'standard']
+    if not shingle_sets:
+        return pd.DataFrame(columns=columns)
+
+    signatures = minhash_signatures(shingle_sets)
+    pairs = candidate_pairs(signatures, bands)
+    scores = similarities(signatures, pairs)
+    pairs = pairs[scores >= threshold]
+
+    cluster = _clusters(len(standards), pairs)
+    standards = standards.assign(cluster=cluster)
+    sizes = standards.groupby('cluster')['cluster'].transform('size')
+    members = standards[sizes > 1]
+    if cross_state:
+        state_counts = members.groupby('cluster')['state'].transform('nunique')
+        members = members[state_counts > 1]
+
+    # Similarity of every member to the first standard of its cluster
+    representative = members.index.to_series().groupby(members['cluster']).transform('first')
+    member_scores = (signatures[members.index.to_numpy()] == signatures[representative.to_numpy()]).mean(axis=1)
+
+    # Number the clusters from 1, biggest first
+    result = members.assign(similarity=member_scores.round(3))
+    order = result.groupby('cluster').size().sort_values(ascending=False, kind='stable')
+    result['cluster'] = result['cluster'].map({cluster: number for number, cluster in enumerate(order.index, start=1)})
+    result = result.sort_values(['cluster', 'similarity', 'state'], ascending=[True, False, True], kind='stable')
+    return result[columns].reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find near-identical standards across states")
+    parser.add_argument("--corpus", nargs='+', default=["ms_corpus.parquet"],
+                        help="corpus file(s) from merge_corpus, e.g. the MS, HS and ES corpora")
+    parser.add_argument("--output", default="near_duplicates.csv")
+    parser.add_argument("--threshold", type=float, default=0.8,
+                        help="estimated Jaccard similarity of the word shingles (0-1)")
+    parser.add_argument("--within-state", action="store_true",
+                        help="also keep clusters whose standards are all from one state")
+    args = parser.parse_args()
+
+    corpus = pd.concat([load_corpus(path) for path in args.corpus], ignore_index=True)
+    result = find_near_duplicates(corpus, args.threshold, not args.within_state)
+    result.to_csv(args.output, index=False, encoding='utf-8')
+
+    clusters = result['cluster'].nunique()
+    print(f"{clusters} cluster(s) of near-identical standards ({len(result)} standards) saved to {args.output}")
+    for number, group in result.groupby('cluster', sort=True):
+        if number > 10:
+            break
+        print(f"  {number}: {len(group)} standards in {', '.join(sorted(group['state'].astype(str).unique()))}")
+
+
+if __name__ == "__main__":
+    main()
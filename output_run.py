@@ -0,0 +1,275 @@
+import argparse
+import csv
+import fnmatch
+import json
+import os
+import shutil
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+
+# Publish a run's output files together, once the whole run is done.
+#
+# The stage scripts used to write each state's file next to the old one and swap
+# it in (or write it in place), so a failed run left some states from the new
+# run and some from the last one, and every file cost a temp file, an unlink and
+# a rename. Instead:
+#
+#     with OutputRun(folder) as run:
+#         write_rows(rows, run.directory / "AL_MS_00.csv")
+#         ...
+#
+# writes the run's outputs into a run folder of its own, folder/.runs/<run>,
+# with large write buffers. The current version of every file is listed in
+# folder/current.json, the pointer: file name -> the run it was written by.
+# When the block ends without an error, the new pointer (the old one with this
+# run's files) is written next to it, everything is flushed to disk with one
+# sync, and the pointer is replaced with a single rename. Readers go through the
+# pointer (current_path, current_files), so they see either every file of the
+# last run or every file of this one, never a mix. If the block raises, or the
+# process dies before the rename, the pointer still names the last run's files.
+# Files of earlier runs that the new pointer no longer names are removed after
+# the rename; one that is still open (Excel on Windows) is removed by a later run.
+#
+# The output folder itself is never renamed, so a file open in Excel or the
+# Dropbox client elsewhere in it doesn't get in the way. Files put straight into
+# the folder (the workbooks, files from before the runs) are still found by the
+# readers when no run has written a file of that name.
+#
+# A resumable run (pipeline.py, batch_runner.py) keeps its run folder when the
+# block raises: the states it finished stay there, with the manifest that lists
+# them, and the next resumable run carries on in the same folder. Any other run
+# folder the pointer doesn't name was left by a crash and is removed.
+#
+# A state that fails in a run is withdrawn with run.remove(name): when the run
+# is published its file is dropped from the pointer (and from the folder), so
+# the readers don't pick up the version of the last run that worked.
+#
+# To look at the current files in Excel or R, copy them into a plain folder:
+#     python output_run.py ms_2026 --export ms_2026_current
+
+RUNS_DIR = ".runs"
+POINTER_NAME = "current.json"
+POINTER_VERSION = 1
+RESUMABLE_MARK = ".resumable"
+WRITE_BUFFER = 1 << 20
+
+
+def read_pointer(folder) -> Dict[str, str]:
+    """
+    The pointer of a folder: file name -> run folder name. Empty if no run has published yet.
+    """
+    path = Path(folder) / POINTER_NAME
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('version') != POINTER_VERSION:
+        raise ValueError(f"{path} is from another version of output_run")
+    return data['files']
+
+
+def current_files(folder) -> Dict[str, Path]:
+    """
+    The current version of every file of a folder, by name: the file of the run
+    the pointer names, or the file in the folder itself if no run has written one.
+    """
+    folder = Path(folder)
+    files = {}
+    if folder.exists():
+        files = {path.name: path for path in folder.iterdir()
+                 if path.is_file() and path.name != POINTER_NAME and not path.name.startswith('.')}
+    for name, run in read_pointer(folder).items():
+        files[name] = folder / RUNS_DIR / run / name
+    return files
+
+
+def current_path(folder, name: str) -> Path:
+    """
+    The current version of one file of a folder (which may not exist).
+    """
+    run = read_pointer(folder).get(name)
+    return Path(folder) / RUNS_DIR / run / name if run else Path(folder) / name
+
+
+def glob_current(folder, pattern: str) -> List[Path]:
+    """
+    The current versions of the files whose name matches pattern, sorted by name.
+    """
+    return [path for name, path in sorted(current_files(folder).items()) if fnmatch.fnmatchcase(name, pattern)]
+
+
+class OutputRun:
+    """
+    A run folder for one run's outputs, published by replacing the folder's pointer.
+    """
+
+    def __init__(self, output_dir, resumable: bool = False):
+        self.output_dir = Path(output_dir)
+        self.runs_dir = self.output_dir / RUNS_DIR
+        self.resumable = resumable
+        self.directory = None
+        self.removed = set()
+
+    def __enter__(self) -> 'OutputRun':
+        self.begin()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.commit()
+        elif self.resumable:
+            print(f"Keeping {self.directory.name}; the next run carries on from it")
+        else:
+            self.discard()
+
+    def begin(self) -> None:
+        self.runs_dir.mkdir(parents=True, exist_ok=True)
+        published = set(read_pointer(self.output_dir).values())
+        unpublished = sorted(path for path in self.runs_dir.iterdir()
+                             if path.is_dir() and path.name not in published)
+
+        resumed = [path for path in unpublished if (path / RESUMABLE_MARK).exists()] if self.resumable else []
+        if resumed:
+            self.directory = resumed[-1]
+            print(f"Resuming the run left in {self.directory.name}")
+        else:
+            self.directory = self.runs_dir / datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            self.directory.mkdir()
+            if self.resumable:
+                (self.directory / RESUMABLE_MARK).touch()
+
+        for path in unpublished:
+            if path != self.directory:
+                print(f"Removing {path.name} left by an interrupted run")
+                shutil.rmtree(path, ignore_errors=True)
+
+    def path(self, name: str) -> Path:
+        """
+        The file as this run sees it: its own if the run wrote it, the current one otherwise.
+        """
+        path = self.directory / name
+        return path if path.exists() else current_path(self.output_dir, name)
+
+    def update(self, name: str) -> Path:
+        """
+        Copy the current file (if there is one) into the run, so it can be
+        updated in place, e.g. the run report. Returns its path in the run.
+        """
+        path = self.directory / name
+        current = current_path(self.output_dir, name)
+        if current.exists() and not path.exists():
+            shutil.copy2(current, path)
+        return path
+
+    def remove(self, name: str) -> None:
+        """
+        Withdraw a file: this run's copy is deleted and, when the run is
+        published, the current version is dropped too.
+        """
+        (self.directory / name).unlink(missing_ok=True)
+        self.removed.add(name)
+
+    def commit(self) -> None:
+        """
+        Point the folder's pointer at this run's files: one sync, one rename.
+        """
+        files = read_pointer(self.output_dir)
+        for name in self.removed:
+            files.pop(name, None)
+        for path in self.directory.iterdir():
+            if path.is_file() and not path.name.startswith('.'):
+                files[path.name] = self.directory.name
+
+        pointer = self.output_dir / POINTER_NAME
+        temp_pointer = self.output_dir / f".{POINTER_NAME}.new"
+        with open(temp_pointer, 'w', encoding='utf-8') as f:
+            json.dump({'version': POINTER_VERSION, 'files': files}, f, indent=2, sort_keys=True)
+        # The run's files and the new pointer reach the disk before the rename
+        _sync(self.directory, temp_pointer)
+        os.replace(temp_pointer, pointer)
+        _sync_dir(self.output_dir)
+        (self.directory / RESUMABLE_MARK).unlink(missing_ok=True)
+        for name in self.removed - set(files):
+            _unlink(self.output_dir / name)
+        self._remove_replaced(files)
+
+    def _remove_replaced(self, files: Dict[str, str]) -> None:
+        """
+        Remove the files of earlier runs the pointer no longer names, and run
+        folders left empty. Files still open elsewhere are left for a later run.
+        """
+        for run in self.runs_dir.iterdir():
+            if not run.is_dir() or run.name >= self.directory.name:
+                continue
+            for path in run.iterdir():
+                if files.get(path.name) != run.name:
+                    _unlink(path)
+            try:
+                run.rmdir()
+            except OSError:
+                pass
+
+    def discard(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def write_rows(rows: Iterable[List[str]], path: Path, encoding: str = 'utf-8') -> None:
+    """
+    Write rows to a CSV file with a large buffer.
+    """
+    with open(path, 'w', encoding=encoding, newline='', buffering=WRITE_BUFFER) as f:
+        csv.writer(f).writerows(rows)
+
+
+def _unlink(path: Path) -> None:
+    # A file open elsewhere (Excel on Windows) is left for a later run
+    try:
+        path.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+
+def _sync(directory: Path, *paths: Path) -> None:
+    # One sync for everything; where there is none (Windows), each file is flushed
+    if hasattr(os, 'sync'):
+        os.sync()
+        return
+    for path in [*directory.iterdir(), *paths]:
+        if path.is_file():
+            with open(path, 'rb+') as f:
+                os.fsync(f.fileno())
+
+
+def _sync_dir(directory: Path) -> None:
+    # Make the rename durable; folders can't be opened for this on Windows
+    if os.name != 'posix':
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List or copy out the current files of an output folder")
+    parser.add_argument("folder", help="e.g. ms_2026")
+    parser.add_argument("--export", help="copy the current files into this folder")
+    args = parser.parse_args()
+
+    files = current_files(args.folder)
+    if args.export:
+        export_dir = Path(args.export)
+        export_dir.mkdir(parents=True, exist_ok=True)
+        for name, path in files.items():
+            shutil.copy2(path, export_dir / name)
+        print(f"Copied {len(files)} files to {export_dir}")
+        return
+    for name, path in sorted(files.items()):
+        print(f"{name:40} {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,284 @@
+import argparse
+import csv
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from excel_to_csv import iter_workbook_sheets, read_sheet_rows
+from process_states_cleaner import read_params_file, transform_rows
+from special_case_cleaning import load_special_rules, apply_special_rules
+from secondary_cleaning import pad_rows, normalize_na, concat_extra_columns
+from manifest import MANIFEST_NAME, Manifest, hash_rows, read_params_rows
+from run_stats import REPORT_NAME, RunStats, StateStats, track
+from schema import ColumnProfile, check_schema, trim_columns
+from compact_table import CompactTable, ValuePool
+from workbook_cache import CACHE_DIR, WorkbookCache, open_cache
+from indicator_grammar import REVIEW_NAME, IndicatorGrammar, grammar_file, load_grammars, write_review
+from output_run import OutputRun
+import instrumentation
+
+
+# In-memory version of the full cleaning process:
+#   excel_to_csv -> process_states_cleaner -> special_case_cleaning -> secondary_cleaning
+# Each state's rows are carried through every stage in memory and only the
+# final _done.csv file is written. The intermediate _MS / _edited / _00 files
+# are only written when checkpoints are turned on (useful for debugging a state).
+# The files are written to a run folder and published together at the end
+# of the run (see output_run); an interrupted run keeps the states it finished
+# there and the next run carries on from them.
+
+
+def write_csv(rows: List[List[str]], output_path: Path, encoding: str = 'utf-8',
+              lineterminator: str = '\r\n') -> None:
+    """
+    Write rows to a CSV file.
+    """
+    with open(output_path, 'w', encoding=encoding, newline='') as outfile:
+        writer = csv.writer(outfile, lineterminator=lineterminator)
+        writer.writerows(rows)
+
+
+def write_done_file(rows: List[List[str]], done_path: Path, stem: str) -> None:
+    """
+    Write a state's final rows with the same layout as secondary_cleaning:
+    a header row of column numbers, then the rows, with the LF line endings
+    of pandas' to_csv.
+    """
+    header = [str(i) for i in range(len(rows[0]))] if rows else []
+    with instrumentation.stage('write', stem) as timed:
+        write_csv([header] + rows, done_path, lineterminator='\n')
+        timed.rows = len(rows)
+    print(f"  Saved as: {done_path.name} ({len(rows)} rows, {len(header)} columns)")
+
+
+def standard_rows(rows: List[List[str]]) -> List[List[str]]:
+    """
+    Drop the state name and header rows, keeping only the standards.
+    """
+    for index, row in enumerate(rows):
+        if row and row[0] == "Keyword":
+            return rows[index + 1:]
+    return rows
+
+
+def process_state_rows(rows: List[List[str]], stem: str, file_params: Dict[str, bool],
+                       special_rules: Dict[str, list], output_dir: Path,
+                       checkpoints: bool = False, stats: Optional[StateStats] = None,
+                       grammars: Optional[Dict[str, IndicatorGrammar]] = None) -> List[List[str]]:
+    """
+    Run one state's sheet rows through fill -> transpose -> split -> special case
+    -> empty row drop -> schema check -> NA normalization -> concat, and return the final rows.
+    The split uses the state's grammar in grammars, or the default rules (see indicator_grammar).
+    With stats, the rows of every stage are counted as they go through, and the
+    indicator cells to review are kept in stats.review.
+    Raises SchemaError, before the secondary stage, if the rows don't fit the five columns.
+    """
+    # fill, transpose, split and the special case rules run as one stream, so they are timed together
+    with instrumentation.stage('transform', stem) as timed:
+        # process_states_cleaner stage (streamed)
+        if stats is not None:
+            rows = stats.count('read', rows)
+        rows = transform_rows(rows, file_params, stats, (grammars or {}).get(stem))
+        if checkpoints:
+            rows = list(rows)
+            write_csv(rows, output_dir / f"{stem}_edited.csv")
+
+        # special_case_cleaning stage: special case rules and empty row drop in one pass
+        rules = special_rules.get(stem, [])
+        if rules:
+            print(f"  Applying {len(rules)} special case rule(s)")
+        profile = ColumnProfile()
+        rows = list(profile.profile(track(stats, 'special', apply_special_rules, rows, rules)))
+        if checkpoints:
+            write_csv(rows, output_dir / f"{stem}_00.csv")
+        timed.rows = len(rows)
+
+    # Schema check: drop blank columns after the fifth, stop on real extra or missing columns
+    width = check_schema(profile, stem, file_params['concat'])
+    if width < profile.width:
+        print(f"  Dropped {profile.width - width} blank column(s) after column index {width - 1}")
+        rows = trim_columns(rows, width)
+    if stats is not None:
+        schema_stats = stats.stage('schema')
+        schema_stats.record_table(len(rows), len(rows), min(width, profile.width))
+        schema_stats.counts['columns_trimmed'] += profile.width - min(width, profile.width)
+
+    # secondary_cleaning stage
+    if not rows:
+        return rows
+    with instrumentation.stage('secondary', stem) as timed:
+        counts = stats.stage('secondary').counts if stats is not None else None
+        df = normalize_na(pd.DataFrame(pad_rows(rows), dtype=str), counts)
+        if file_params['concat']:
+            df = concat_extra_columns(df, counts)
+        if stats is not None:
+            stats.stage('secondary').record_table(len(rows), len(df), len(df.columns))
+        timed.rows = len(df)
+
+    return df.values.tolist()
+
+
+def run_pipeline(excel_file: str, params_file: str, output_dir: str,
+                 suffix: str = "_MS", checkpoints: bool = False,
+                 transliterate: bool = False, incremental: bool = True,
+                 extra_params_files: Optional[List[str]] = None,
+                 corpus_path: Optional[str] = None,
+                 special_rules_file: str = "MS_special_rules.csv",
+                 workbook_cache: Optional[WorkbookCache] = None,
+                 indicator_grammar_file: str = grammar_file) -> None:
+    """
+    Process every state in the params file from the workbook straight to its
+    _done.csv file.
+    With incremental=True, states whose sheet content and params rows (in params_file,
+    any extra_params_files and special_rules_file) are unchanged since the last run keep their output.
+    With corpus_path, every state's rows are also merged into one corpus file (see merge_corpus).
+    The row counts of every stage are saved to the run report in output_dir (see run_stats).
+    With a workbook_cache, the workbook is only parsed if the cache doesn't have it.
+    The indicator cells the split grammar couldn't settle are listed in indicator_review.csv
+    in output_dir; states with their own rules in indicator_grammar_file are rebuilt when
+    those rules change.
+    The output files, manifest included, are published to output_dir when the run is done.
+    """
+    # merge_corpus imports from this module
+    from merge_corpus import build_corpus, read_done_file, write_corpus
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    params = read_params_file(params_file)
+    grammars = load_grammars(indicator_grammar_file)
+    special_rules = load_special_rules(special_rules_file)
+    params_rows = read_params_rows([params_file] + (extra_params_files or [])
+                                   + [special_rules_file, indicator_grammar_file])
+    run_stats = RunStats()
+
+    print(f"\nReading workbook {excel_file}")
+
+    processed = []
+    skipped = []
+    reused = []
+    seen = set()
+    # Rows kept for the corpus are held compactly until it is built, see compact_table
+    corpus_pool = ValuePool()
+    corpus_rows = []
+
+    # Everything is written to the run folder and published when the loop is done
+    with OutputRun(output_dir, resumable=True) as output_run:
+        run_dir = output_run.directory
+        manifest = Manifest(output_run.update(MANIFEST_NAME))
+
+        for sheet, sheet_rows in iter_workbook_sheets(excel_file, transliterate, workbook_cache):
+            stem = f"{sheet}{suffix}"
+            file_params = params.get(f"{stem}.csv")
+
+            # Sheets without a row in the params file (overview tabs, etc.) are not states
+            if file_params is None:
+                continue
+            seen.add(f"{stem}.csv")
+
+            print(f"\nProcessing {stem}")
+
+            if file_params['skip']:
+                print(f"  Skip flag = 1, skipping this state")
+                skipped.append(stem)
+                continue
+
+            try:
+                # Reading includes parsing the sheet and cleaning its text
+                with instrumentation.stage('read', stem) as timed:
+                    rows = read_sheet_rows(sheet_rows)
+                    timed.rows = len(rows)
+                done_name = f"{stem}_done.csv"
+
+                sheet_hash = hash_rows(rows)
+                params_hash = hash_rows(params_rows.get(stem, []))
+                if incremental and manifest.is_current(stem, sheet_hash, params_hash, output_run.path(done_name)):
+                    print(f"  Unchanged since last run, keeping {done_name}")
+                    reused.append(stem)
+                    if corpus_path:
+                        corpus_rows.append((sheet, CompactTable(read_done_file(output_run.path(done_name)),
+                                                                corpus_pool)))
+                    continue
+
+                manifest.forget(stem)
+                if checkpoints:
+                    write_csv(rows, run_dir / f"{stem}.csv", encoding='utf-8-sig')
+
+                state_stats = StateStats()
+                rows = process_state_rows(rows, stem, file_params, special_rules, run_dir, checkpoints,
+                                          state_stats, grammars)
+
+                write_done_file(rows, run_dir / done_name, stem)
+                manifest.record(stem, sheet_hash, params_hash, run_dir / done_name)
+                run_stats.add(stem, state_stats)
+                processed.append(stem)
+                if corpus_path:
+                    corpus_rows.append((sheet, CompactTable(rows, corpus_pool)))
+
+            except Exception as e:
+                # The last run's _done.csv is withdrawn too, so the corpus doesn't pick it up
+                print(f"  Error processing {stem}: {str(e)}")
+                manifest.forget(stem)
+                output_run.remove(f"{stem}_done.csv")
+                run_stats.fail(stem, e)
+                continue
+
+        for state_file in params:
+            if state_file not in seen:
+                print(f"\nWarning: Sheet not found for {state_file}")
+
+        print()
+        run_stats.save(output_run.update(REPORT_NAME))
+        write_review(run_stats.review, output_run.update(REVIEW_NAME))
+
+    if corpus_path:
+        print()
+        write_corpus(build_corpus(corpus_rows), corpus_path)
+
+    print(f"\n{'='*60}")
+    print(f"Pipeline complete!")
+    print(f"Successfully processed {len(processed)} states")
+    print(f"Reused {len(reused)} unchanged states")
+    print(f"Skipped {len(skipped)} states (skip flag = 1)")
+    print(f"{'='*60}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the full cleaning process in memory")
+    parser.add_argument("--excel-file", default="2026-02-27 Middle School Data.xlsx")
+    parser.add_argument("--params-file", default="MS_params.csv")
+    parser.add_argument("--output-dir", default="ms_2026")
+    parser.add_argument("--suffix", default="_MS")
+    parser.add_argument("--checkpoints", action="store_true",
+                        help="also write the intermediate _MS, _edited and _00 files")
+    parser.add_argument("--transliterate", action="store_true",
+                        help="keep curly quotes and dashes as ASCII quotes and dashes instead of spaces")
+    parser.add_argument("--secondary-params-file", action="append", default=[],
+                        help="extra params file whose rows also decide when a state is rebuilt "
+                             "(e.g. ms_params_secondary.csv); can be given more than once")
+    parser.add_argument("--full", action="store_true",
+                        help="rebuild every state, even if its sheet and params are unchanged")
+    parser.add_argument("--special-rules-file", default="MS_special_rules.csv")
+    parser.add_argument("--indicator-grammar-file", default=grammar_file,
+                        help="per-state rules for splitting indicator codes (see indicator_grammar)")
+    parser.add_argument("--corpus", help="also merge every state into this corpus file (.parquet, .arrow or .feather)")
+    parser.add_argument("--workbook-cache", default=CACHE_DIR,
+                        help="folder of the parsed-workbook cache (see workbook_cache); '' to parse the workbook every time")
+    parser.add_argument("--run-log", help="append timing and memory records of every stage and state to this JSON lines file")
+    parser.add_argument("--summary", action="store_true", help="print a table of the run log at the end")
+    args = parser.parse_args()
+    if args.run_log:
+        instrumentation.enable(args.run_log)
+
+    run_pipeline(args.excel_file, args.params_file, args.output_dir,
+                 args.suffix, args.checkpoints, args.transliterate,
+                 not args.full, args.secondary_params_file, args.corpus,
+                 args.special_rules_file, open_cache(args.workbook_cache),
+                 args.indicator_grammar_file)
+    if args.summary:
+        instrumentation.print_summary()
+
+
+if __name__ == "__main__":
+    main()
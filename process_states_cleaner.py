@@ -1,10 +1,17 @@
 import csv
 import os
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Counter, Dict, Iterable, Iterator, List, Optional, Tuple
 import shutil
+import argparse
 import pandas as pd
 
+from scheduler import run_jobs
+from output_run import OutputRun, WRITE_BUFFER, current_path
+from run_stats import REPORT_NAME, RunStats, StateStats, track
+from indicator_grammar import DEFAULT_GRAMMAR, REVIEW_NAME, IndicatorGrammar, grammar_file, load_grammars, write_review
+import instrumentation
+
 
 def read_params_file(params_path: str) -> Dict[str, Dict[str, bool]]:
     """
@@ -24,7 +31,9 @@ def read_params_file(params_path: str) -> Dict[str, Dict[str, bool]]:
                     'fill': row['fill'] == '1' ,
                     'transpose': row['transpose'] == '1',
                     'split': row['split'] == '1',
-                    'review': row['review'] == '1'
+                    'review': row['review'] == '1',
+                    'special': row.get('special') == '1',
+                    'concat': row.get('concat') == '1'
                 }
         
         print(f"Loaded parameters for {len(params)} files")
@@ -42,43 +51,13 @@ def check_flag_status(filepath: Path) -> bool:
     """
     return filepath.stem.endswith('_FLAG')
 
-def safe_write_file(input_path: Path, output_path: Path, write_function) -> Path:
-    """
-    Safely write to a new file using a temporary file.
-    """
-    # Create a temporary file path
-    temp_path = output_path.parent / f"temp_{output_path.name}"
-    
-    try:
-        # Write to temporary file first
-        write_function(input_path, temp_path)
-        
-        # If the output file already exists, try to remove it
-        if output_path.exists():
-            try:
-                output_path.unlink()
-            except PermissionError:
-                print(f"Error: Cannot overwrite existing file {output_path.name} - permission denied")
-                if temp_path.exists():
-                    temp_path.unlink()
-                raise
-        
-        # Rename temporary file to final output file
-        temp_path.rename(output_path)
-        return output_path
-    
-    except Exception as e:
-        # Clean up temporary file if something goes wrong
-        if temp_path.exists():
-            temp_path.unlink()
-        raise e
-
-def fill_empty_cells(rows: List[List[str]]) -> List[List[str]]:
+def fill_empty_cells(rows: Iterable[List[str]], stats: Optional[Counter] = None) -> Iterator[List[str]]:
     """
     Fill empty cells in the first column with values from previous rows.
     Preserves completely blank rows.
+    Streams: rows are yielded one at a time as they are read.
+    Counts the filled cells in stats['cells_filled'] when stats is given.
     """
-    output_rows = []
     found_keyword = False
     prev_first_col = ""
     
@@ -86,52 +65,60 @@ def fill_empty_cells(rows: List[List[str]]) -> List[List[str]]:
         if not found_keyword:
             if row and row[0] == "Keyword":
                 found_keyword = True
-            output_rows.append(row)
+            yield row
             continue
         
         # If row is completely empty, preserve it
         if not any(row):
-            output_rows.append(row)
+            yield row
             prev_first_col = ""
             continue
         
         # Fill empty first column with previous value
         if not row[0]:
             row[0] = prev_first_col
+            if stats is not None and prev_first_col:
+                stats['cells_filled'] += 1
         prev_first_col = row[0]
-        output_rows.append(row)
-    
-    return output_rows
+        yield row
 
-def transpose_columns(rows: List[List[str]]) -> List[List[str]]:
+def transpose_columns(rows: Iterable[List[str]], stats: Optional[Counter] = None) -> Iterator[List[str]]:
     """
     Transpose data from columns after the 4th column into new rows,
     copying the first three columns' content.
+    Streams: rows are yielded one at a time as they are read.
+    Counts the new rows in stats['transposed_rows'] when stats is given.
     """
-    output_rows = []
-    
     for row in rows:
         if len(row) <= 4:
-            output_rows.append(row)
+            yield row
             continue
         
         # Write the base row with first 4 columns
-        output_rows.append(row[:4])
+        yield row[:4]
         
         # Create new rows for additional columns
         for extra_col in row[4:]:
             if extra_col.strip():
-                new_row = row[:3] + [extra_col]
-                output_rows.append(new_row)
-    
-    return output_rows
+                if stats is not None:
+                    stats['transposed_rows'] += 1
+                yield row[:3] + [extra_col]
 
-def process_split_indicators(rows: List[List[str]], was_transposed: bool) -> List[List[str]]:
+def process_split_indicators(rows: Iterable[List[str]], was_transposed: bool,
+                             grammar: Optional[IndicatorGrammar] = None, review: Optional[List[dict]] = None,
+                             stats: Optional[Counter] = None) -> Iterator[List[str]]:
     """
-    Split the fourth column based on specific rules.
+    Split the fourth column into indicator code and text with the state's grammar
+    (see indicator_grammar; the default rules when not given).
+    Streams: rows are yielded one at a time as they are read.
+    Adds the cells the grammar couldn't split with confidence to review when given.
+    Counts the rows dropped for having fewer than 4 columns in stats['short_rows_dropped'],
+    and the cells to review in stats['indicators_no_rule'] and stats['indicators_ambiguous'],
+    when stats is given.
     """
-    output_rows = []
     start_processing = was_transposed  # Start immediately if file was rearranged
+    split = (grammar or DEFAULT_GRAMMAR).split
+    row_number = 0
     
     for row in rows:
         # Look for "Keyword" row if file wasn't rearranged
@@ -141,107 +128,96 @@ def process_split_indicators(rows: List[List[str]], was_transposed: bool) -> Lis
             continue
         
         if len(row) < 4:
+            if stats is not None:
+                stats['short_rows_dropped'] += 1
             continue
         
         text = row[3].strip()
-        code = ""
-        description = text
+        code, description, finding = split(text)
+        row_number += 1
+        if finding is not None:
+            status, names = finding
+            if stats is not None:
+                stats[f'indicators_{status}'] += 1
+            if review is not None:
+                review.append({'row': row_number, 'status': status, 'rules': ';'.join(names),
+                               'code': code, 'text': text})
         
-        # Handle special prefixes
-        if text.startswith(('Theme ', 'Era ', 'SS ', 'LIST OF TOPICS')):
-            parts = text.split(' ', 2)
-            if len(parts) >= 3:
-                code = f"{parts[0]} {parts[1]}"
-                description = parts[2]
-        elif text.startswith(('The ', 'Students ')):
-            code = ""
-            description = text
-        else:
-            parts = text.split(' ', 1)
-            if len(parts) == 2:
-                code = parts[0]
-                description = parts[1]
-            else:
-                code = text
-                description = ""
-        
-        new_row = row[:3] + [code, description]
-        output_rows.append(new_row)
-    
-    return output_rows
+        yield row[:3] + [code, description]
+
 
+def transform_rows(rows: Iterable[List[str]], file_params: Dict[str, bool],
+                   stats: Optional[StateStats] = None,
+                   grammar: Optional[IndicatorGrammar] = None) -> Iterator[List[str]]:
+    """
+    Chain the fill, transpose and split steps the params ask for into one row stream.
+    The split uses the state's indicator grammar (the default rules when not given).
+    With stats, each step's rows are counted as they stream through and the cells
+    the split couldn't settle are kept in stats.review.
+    """
+    if file_params['fill']:
+        rows = track(stats, 'fill', fill_empty_cells, rows)
+    if file_params['transpose']:
+        rows = track(stats, 'transpose', transpose_columns, rows)
+    if file_params['split']:
+        rows = track(stats, 'split', process_split_indicators, rows, file_params['transpose'],
+                     grammar, stats.review if stats is not None else None)
+    return iter(rows)
 
-def count_columns_in_csvs(folder, output_file="column_counts.csv"):
-    folder = Path(folder)
+
+def write_column_counts(run_stats: RunStats, output_file="column_counts.csv"):
+    """
+    Save the column count of every _edited.csv file, taken from the row counts
+    collected while the files were processed.
+    """
     results = []
 
-    for csv_file in folder.glob("*.csv"):
-        df = pd.read_csv(csv_file, nrows=0)
+    for stem, state_stats in sorted(run_stats.states.items()):
         results.append({
-            "file": csv_file.name,
-            "num_columns": len(df.columns)
+            "file": f"{stem}_edited.csv",
+            "num_columns": state_stats.last_stage().max_columns
         })
 
-    pd.DataFrame(results).to_csv(output_file, index=False)
+    pd.DataFrame(results, columns=["file", "num_columns"]).to_csv(output_file, index=False)
     print(f"Saved results to {output_file}")
 
 
-def process_file(input_path: Path, file_params: Dict[str, bool]) -> None:
+def process_file(input_path: Path, file_params: Dict[str, bool], output_dir: Optional[Path] = None,
+                 grammar: Optional[IndicatorGrammar] = None) -> Optional[StateStats]:
     """
-    Process a single file with all required operations and save to a single output file.
+    Process a single file with all required operations and save to a single output file
+    in output_dir (the run folder, see output_run; the input's folder if not given).
+    Indicators are split with grammar (the default rules when not given).
+    Returns the row counts of each step, or None for a skipped file.
     """
-    # Read input file
-    with open(input_path, 'r', encoding='utf-8', newline='') as infile:
-        rows = list(csv.reader(infile))
+    print(f"\nProcessing {input_path.name}")
+    output_dir = Path(output_dir) if output_dir is not None else input_path.parent
     
     # Apply operations
     if not file_params['skip']:
-        # Fill empty cells for all non-skipped files
-        if file_params['fill']:
-            rows = fill_empty_cells(rows)
-            print(f"Completed filling cells in {input_path.name}")
-        
-        # Apply transpose operation if rearrange is true
-        if file_params['transpose']:
-            rows = transpose_columns(rows)
-            print(f"Completed transposing columns in {input_path.name}")
-        
-        # Apply split operation
-        if file_params['split']:
-            rows = process_split_indicators(rows, file_params['transpose'])
-            print(f"Completed splitting indicators in {input_path.name}")
-        
         # Write final output file
-        output_path = input_path.parent / f"{input_path.stem}_edited{input_path.suffix}"
+        output_path = output_dir / f"{input_path.stem}_edited{input_path.suffix}"
         try:
-            # Create a temporary file path
-            temp_path = output_path.parent / f"temp_{output_path.name}"
+            # Stream rows from the input file through fill, transpose and split
+            # straight into the output file
+            with instrumentation.stage('process_states_cleaner', input_path.stem) as timed, \
+                    open(input_path, 'r', encoding='utf-8', newline='') as infile, \
+                    open(output_path, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER) as outfile:
+                writer = csv.writer(outfile)
+                stats = StateStats()
+                rows = stats.count('read', csv.reader(infile))
+                writer.writerows(transform_rows(rows, file_params, stats, grammar))
+                timed.rows = stats.last_stage().rows_out
             
-            try:
-                # Write to temporary file first
-                with open(temp_path, 'w', encoding='utf-8', newline='') as outfile:
-                    writer = csv.writer(outfile)
-                    writer.writerows(rows)
-                
-                # If the output file already exists, try to remove it
-                if output_path.exists():
-                    try:
-                        output_path.unlink()
-                    except PermissionError:
-                        print(f"Error: Cannot overwrite existing file {output_path.name} - permission denied")
-                        if temp_path.exists():
-                            temp_path.unlink()
-                        raise
-                
-                # Rename temporary file to final output file
-                temp_path.rename(output_path)
-                print(f"Saved processed file as {output_path.name}")
-                
-            except Exception as e:
-                # Clean up temporary file if something goes wrong
-                if temp_path.exists():
-                    temp_path.unlink()
-                raise e
+            if file_params['fill']:
+                print(f"Completed filling cells in {input_path.name}")
+            if file_params['transpose']:
+                print(f"Completed transposing columns in {input_path.name}")
+            if file_params['split']:
+                print(f"Completed splitting indicators in {input_path.name}")
+            
+            print(f"Saved processed file as {output_path.name}")
+            return stats
                 
         except Exception as e:
             print(f"Error saving processed file: {str(e)}")
@@ -250,16 +226,21 @@ def process_file(input_path: Path, file_params: Dict[str, bool]) -> None:
         # Handle skipped files
         if not check_flag_status(input_path):
             try:
-                flagged_path = input_path.parent / f"{input_path.stem}_FLAG{input_path.suffix}"
+                flagged_path = output_dir / f"{input_path.stem}_FLAG{input_path.suffix}"
                 shutil.copy2(input_path, flagged_path)
                 print(f"Added FLAG suffix to {input_path.name}")
             except PermissionError:
                 print(f"Error: Cannot create flagged file {flagged_path.name}")
                 raise
 
-def process_files(folder_path: str, params_file: str) -> None:
+def process_files(folder_path: str, params_file: str, workers: int = 1,
+                  indicator_grammar_file: str = grammar_file) -> Optional[RunStats]:
     """
     Main function to process all files according to their parameters.
+    With workers > 1 the files are processed in parallel on a process pool.
+    Indicators are split with the state rules in indicator_grammar_file (see indicator_grammar).
+    Returns the row counts of every processed file, which are also saved to the
+    run report in the folder.
     """
     try:
         folder_path = Path(folder_path)
@@ -268,6 +249,7 @@ def process_files(folder_path: str, params_file: str) -> None:
             return
         
         params = read_params_file(params_file)
+        grammars = load_grammars(indicator_grammar_file)
         
         stats = {
             'skip': [],
@@ -276,22 +258,38 @@ def process_files(folder_path: str, params_file: str) -> None:
             'split': [],
             'review': []
         }
+        run_stats = RunStats()
         
         print("\nBeginning file processing...")
         
+        jobs = []
         for state, file_params in params.items():
-            input_file = folder_path / f"{state}"
+            input_file = current_path(folder_path, state)
             
             if not input_file.exists():
                 print(f"\nWarning: File not found: {input_file.name}")
                 continue
             
-            print(f"\nProcessing {input_file.name}")
+            jobs.append((state, input_file, file_params))
+        
+        if workers > 1:
+            print(f"Processing {len(jobs)} files with {workers} workers")
+        
+        # Process the files into the run folder; results come back in params file order.
+        # The new files are published together once the whole run is done (see output_run).
+        with OutputRun(folder_path) as output_run:
+            results = run_jobs(process_file, [(input_file, file_params, output_run.directory,
+                                               grammars.get(input_file.stem))
+                                              for _, input_file, file_params in jobs], workers)
+        
+            for (state, input_file, file_params), (state_stats, error) in zip(jobs, results):
+                if error is not None:
+                    print(f"Error processing {input_file.name}: {str(error)}")
+                    output_run.remove(f"{input_file.stem}_edited{input_file.suffix}")
+                    run_stats.fail(input_file.stem, error)
+                    continue
+                run_stats.add(input_file.stem, state_stats)
             
-            try:
-                # Process the file
-                process_file(input_file, file_params)
-                
                 # Update statistics
                 if file_params['skip']:
                     stats['skip'].append(state)
@@ -301,22 +299,24 @@ def process_files(folder_path: str, params_file: str) -> None:
                         stats['transpose'].append(state)
                     if file_params['split']:
                         stats['split'].append(state)
-                    if file_params['review']:
+                    # States marked in the params file, and those with indicator cells the split couldn't settle
+                    if file_params['review'] or state_stats.review:
                         stats['review'].append(state)
                         print(f"Marking {state} for review")
-                
-            except Exception as e:
-                print(f"Error processing {input_file.name}: {str(e)}")
-                continue
         
-        print("\n=== Processing Summary ===")
-        for param, files in stats.items():
-            print(f"\n{param.capitalize()} parameter:")
-            print(f"Number of files: {len(files)}")
-            if files:
-                print("Files:")
-                for file in files:
-                    print(f"- {file}")
+            print("\n=== Processing Summary ===")
+            for param, files in stats.items():
+                print(f"\n{param.capitalize()} parameter:")
+                print(f"Number of files: {len(files)}")
+                if files:
+                    print("Files:")
+                    for file in files:
+                        print(f"- {file}")
+        
+            run_stats.save(output_run.update(REPORT_NAME))
+            write_review(run_stats.review, output_run.update(REVIEW_NAME))
+        print(f"Published the new files to {folder_path}")
+        return run_stats
       
     
     except Exception as e:
@@ -332,14 +332,27 @@ def main():
     
     #Main entry point of the script.
     
+    parser = argparse.ArgumentParser(description="Fill, transpose and split the state CSV files")
+    parser.add_argument("--workers", type=int, default=1, help="number of files to process in parallel")
+    parser.add_argument("--run-log", help="append timing and memory records of every file to this JSON lines file")
+    parser.add_argument("--summary", action="store_true", help="print a table of the run log at the end")
+    parser.add_argument("--indicator-grammar-file", default=grammar_file,
+                        help="per-state rules for splitting indicator codes (see indicator_grammar)")
+    args = parser.parse_args()
+    if args.run_log:
+        instrumentation.enable(args.run_log)
+    
     try:
         folder_path = r'C:\Users\kates\Dropbox\Academics\Research Projects\State Standards\ss_standards\ms_2026'
         params_file = r'C:\Users\kates\Dropbox\Academics\Research Projects\State Standards\ss_standards\MS_params.csv'
         
-        process_files(folder_path, params_file)
+        run_stats = process_files(folder_path, params_file, args.workers, args.indicator_grammar_file)
         print( "SUCCESS! DONE PROCESSING")
         print("Counting Columns")
-        count_columns_in_csvs(folder_path, "ms_column_counts.csv")
+        if run_stats is not None:
+            write_column_counts(run_stats, "ms_column_counts.csv")
+        if args.summary:
+            instrumentation.print_summary()
 
     except Exception as e:
         print(f"\nError: {str(e)}")
@@ -0,0 +1,216 @@
+import json
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+
+# Row and column counts collected while the rows stream through each stage, so
+# the summaries (column counts, col-row-count.csv) don't need another pass over
+# the files. Stages record into a StateStats per state file; the run keeps one
+# StateStats per state and writes them all to a single JSON run report.
+#
+# Besides rows in / rows out and column widths, the steps count their own work:
+#   fill       cells_filled         first-column cells filled from the row above
+#   transpose  transposed_rows      rows made from the columns after the 4th
+#   split      short_rows_dropped   rows with fewer than 4 columns removed
+#              indicators_no_rule   cells only split at the first space (see indicator_grammar)
+#              indicators_ambiguous cells two grammar rules split differently
+#   special    empty_rows_dropped   completely empty rows removed
+#   secondary  na_replaced          column 1 values set to "no_content"
+#              columns_concatenated columns joined into column 4
+#
+# A state that fails in a stage is listed under "failed" with the error, until a
+# later run gets it through; its output file is withdrawn (see output_run).
+
+REPORT_NAME = "run_report.json"
+REPORT_VERSION = 1
+
+
+class StageStats:
+    """
+    Counts for one stage of one state.
+    """
+
+    def __init__(self):
+        self.rows_in = 0
+        self.rows_out = 0
+        self.widths = Counter()
+        self.counts = Counter()
+
+    def count_in(self, rows: Iterable[List[str]]) -> Iterator[List[str]]:
+        for row in rows:
+            self.rows_in += 1
+            yield row
+
+    def count_out(self, rows: Iterable[List[str]]) -> Iterator[List[str]]:
+        for row in rows:
+            self.rows_out += 1
+            self.widths[len(row)] += 1
+            yield row
+
+    def record_table(self, rows_in: int, rows_out: int, columns: int) -> None:
+        """
+        Record a stage that works on a whole table of rows_out rows by columns columns.
+        """
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+        if rows_out:
+            self.widths[columns] += rows_out
+
+    @property
+    def max_columns(self) -> int:
+        return max(self.widths) if self.widths else 0
+
+    @property
+    def modal_columns(self) -> int:
+        return self.widths.most_common(1)[0][0] if self.widths else 0
+
+    def merge(self, other: 'StageStats') -> None:
+        self.rows_in += other.rows_in
+        self.rows_out += other.rows_out
+        self.widths.update(other.widths)
+        self.counts.update(other.counts)
+
+    def to_dict(self) -> dict:
+        return {
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'max_columns': self.max_columns,
+            'modal_columns': self.modal_columns,
+            'widths': {str(width): count for width, count in sorted(self.widths.items())},
+            **dict(sorted(self.counts.items())),
+        }
+
+
+class StateStats:
+    """
+    Stage counts for one state file, in the order the stages ran, and the cells
+    the split flagged for review.
+    """
+
+    def __init__(self):
+        self.stages = {}
+        self.review = []
+
+    def stage(self, name: str) -> StageStats:
+        if name not in self.stages:
+            self.stages[name] = StageStats()
+        return self.stages[name]
+
+    def count(self, name: str, rows: Iterable[List[str]]) -> Iterator[List[str]]:
+        """
+        Count rows passing through unchanged, e.g. as they are read from a file.
+        """
+        stage = self.stage(name)
+        return stage.count_out(stage.count_in(rows))
+
+    def last_stage(self) -> Optional[StageStats]:
+        return list(self.stages.values())[-1] if self.stages else None
+
+    def to_dict(self) -> dict:
+        return {name: stage.to_dict() for name, stage in self.stages.items()}
+
+
+def track(stats: Optional[StateStats], name: str, step: Callable, rows: Iterable[List[str]],
+          *args) -> Iterator[List[str]]:
+    """
+    Run a streaming step, counting its rows under the stage name when stats are collected.
+    The step gets the stage's counts as its stats argument.
+    """
+    if stats is None:
+        return step(rows, *args)
+    stage = stats.stage(name)
+    return stage.count_out(step(stage.count_in(rows), *args, stats=stage.counts))
+
+
+class RunStats:
+    """
+    Stage counts for every state of a run, saved as one JSON report.
+    """
+
+    def __init__(self):
+        self.started = datetime.now().isoformat(timespec='seconds')
+        self.states = {}
+        self.review = {}
+        self.failed = {}
+
+    def state(self, stem: str) -> StateStats:
+        if stem not in self.states:
+            self.states[stem] = StateStats()
+        return self.states[stem]
+
+    def add(self, stem: str, state_stats: Optional[StateStats]) -> None:
+        """
+        Add the counts of a state processed elsewhere (e.g. in a worker process).
+        """
+        if state_stats is None:
+            return
+        state = self.state(stem)
+        for name, stage in state_stats.stages.items():
+            state.stage(name).merge(stage)
+        self.review[stem] = state_stats.review
+
+    def fail(self, stem: str, error: Exception) -> None:
+        self.failed[stem] = str(error)
+
+    def totals(self) -> Dict[str, StageStats]:
+        totals = {}
+        for state in self.states.values():
+            for name, stage in state.stages.items():
+                totals.setdefault(name, StageStats()).merge(stage)
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            'version': REPORT_VERSION,
+            'started': self.started,
+            'states': {stem: state.to_dict() for stem, state in sorted(self.states.items())},
+            'totals': {name: stage.to_dict() for name, stage in self.totals().items()},
+            'failed': dict(sorted(self.failed.items())),
+        }
+
+    def save(self, path: Path) -> None:
+        """
+        Write the run report. The scripts that run one stage each all save to the
+        same report, so a report already at the path is updated: the stages counted
+        in this run replace their earlier counts and everything else is kept.
+        """
+        path = Path(path)
+        report = RunStats()
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+            if previous.get('version') == REPORT_VERSION:
+                report = RunStats.from_dict(previous)
+
+        report.started = self.started
+        for stem, state in self.states.items():
+            report.state(stem).stages.update(state.stages)
+            report.failed.pop(stem, None)
+        report.failed.update(self.failed)
+
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report.to_dict(), f, indent=2)
+        print(f"Run report saved to {path}")
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RunStats':
+        """
+        Rebuild the counts of a saved report.
+        """
+        run = cls()
+        run.started = data.get('started', run.started)
+        run.failed = dict(data.get('failed', {}))
+        for stem, stages in data.get('states', {}).items():
+            state = run.state(stem)
+            for name, values in stages.items():
+                stage = state.stage(name)
+                values = dict(values)
+                stage.rows_in = values.pop('rows_in', 0)
+                stage.rows_out = values.pop('rows_out', 0)
+                stage.widths.update({int(width): count for width, count in values.pop('widths', {}).items()})
+                values.pop('max_columns', None)
+                values.pop('modal_columns', None)
+                stage.counts.update(values)
+        return run
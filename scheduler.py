@@ -0,0 +1,71 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain, islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+
+# Every state file is independent, so the per-state work in
+# process_states_cleaner, special_case_cleaning and secondary_cleaning
+# can be sent to a process pool. Results always come back in job order,
+# so summaries print the same way no matter how many workers are used.
+# Jobs can come from a generator: on a pool each job is sent off as soon as it
+# is made, so making the jobs (e.g. reading a workbook) overlaps with running them.
+# iter_completed gives each result as soon as its job is done instead, for callers
+# that record progress per job (e.g. a manifest an interrupted run resumes from).
+
+
+def _run_job(func: Callable, args: tuple) -> Tuple[Any, Optional[Exception]]:
+    """
+    Run one job, returning its error instead of raising it.
+    """
+    try:
+        return func(*args), None
+    except Exception as e:
+        return None, e
+
+
+def run_jobs(func: Callable, jobs: Iterable[tuple], workers: int = 1) -> List[Tuple[Any, Optional[Exception]]]:
+    """
+    Run func(*args) for every args tuple in jobs, on a process pool when workers > 1.
+    Returns a list of (result, error) pairs in the same order as jobs. A job that
+    raises gets its exception as the error and does not stop the other jobs.
+    func must be a module-level function so it can be sent to the worker processes.
+    """
+    if workers <= 1:
+        return [_run_job(func, args) for args in jobs]
+
+    jobs = iter(jobs)
+    first = list(islice(jobs, 2))
+    if len(first) <= 1:
+        return [_run_job(func, args) for args in first]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run_job, func, args) for args in chain(first, jobs)]
+        return [future.result() for future in futures]
+
+
+def iter_completed(func: Callable, jobs: Iterable[tuple], workers: int = 1
+                   ) -> Iterator[Tuple[int, Any, Optional[Exception]]]:
+    """
+    Run func(*args) for every args tuple in jobs like run_jobs, but yield
+    (job index, result, error) as each job finishes, while later jobs are still
+    being made and run. On a pool the results come in the order the jobs finish.
+    """
+    if workers <= 1:
+        for index, args in enumerate(jobs):
+            yield (index,) + _run_job(func, args)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            pending = {}
+            for index, args in enumerate(jobs):
+                pending[executor.submit(_run_job, func, args)] = index
+                for future in [future for future in pending if future.done()]:
+                    yield (pending.pop(future),) + future.result()
+            for future in as_completed(pending):
+                yield (pending[future],) + future.result()
+        except BaseException:
+            # Interrupted (or the caller stopped): cancel the jobs still queued and
+            # wait only for the running ones
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
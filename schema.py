@@ -0,0 +1,134 @@
+from typing import Iterable, Iterator, List
+
+import pandas as pd
+
+
+# Every state should come out with the five columns
+#   Keyword, Grade/Area, Course, Indicator, Standard
+# A profile of the columns is collected while the rows stream through (how many
+# standard rows fill each column and the longest value in it), then checked:
+#   - columns after the fifth that are blank in every standard row ("phantom"
+#     columns, usually a stray space in the sheet) are dropped
+#   - text after the fifth column is an error, unless the state's concat flag
+#     joins it into the Standard column
+#   - fewer than five columns is an error
+# Rows before the "Keyword" header row (state name, header) are not profiled.
+
+STANDARD_WIDTH = 5
+
+
+class SchemaError(ValueError):
+    """
+    A state's rows don't fit the five-column layout.
+    """
+
+
+class ColumnProfile:
+    """
+    Per-column fill counts and longest values of a state's standard rows.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.width = 0
+        self.filled = []
+        self.longest = []
+
+    def _grow(self, width: int) -> None:
+        if width > len(self.filled):
+            extra = width - len(self.filled)
+            self.filled.extend([0] * extra)
+            self.longest.extend([0] * extra)
+
+    def profile(self, rows: Iterable[List[str]]) -> Iterator[List[str]]:
+        """
+        Profile rows as they stream through, passing them on unchanged.
+        """
+        in_standards = False
+        buffered = []
+        for row in rows:
+            self.width = max(self.width, len(row))
+            if in_standards:
+                self._add(row)
+            elif row and row[0] == "Keyword":
+                in_standards = True
+            else:
+                # Sheets without a "Keyword" row are profiled in full, see below
+                buffered.append(row)
+            yield row
+
+        if not in_standards:
+            for row in buffered:
+                self._add(row)
+
+    def _add(self, row: List[str]) -> None:
+        self.rows += 1
+        self._grow(len(row))
+        for column, cell in enumerate(row):
+            if cell.strip():
+                self.filled[column] += 1
+                if len(cell) > self.longest[column]:
+                    self.longest[column] = len(cell)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'ColumnProfile':
+        """
+        Profile a table of string cells all at once.
+        """
+        profile = cls()
+        profile.width = len(df.columns)
+        first = df.iloc[:, 0] if len(df.columns) else pd.Series(dtype=str)
+        header = first.index[first == "Keyword"]
+        standards = df.loc[header[0] + 1:] if len(header) else df
+
+        cells = standards.apply(lambda column: column.str.strip())
+        profile.rows = len(standards)
+        profile.filled = [int(count) for count in cells.ne('').sum()]
+        profile.longest = [int(length) for length in cells.where(cells.ne('')).apply(lambda column: column.str.len()).max().fillna(0)]
+        profile._grow(profile.width)
+        return profile
+
+    def non_empty_ratio(self, column: int) -> float:
+        return self.filled[column] / self.rows if self.rows and column < len(self.filled) else 0.0
+
+    def used_width(self) -> int:
+        """
+        Number of columns up to the last one with text in a standard row.
+        """
+        for column in range(len(self.filled) - 1, -1, -1):
+            if self.filled[column]:
+                return column + 1
+        return 0
+
+    def to_dict(self) -> dict:
+        return {
+            'rows': self.rows,
+            'width': self.width,
+            'non_empty_ratio': [round(self.non_empty_ratio(column), 3) for column in range(len(self.filled))],
+            'longest': self.longest,
+        }
+
+
+def check_schema(profile: ColumnProfile, stem: str, concat: bool = False) -> int:
+    """
+    Check a profile against the five-column layout and return the number of
+    columns to keep. Raises SchemaError for text after the fifth column (unless
+    concat will join it) or for fewer than five columns.
+    """
+    if profile.width < STANDARD_WIDTH:
+        raise SchemaError(f"{stem} has {profile.width} columns, expected {STANDARD_WIDTH}")
+
+    used = max(profile.used_width(), STANDARD_WIDTH)
+    if used > STANDARD_WIDTH and not concat:
+        extra = [f"column index {column} ({profile.filled[column]} of {profile.rows} rows)"
+                 for column in range(STANDARD_WIDTH, used) if profile.filled[column]]
+        raise SchemaError(f"{stem} has text after column index {STANDARD_WIDTH - 1}: {', '.join(extra)}; "
+                          f"fix the sheet or set concat = 1 in the params file")
+    return used
+
+
+def trim_columns(rows: List[List[str]], width: int) -> List[List[str]]:
+    """
+    Drop the columns after width (checked to be blank by check_schema).
+    """
+    return [row[:width] for row in rows]
@@ -1,158 +1,238 @@
 import pandas as pd
 import os
+import argparse
 from pathlib import Path
 
-def process_csv_files(data_folder, params_file):
+from scheduler import run_jobs
+from output_run import OutputRun, current_path
+from run_stats import REPORT_NAME, RunStats, StateStats
+from schema import ColumnProfile, check_schema
+import instrumentation
+
+# Values in column index 1 that mean "no content for this keyword"
+NA_VALUES = ['', 'NA', 'N/A', 'na', 'n/a']
+
+
+def pad_rows(rows):
+    """
+    Pad every row to the width of the widest row, the way a DataFrame would.
+    """
+    width = max((len(row) for row in rows), default=0)
+    return [row + [''] * (width - len(row)) for row in rows]
+
+
+def normalize_na(df, stats=None):
+    """
+    STEP 1: Replace empty, NA, or N/A in column index 1 with "no_content".
+    Counts the replaced values in stats['na_replaced'] when stats is given.
+    """
+    if len(df.columns) > 1:
+        col_name = df.columns[1]
+        is_na = df[col_name].isin(NA_VALUES)
+        df[col_name] = df[col_name].mask(is_na, "no_content")
+        if stats is not None:
+            stats['na_replaced'] += int(is_na.sum())
+    return df
+
+
+def concat_extra_columns(df, stats=None):
+    """
+    STEP 2: Concatenate column index 4 and beyond into column index 4 with ' +++ ',
+    skipping empty values, then drop the extra columns.
+    Counts the dropped columns in stats['columns_concatenated'] when stats is given.
+    """
+    if len(df.columns) <= 5:
+        return df
+
+    col_index_4 = df.columns[4]
+    cols_to_concat = df.columns[5:]
+
+    # Join one column at a time; the separator is only added between two non-empty values
+    joined = df[col_index_4]
+    for col in cols_to_concat:
+        value = df[col]
+        both = joined.ne('') & value.ne('')
+        joined = (joined + ' +++ ' + value).where(both, joined + value)
+
+    df[col_index_4] = joined
+    if stats is not None:
+        stats['columns_concatenated'] += len(cols_to_concat)
+    return df.drop(columns=cols_to_concat)
+
+
+def read_state_file(csv_file):
+    """
+    Read a _00.csv file with every cell as a string; empty cells stay ''.
+    """
+    return pd.read_csv(csv_file, header=None, dtype=str, keep_default_na=False, encoding='utf-8')
+
+
+def process_state_file(csv_file, concat_flag, output_dir=None):
+    """
+    Run the secondary cleaning steps on one _00.csv file and save it as _done.csv
+    in output_dir (the run folder; the _00.csv file's folder if not given).
+    The _00.csv file is left as it is. Returns the _done.csv file name, its column
+    count and the row counts. Raises SchemaError, before anything is written, if the
+    file doesn't fit the five columns.
+    """
+    print(f"Processing: {csv_file.name}")
+
+    with instrumentation.stage('secondary_cleaning', csv_file.name[:-len('_00.csv')]) as timed:
+        # Read the CSV file
+        df = read_state_file(csv_file)
+        stats = StateStats()
+        stage = stats.stage('secondary')
+        rows_in = len(df)
+
+        # Drop blank columns after the fifth; stop on real extra or missing columns
+        width = check_schema(ColumnProfile.from_frame(df), csv_file.name[:-len('_00.csv')], concat_flag == 1)
+        if width < len(df.columns):
+            print(f"  ✓ Dropped {len(df.columns) - width} blank column(s) after column index {width - 1}")
+            stage.counts['columns_trimmed'] += len(df.columns) - width
+            df = df.iloc[:, :width]
+
+        df = normalize_na(df, stage.counts)
+        print(f"  ✓ Replaced empty/NA values in column index 1")
+
+        if concat_flag == 1:
+            num_columns = len(df.columns)
+            df = concat_extra_columns(df, stage.counts)
+            if num_columns > 5:
+                print(f"  ✓ Concatenated {num_columns - 4} columns into column index 4")
+            else:
+                print(f"  File has {num_columns} columns (≤5), no concatenation needed")
+
+        # Save as _done.csv
+        done_file = Path(output_dir or csv_file.parent) / csv_file.name.replace('_00.csv', '_done.csv')
+        df.to_csv(done_file, index=False, encoding='utf-8')
+        print(f"  ✓ Saved as: {done_file.name}")
+        print()
+        stage.record_table(rows_in, len(df), len(df.columns))
+        timed.rows = len(df)
+
+    # Track column count for the _done.csv file
+    return {
+        'file': done_file.name,
+        'columns': len(df.columns),
+        'stats': stats
+    }
+
+
+def process_csv_files(data_folder, params_file, workers=1):
     """
     Process CSV files according to parameters file specifications.
-    
+
     Args:
         data_folder: Path to the folder containing CSV files (ms_2026)
         params_file: Path to the parameters CSV file
+        workers: Number of files to process in parallel
     """
     # Read parameters file
     print(f"Reading parameters file: {params_file}")
     params_df = pd.read_csv(params_file, encoding = 'utf-8')
-    
+
     # Fill NaN values in skip and concat columns with 0
     params_df['skip'] = params_df['skip'].fillna(0).astype(int)
     params_df['concat'] = params_df['concat'].fillna(0).astype(int)
-    
+
     print(f"\nProcessing files in: {data_folder}")
     print(f"Found {len(params_df)} entries in parameters file\n")
-    
+
     data_path = Path(data_folder)
     processed_count = 0
     skipped_count = 0
     column_counts = []
-    
+    run_stats = RunStats()
+    jobs = []
+
     # Iterate through each row in the parameters file
     for idx, row in params_df.iterrows():
         state_name = row['state']
         skip_flag = row['skip']
         concat_flag = row['concat']
-        
+
         # Construct the _00.csv filename
         csv_filename = f"{state_name}_00.csv"
-        csv_file = data_path / csv_filename
-        
-        print(f"Processing: {csv_filename}")
-        
+        csv_file = current_path(data_path, csv_filename)
+
         # Check if skip flag is set
         if skip_flag == 1:
+            print(f"Processing: {csv_filename}")
             print(f"  ⊗ Skip flag = 1, skipping this file")
             skipped_count += 1
             print()
             continue
-        
+
         # Check if file exists
         if not csv_file.exists():
+            print(f"Processing: {csv_filename}")
             print(f"  Warning: File not found, skipping...")
             continue
-        
-        # Read the CSV file
-        try:
-            df = pd.read_csv(csv_file, header=None, encoding = 'utf-8')
-        except Exception as e:
-            print(f"  Error reading file: {e}")
-            continue
-        
-        # STEP 1: Replace empty, NA, or N/A in column index 1 with "no_content"
-        if len(df.columns) > 1:
-            # Get column at index 1
-            col_name = df.columns[1]
-            
-            # Replace empty strings, NA, N/A with "no_content"
-            df[col_name] = df[col_name].fillna("no_content")
-            df[col_name] = df[col_name].replace(['', 'NA', 'N/A', 'na', 'n/a'], "no_content")
-            
-            # Save the modified file back to _00.csv
-            df.to_csv(csv_file, index=False)
-            print(f"  ✓ Replaced empty/NA values in column index 1")
-        
-        # STEP 2: Check if concat is needed
-        if concat_flag == 1:
-            print(f"  Concat flag = 1, processing concatenation...")
-            
-            # Check if there are more than 5 columns
-            if len(df.columns) > 5:
-                # Get column at index 4
-                col_index_4 = df.columns[4]
-                
-                # Get all columns from index 5 onwards
-                cols_to_concat = df.columns[5:]
-                
-                # Concatenate columns index 4 and beyond
-                def concat_row(row):
-                    values = [str(row[col_index_4])]
-                    for col in cols_to_concat:
-                        values.append(str(row[col]))
-                    # Filter out 'nan' strings from the concatenation
-                    values = [v for v in values if v != 'nan']
-                    return ' +++ '.join(values)
-                
-                df[col_index_4] = df.apply(concat_row, axis=1)
-                
-                # Drop columns from index 5 onwards
-                df = df.drop(columns=cols_to_concat)
-                
-                print(f"  ✓ Concatenated {len(cols_to_concat) + 1} columns into column index 4")
-            else:
-                print(f"  File has {len(df.columns)} columns (≤5), no concatenation needed")
-            
-            # Save as _done.csv
-            done_file = csv_file.parent / csv_file.name.replace('_00.csv', '_done.csv')
-            df.to_csv(done_file, index=False, encoding= 'utf-8')
-            print(f"  ✓ Saved as: {done_file.name}")
-            
-        else:
-            # concat_flag = 0, just rename _00.csv to _done.csv
-            print(f"  Concat flag = 0, renaming file...")
-            done_file = csv_file.parent / csv_file.name.replace('_00.csv', '_done.csv')
-            df.to_csv(done_file, index=False)
-            print(f"  ✓ Saved as: {done_file.name}")
-        
-        # Track column count for the _done.csv file
-        num_columns = len(df.columns)
-        column_counts.append({
-            'file': done_file.name,
-            'columns': num_columns
-        })
-
-        processed_count += 1
-        print()
-    
-    print(f"\n{'='*60}")
-    print(f"Processing complete!")
-    print(f"Successfully processed {processed_count} files")
-    print(f"Skipped {skipped_count} files (skip flag = 1)")
-    print(f"{'='*60}")
-
-     # Display column count summary
-    if column_counts:
+
+        jobs.append((state_name, csv_file, concat_flag))
+
+    # Process the files into the run folder; results come back in parameters
+    # file order. The _done.csv files are published together at the end (see output_run)
+    with OutputRun(data_path) as output_run:
+        results = run_jobs(process_state_file, [(csv_file, concat_flag, output_run.directory)
+                                                for _, csv_file, concat_flag in jobs], workers)
+
+        for (state_name, csv_file, _), (info, error) in zip(jobs, results):
+            if error is not None:
+                print(f"  Error processing {csv_file.name}: {error}")
+                output_run.remove(f"{state_name}_done.csv")
+                run_stats.fail(state_name, error)
+                continue
+
+            column_counts.append(info)
+            run_stats.add(state_name, info['stats'])
+            processed_count += 1
+
         print(f"\n{'='*60}")
-        print(f"COLUMN COUNT SUMMARY (_done.csv files)")
-        print(f"{'='*60}")
-        for info in column_counts:
-            print(f"{info['file']}: {info['columns']} columns")
+        print(f"Processing complete!")
+        print(f"Successfully processed {processed_count} files")
+        print(f"Skipped {skipped_count} files (skip flag = 1)")
         print(f"{'='*60}")
 
+         # Display column count summary
+        if column_counts:
+            print(f"\n{'='*60}")
+            print(f"COLUMN COUNT SUMMARY (_done.csv files)")
+            print(f"{'='*60}")
+            for info in column_counts:
+                print(f"{info['file']}: {info['columns']} columns")
+            print(f"{'='*60}")
+
+        run_stats.save(output_run.update(REPORT_NAME))
+    print(f"Published the new files to {data_folder}")
+    return run_stats
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Secondary cleaning: NA values and concatenation")
+    parser.add_argument("--workers", type=int, default=1, help="number of files to process in parallel")
+    parser.add_argument("--run-log", help="append timing and memory records of every file to this JSON lines file")
+    parser.add_argument("--summary", action="store_true", help="print a table of the run log at the end")
+    args = parser.parse_args()
+    if args.run_log:
+        instrumentation.enable(args.run_log)
+
     # Set up paths
     # Assuming the script is run from the parent directory of ms_2026
     data_folder = "ms_2026"
     params_file = "ms_params.csv"  # In the parent folder
-    
+
     # Check if paths exist
     if not os.path.exists(data_folder):
         print(f"Error: Data folder '{data_folder}' not found!")
         print(f"Current directory: {os.getcwd()}")
         exit(1)
-    
+
     if not os.path.exists(params_file):
         print(f"Error: Parameters file '{params_file}' not found!")
         print(f"Current directory: {os.getcwd()}")
         exit(1)
-    
+
     # Process the files
-    process_csv_files(data_folder, params_file)
\ No newline at end of file
+    process_csv_files(data_folder, params_file, args.workers)
+    if args.summary:
+        instrumentation.print_summary()
\ No newline at end of file
@@ -0,0 +1,218 @@
+import argparse
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from excel_to_csv import iter_workbook_sheets, read_sheet_rows
+from process_states_cleaner import read_params_file
+from pipeline import process_state_rows, standard_rows
+from schema import SchemaError
+from special_case_cleaning import load_special_rules
+from indicator_grammar import IndicatorGrammar, grammar_file, load_grammars
+from workbook_cache import CACHE_DIR, WorkbookCache, open_cache
+
+
+# Compare two downloads of the standards workbook (e.g. 2026-02-12 and 2026-02-14)
+# and report which standards were added, removed or modified in each state.
+#
+# Each sheet goes through the same cleaning as the pipeline (in memory, nothing
+# is written), then every standard is keyed by keyword + indicator. Standards
+# without an indicator are keyed by a hash of their content instead, so for
+# them an edit shows up as one removal plus one addition.
+
+
+def row_key(row: List[str]) -> Tuple[str, str]:
+    """
+    Key a standard by keyword + indicator, or keyword + content hash when there is no indicator.
+    """
+    keyword = row[0] if row else ''
+    indicator = row[3] if len(row) > 3 else ''
+    if indicator:
+        return keyword, indicator
+
+    content = '\x1f'.join(row[1:]).encode('utf-8')
+    return keyword, '#' + hashlib.sha1(content).hexdigest()[:12]
+
+
+def keyed_rows(rows: List[List[str]]) -> Dict[Tuple[str, str, int], List[str]]:
+    """
+    Map each standard's key to its row. Repeated keys within a state are numbered
+    in the order they appear.
+    """
+    keyed = {}
+    seen = {}
+    for row in rows:
+        key = row_key(row)
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        keyed[key + (occurrence,)] = row
+    return keyed
+
+
+def iter_state_rows(excel_file: str, params: Dict[str, Dict[str, bool]], special_rules: Dict[str, list],
+                    suffix: str = "_MS", workbook_cache: Optional[WorkbookCache] = None,
+                    grammars: Optional[Dict[str, IndicatorGrammar]] = None,
+                    skipped: Optional[Dict[str, str]] = None,
+                    skip_flagged: Optional[Set[str]] = None) -> Iterator[Tuple[str, List[List[str]]]]:
+    """
+    Stream (state, standard rows) for every sheet of the workbook that has a row in the params file.
+    States with skip = 1 in the params file are left out, as in the pipeline, and
+    added to skip_flagged when given.
+    States that fail the schema check (see schema) are left out with a warning, and
+    added to skipped with the reason when given.
+    """
+    for sheet, sheet_rows in iter_workbook_sheets(excel_file, cache=workbook_cache):
+        stem = f"{sheet}{suffix}"
+        file_params = params.get(f"{stem}.csv")
+        if file_params is None:
+            continue
+        if file_params['skip']:
+            if skip_flagged is not None:
+                skip_flagged.add(sheet)
+            continue
+
+        try:
+            rows = process_state_rows(read_sheet_rows(sheet_rows), stem, file_params, special_rules, Path('.'),
+                                      grammars=grammars)
+        except SchemaError as e:
+            print(f"  Warning: {e}; {sheet} left out of the diff")
+            if skipped is not None:
+                skipped[sheet] = str(e)
+            continue
+        yield sheet, standard_rows(rows)
+
+
+def diff_state(state: str, old_rows: Dict, new_rows: Dict) -> List[dict]:
+    """
+    List the added, removed and modified standards of one state.
+    """
+    changes = []
+    for key, row in old_rows.items():
+        new_row = new_rows.get(key)
+        if new_row is None:
+            changes.append({'state': state, 'change': 'removed', 'key': list(key), 'old': row, 'new': None})
+        elif new_row != row:
+            changes.append({'state': state, 'change': 'modified', 'key': list(key), 'old': row, 'new': new_row})
+
+    for key, row in new_rows.items():
+        if key not in old_rows:
+            changes.append({'state': state, 'change': 'added', 'key': list(key), 'old': None, 'new': row})
+
+    return changes
+
+
+def diff_workbooks(old_file: str, new_file: str, params_file: str, suffix: str = "_MS",
+                   jsonl_path: Optional[str] = None,
+                   special_rules_file: str = "MS_special_rules.csv",
+                   workbook_cache: Optional[WorkbookCache] = None,
+                   indicator_grammar_file: str = grammar_file
+                   ) -> Tuple[Dict[str, Dict[str, int]], Dict[str, str], List[str]]:
+    """
+    Diff two workbooks state by state. Returns the number of added, removed and
+    modified standards per state, the states left out because they failed the
+    schema check in either workbook (with the reason), and the states left out
+    because of their skip flag; writes every change, and every state that failed
+    the schema check, to jsonl_path if given.
+    """
+    params = read_params_file(params_file)
+    special_rules = load_special_rules(special_rules_file)
+    grammars = load_grammars(indicator_grammar_file)
+
+    # Only the old workbook is held in memory; the new one is streamed against it
+    print(f"\nReading {old_file}")
+    old_skipped = {}
+    skip_flagged = set()
+    old_states = {state: keyed_rows(rows) for state, rows in iter_state_rows(old_file, params, special_rules, suffix,
+                                                                                  workbook_cache, grammars, old_skipped,
+                                                                                  skip_flagged)}
+
+    print(f"\nComparing with {new_file}")
+    summary = {}
+    new_skipped = {}
+    feed = open(jsonl_path, 'w', encoding='utf-8') if jsonl_path else None
+
+    try:
+        for state, rows in iter_state_rows(new_file, params, special_rules, suffix, workbook_cache, grammars,
+                                           new_skipped, skip_flagged):
+            # A state that couldn't be cleaned in the old workbook can't be compared
+            if state in old_skipped:
+                continue
+            changes = diff_state(state, old_states.pop(state, {}), keyed_rows(rows))
+            summary[state] = _count_changes(changes)
+            if feed:
+                for change in changes:
+                    feed.write(json.dumps(change) + '\n')
+
+        # A state that couldn't be cleaned in one of the workbooks is left out of the
+        # diff, rather than showing up as all removed or all added
+        skipped = {}
+        for workbook, states in (('old', old_skipped), ('new', new_skipped)):
+            for state, reason in states.items():
+                old_states.pop(state, None)
+                skipped[state] = f"{workbook}: {reason}" if state not in skipped else f"{skipped[state]}; {workbook}: {reason}"
+                if feed:
+                    feed.write(json.dumps({'state': state, 'change': 'skipped', 'workbook': workbook,
+                                           'reason': reason}) + '\n')
+
+        # States that are no longer in the new workbook
+        for state, old_rows in old_states.items():
+            changes = diff_state(state, old_rows, {})
+            summary[state] = _count_changes(changes)
+            if feed:
+                for change in changes:
+                    feed.write(json.dumps(change) + '\n')
+    finally:
+        if feed:
+            feed.close()
+
+    return summary, skipped, sorted(skip_flagged)
+
+
+def _count_changes(changes: List[dict]) -> Dict[str, int]:
+    counts = {'added': 0, 'removed': 0, 'modified': 0}
+    for change in changes:
+        counts[change['change']] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report the standards that changed between two workbook downloads")
+    parser.add_argument("old_file", help="older workbook, e.g. '2026-02-12 Middle School Data.xlsx'")
+    parser.add_argument("new_file", help="newer workbook, e.g. '2026-02-14 Middle School Data.xlsx'")
+    parser.add_argument("--params-file", default="MS_params.csv")
+    parser.add_argument("--suffix", default="_MS")
+    parser.add_argument("--jsonl", help="write every change to this JSON lines file")
+    parser.add_argument("--special-rules-file", default="MS_special_rules.csv")
+    parser.add_argument("--indicator-grammar-file", default=grammar_file,
+                        help="per-state rules for splitting indicator codes (see indicator_grammar)")
+    parser.add_argument("--workbook-cache", default=CACHE_DIR,
+                        help="folder of the parsed-workbook cache (see workbook_cache); '' to parse the workbooks every time")
+    args = parser.parse_args()
+
+    summary, skipped, skip_flagged = diff_workbooks(args.old_file, args.new_file, args.params_file, args.suffix,
+                                                    args.jsonl, args.special_rules_file,
+                                                    open_cache(args.workbook_cache), args.indicator_grammar_file)
+
+    print(f"\n{'='*60}")
+    print("CHANGES BY STATE")
+    print(f"{'='*60}")
+    changed = 0
+    for state, counts in sorted(summary.items()):
+        if any(counts.values()):
+            changed += 1
+            print(f"{state}: {counts['added']} added, {counts['removed']} removed, {counts['modified']} modified")
+    print(f"\n{changed} of {len(summary)} states changed")
+    if skip_flagged:
+        print(f"{len(skip_flagged)} state(s) not compared, skip flag = 1: {', '.join(skip_flagged)}")
+    if skipped:
+        print(f"\n{len(skipped)} state(s) left out, they failed the schema check:")
+        for state, reason in sorted(skipped.items()):
+            print(f"  {state} ({reason})")
+    if args.jsonl:
+        print(f"Changes saved to {args.jsonl}")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
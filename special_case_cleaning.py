@@ -1,286 +1,193 @@
-import pandas as pd
 import os
+import csv
+import re
+import argparse
+from typing import Callable, Counter, Dict, Iterable, Iterator, List, Optional
+
+from scheduler import run_jobs
+from output_run import OutputRun, glob_current, write_rows
+from run_stats import REPORT_NAME, RunStats, StateStats, track
+import instrumentation
 
 # Define the subfolder containing the CSV files
 data_folder = "ms_2026"
 
-def process_ky_ms(input_file, output_file):
+# Special case rules: one row per step, applied in file order
+rules_file = "MS_special_rules.csv"
+
+# A rule takes one row and returns the transformed row. Rules are small classes
+# rather than closures so they can be sent to worker processes.
+Rule = Callable[[List[str]], List[str]]
+
+
+def read_rows(input_file):
     """
-    Process KY_MS_edited.csv: Concatenate columns C and D (index 2 and 3) with a '+' separator
+    Read a CSV file as a list of raw rows
     """
-    print(f"Processing {input_file}...")
-    
-    # Read the CSV file
-    df = pd.read_csv(input_file, header=None, encoding='utf-8')
-    
-    # Concatenate columns at index 2 and 3 with '+'
-    df[2] = df[2].astype(str) + ' + ' + df[3].astype(str)
-    
-    # Drop the old column D (index 3)
-    df = df.drop(columns=[3])
-    
-    # Save to output file
-    df.to_csv(output_file, index=False, header=False, encoding='utf-8')
-    print(f"Saved to {output_file}")
-    print(f"Shape: {df.shape}\n")
+    with open(input_file, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        return list(reader)
+
 
-def process_mn_ms(input_file, output_file):
+class SplitColumn:
     """
-    Process MN_MS_edited.csv: Concatenate columns C and D + E (index 2 and 3 and 4) with a '+' separator
+    Split a column at the first delimiter: the left part stays, the right part
+    goes into a new column right after it. Rows without the delimiter get a blank
+    new column after the column ("blank_after"), or before it ("blank_before") so
+    the unsplit text ends up in the right-hand column.
+    (AL: grade/course at '/' and indicator/standard at '.', HI: grade/course at ':')
     """
-    print(f"Processing {input_file}...")
-    
-    # Read the CSV file
-    df = pd.read_csv(input_file, header=None, encoding='utf-8')
-    
-    # Concatenate columns at index 2 and 3 with '+'
-    df[2] = df[2].astype(str) + ' + ' + df[3].astype(str) + ' + ' + df[4].astype(str)
-    
-    # Drop the old column D (index 3)
-    df = df.drop(columns=[3, 4])
-    
-    # Save to output file
-    df.to_csv(output_file, index=False, header=False, encoding='utf-8')
-    print(f"Saved to {output_file}")
-    print(f"Shape: {df.shape}\n")
+    def __init__(self, column: int, delimiter: str, no_match: str = "blank_after"):
+        if no_match not in ("blank_after", "blank_before"):
+            raise ValueError(f"no_match must be blank_after or blank_before, not '{no_match}'")
+        self.column = column
+        self.delimiter = delimiter
+        self.blank_at = column if no_match == "blank_before" else column + 1
+
+    def __call__(self, row):
+        column = self.column
+        if len(row) > column and self.delimiter in row[column]:
+            left, right = row[column].split(self.delimiter, 1)
+            return row[:column] + [left, right] + row[column + 1:]
+        return row[:self.blank_at] + [''] + row[self.blank_at:]
 
-def process_oh_ms(input_file, output_file):
+
+class ConcatColumns:
     """
-    Process OH_MS_edited.csv: Insert a blank column between C and D (new blank column at index 3)
+    Join the non-empty values of the columns with the separator into the first
+    of them and drop the others. (KY: columns C + D, MN: columns C + D + E)
+    Completely empty rows are left alone so they are still dropped.
     """
-    print(f"Processing {input_file}...")
-    
-    # Read the CSV file
-    df = pd.read_csv(input_file, header=None, encoding='utf-8')
-    
-    # Insert a blank column at index 3
-    df.insert(3, 'blank_col', '')
-    
-    # Save to output file
-    df.to_csv(output_file, index=False, header=False, encoding='utf-8')
-    print(f"Saved to {output_file}")
-    print(f"Shape: {df.shape}\n")
+    def __init__(self, columns: List[int], separator: str):
+        self.columns = columns
+        self.separator = separator
+
+    def __call__(self, row):
+        first, rest = self.columns[0], self.columns[1:]
+        if not any(row) or len(row) <= first:
+            return row
+        values = [row[i] for i in self.columns if i < len(row) and row[i]]
+        new_row = [cell for i, cell in enumerate(row) if i not in rest]
+        new_row[first] = self.separator.join(values)
+        return new_row
 
 
-def process_al(input_file, output_file):
+class InsertBlankColumn:
     """
-    Process AL_edited.csv: Starting from row 4 (index 3), split column 2 at '/'
-    Left part stays in column 2, right part goes to new column 3
+    Insert a blank column at the index. (OH: between C and D)
     """
-    print(f"Processing {input_file}...")
-    
-    # Read the CSV file as raw rows
-    import csv
-    
-    with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-    
-    # Process each row starting from index 3 (4th row)
-    new_rows = []
-    for row in rows:
-        
-        # Split grade and course title
-
-        if len(row) > 2 and '/' in row[1]:
-            parts = row[1].split('/', 1)
-            # Insert new column at index 2
-            new_row = row[:2] + [''] + row[2:]
-            new_row[1] = parts[0]  # Left part stays in column 2
-            new_row[2] = parts[1]  # Right part goes to column 3
-        else:
-            # No slash, just insert blank column at index 3
-            new_row = row[:2] + [''] + row[2:]
-    
-        
-        # Secend Step: Split indicator and standard text
+    def __init__(self, column: int):
+        self.column = column
 
-        if len(new_row) > 3 and '.' in new_row[3]:
-            parts = new_row[3].split('.', 1)
-            new_row = new_row[:4] + [''] + new_row[4:]
-            new_row[3] = parts[0]
-            new_row[4] = parts[1]
+    def __call__(self, row):
+        return row[:self.column] + [''] + row[self.column:]
 
-        else:
-            new_row = new_row[:4] + [''] + new_row[5:]
 
-        new_rows.append(new_row)
-    
-        # Write to output file
-    with open(output_file, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerows(new_rows)
-    
-    print(f"Saved to {output_file}")
-    print(f"Rows processed: {len(new_rows)}\n")
- 
+class ExtractToColumn:
+    """
+    Move the first group of a regex match out of the source column into a new
+    column inserted at target; the text before the match stays in the source column.
+    Rows without a match get a blank new column. (MA: "[ID]" at the end of column C)
+    """
+    def __init__(self, source: int, target: int, pattern: str):
+        self.source = source
+        self.target = target
+        self.regex = re.compile(pattern)
 
-def process_hi(input_file, output_file):
-    
-    """ process Hawaii file to split grade and course name at the ':' 
+    def __call__(self, row):
+        source, target = self.source, self.target
+        match = self.regex.search(row[source]) if len(row) > source else None
+        if match:
+            new_row = row[:source] + [row[source][:match.start()].strip()] + row[source + 1:]
+            return new_row[:target] + [match.group(1)] + new_row[target:]
+        return row[:target] + [''] + row[target:]
+
+
+def _column_list(columns: str) -> List[int]:
+    return [int(column) for column in columns.split(';')]
+
+
+# operation name -> builds the rule from the "columns", "value" and "no_match" fields of the rules file
+OPERATIONS = {
+    'split_column': lambda columns, value, no_match: SplitColumn(int(columns), value, no_match or "blank_after"),
+    'concat_columns': lambda columns, value, no_match: ConcatColumns(_column_list(columns), value),
+    'insert_blank_column': lambda columns, value, no_match: InsertBlankColumn(int(columns)),
+    'extract_to_column': lambda columns, value, no_match: ExtractToColumn(*_column_list(columns), value),
+}
+
+
+def load_special_rules(path: str = rules_file) -> Dict[str, List[Rule]]:
     """
-    
-    print(f"Processing {input_file}...")
-    
-    # Read the CSV file as raw rows
-    import csv
-    
-    with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-    
-    # Process each row starting from index 3 (4th row)
-    new_rows = []
-    for row in rows:
-        
-        # Split grade and course title
-        if len(row) > 2 and ':' in row[1]:
-            parts = row[1].split(':', 1)
-            # Insert new column at index 2
-            new_row = row[:2] + [''] + row[2:]
-            new_row[1] = parts[0]  # Left part stays in column 2
-            new_row[2] = parts[1]  # Right part goes to column 3
-        else:
-            # No slash, just insert blank column at index 3
-            new_row = row[:2] + [''] + row[2:]
-    
-        new_rows.append(new_row)
-    
-        # Write to output file
-    with open(output_file, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerows(new_rows)
-    
-    print(f"Saved to {output_file}")
-    print(f"Rows processed: {len(new_rows)}\n")
+    Read the special case rules file and compile each state's rules, keyed by
+    file stem (e.g. "AL_MS"). Columns: state, operation, columns, value, no_match
+    """
+    rules = {}
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            operation = OPERATIONS.get(row['operation'])
+            if operation is None:
+                raise ValueError(f"{path} line {line}: unknown operation '{row['operation']}'")
+            try:
+                rule = operation(row['columns'], row['value'], row.get('no_match'))
+            except (ValueError, TypeError, re.error) as e:
+                raise ValueError(f"{path} line {line}: {e}")
+            rules.setdefault(row['state'], []).append(rule)
+    return rules
 
-def process_mo(input_file, output_file):
-    
-    """ process MO file to split indicator and standard at the '|' 
+
+def apply_special_rules(rows: Iterable[List[str]], rules: List[Rule],
+                        stats: Optional[Counter] = None) -> Iterator[List[str]]:
+    """
+    Apply a state's rules to every row and drop completely empty rows, in one pass.
+    Counts the dropped rows in stats['empty_rows_dropped'] when stats is given.
     """
-    
-    print(f"Processing {input_file}...")
-    
-    # Read the CSV file as raw rows
-    import csv
-    
-    with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-    
-    # Process each row starting from index 3 (4th row)
-    new_rows = []
     for row in rows:
-        
-        # Split grade and course title
-        if len(row) > 3 and '|' in row[3]:
-            parts = row[3].split('|', 1)
-            # Insert new column at index 2
-            new_row = row[:3] + [''] + row[3:]
-            new_row[3] = parts[0]  # Left part stays in column 4
-            new_row[4] = parts[1]  # Right part goes to column 5
-        else:
-            # No slash, just insert blank column at index 3
-            new_row = row[:3] + [''] + row[3:]
-    
-        new_rows.append(new_row)
-    
-        # Write to output file
-    with open(output_file, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerows(new_rows)
-    
-    print(f"Saved to {output_file}")
-    print(f"Rows processed: {len(new_rows)}\n")
+        for rule in rules:
+            row = rule(row)
+        if any(cell.strip() for cell in row):
+            yield row
+        elif stats is not None:
+            stats['empty_rows_dropped'] += 1
 
-def process_ma_ms(input_file, output_file):
+
+def process_special_file(input_path, output_path, rules):
     """
-    Process MA_MS_edited.csv: Extract ID in square brackets from end of column 3
-    and place it in a new column at index 4
+    Apply the rules to one _edited.csv file, drop empty rows and save it as _00.csv.
+    Returns the row counts.
     """
-    print(f"Processing {input_file}...")
-    
-    # Read the CSV file as raw rows
-    import csv
-    import re
-    
-    with open(input_file, 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        rows = list(reader)
-    
-    # Process each row
-    new_rows = []
-    for row in rows:
-        if len(row) > 2:
-            col3_content = row[2]
-            
-            # Look for content in square brackets at the end
-            match = re.search(r'\s*\[([^\]]+)\]\s*$', col3_content)
-            
-            if match:
-                # Extract the ID (content inside brackets)
-                id_text = match.group(1)
-                # Remove the bracketed text from column 3
-                cleaned_text = col3_content[:match.start()].strip()
-                
-                # Build new row: columns 0-3, then new column with ID, then rest
-                new_row = row[:2] + [cleaned_text] + [id_text] + row[3:]
-            else:
-                # No brackets found, insert blank column at index 4
-                new_row = row[:3] + [''] + row[3:]
-        else:
-            # Row doesn't have column 3, just add blank at index 4
-            new_row = row[:3] + [''] + row[3:]
-        
-        new_rows.append(new_row)
-    
-    # Write to output file
-    with open(output_file, 'w', encoding='utf-8', newline='') as f:
-        writer = csv.writer(f)
-        writer.writerows(new_rows)
-    
-    print(f"Saved to {output_file}")
-    print(f"Rows processed: {len(new_rows)}\n")
+    print(f"Processing {os.path.basename(input_path)}...")
+    
+    stats = StateStats()
+    stem = os.path.basename(input_path)[:-len("_edited.csv")]
+    with instrumentation.stage('special_case_cleaning', stem) as timed:
+        rows = read_rows(input_path)
+        new_rows = list(track(stats, 'special', apply_special_rules, rows, rules))
+        write_rows(new_rows, output_path)
+        timed.rows = len(new_rows)
+    
+    print(f"Saved to {os.path.basename(output_path)}")
+    if rules:
+        print(f"Applied {len(rules)} special case rule(s)")
+    print(f"Removed {len(rows) - len(new_rows)} empty row(s), {len(new_rows)} rows remaining\n")
+    return stats
 
 
-def generate_summary(folder):
+def generate_summary(folder, run_stats):
     """
     Generate a summary CSV file with filename, column count, and row count
-    for all CSV files in the folder
+    for every _00.csv file, from the row counts collected while they were written
     """
     print("=" * 60)
     print("Generating summary file...")
     print("=" * 60 + "\n")
     
-    import csv
-    import glob
-    
-    # Get all CSV files in the folder
-    csv_files = glob.glob(os.path.join(folder, "*_00.csv"))
-    
     summary_data = []
     
-    for filepath in sorted(csv_files):
-        filename = os.path.basename(filepath)
-        
-        # Skip the summary file itself if it already exists
-        if filename == "col-row-count.csv":
-            continue
-        
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                rows = list(reader)
-                
-                num_rows = len(rows)
-                num_cols = len(rows[0]) if rows else 0
-                
-                summary_data.append([filename, num_cols, num_rows])
-                print(f"{filename}: {num_cols} columns, {num_rows} rows")
-        
-        except Exception as e:
-            print(f"Error reading {filename}: {e}")
-            summary_data.append([filename, "Error", "Error"])
+    for stem, state_stats in sorted(run_stats.states.items()):
+        filename = f"{stem}_00.csv"
+        stage = state_stats.stage('special')
+        summary_data.append([filename, stage.max_columns, stage.rows_out])
+        print(f"{filename}: {stage.max_columns} columns, {stage.rows_out} rows")
     
     # Write summary file
     summary_path = os.path.join(folder, "col-row-count.csv")
@@ -292,122 +199,61 @@ def generate_summary(folder):
     print(f"\nSummary saved to {summary_path}")
     print("=" * 60 + "\n")
 
-def process_remaining_files(folder):
-    """
-    Process all remaining *_edited.csv files and all *_00.csv files:
-    - Remove completely empty rows
-    - For *_edited.csv files, save with _00.csv suffix
-    - For *_00.csv files, overwrite with cleaned version
-    """
-    print("=" * 60)
-    print("Processing remaining files - removing empty rows...")
-    print("=" * 60 + "\n")
-    
-    import csv
-    import glob
-    
-    # Get all _edited.csv and _00.csv files
-    edited_files = glob.glob(os.path.join(folder, "*_edited.csv"))
-    processed_files = glob.glob(os.path.join(folder, "*_00.csv"))
-    
-    # Track which files we've already specially processed
-    specially_processed = [
-        "KY_MS_edited.csv", 
-        "OH_MS_edited.csv", 
-        "AL_edited.csv", 
-        "MA_MS_edited.csv", 
-        "HI_MS_edited.csv", 
-        "MO_MS_edited.csv", 
-        "MN_MS_edited.csv"]
-    
-    files_to_process = []
-    
-    # Add unprocessed _edited.csv files (those not in special cases)
-    for filepath in edited_files:
-        filename = os.path.basename(filepath)
-        if filename not in specially_processed:
-            output_name = filename.replace("_edited.csv", "_00.csv")
-            output_path = os.path.join(folder, output_name)
-            files_to_process.append((filepath, output_path, filename))
-    
-    # Add all _00.csv files to be cleaned in place
-    for filepath in processed_files:
-        filename = os.path.basename(filepath)
-        files_to_process.append((filepath, filepath, filename))
-    
-    # Process each file
-    for input_path, output_path, filename in files_to_process:
-        try:
-            print(f"Processing {filename}...")
-            
-            with open(input_path, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                rows = list(reader)
-            
-            # Remove completely empty rows
-            non_empty_rows = [row for row in rows if any(cell.strip() for cell in row)]
-            
-            # Write to output file
-            with open(output_path, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerows(non_empty_rows)
-            
-            removed_count = len(rows) - len(non_empty_rows)
-            print(f"Saved to {os.path.basename(output_path)}")
-            print(f"Removed {removed_count} empty row(s), {len(non_empty_rows)} rows remaining\n")
-        
-        except Exception as e:
-            print(f"Error processing {filename}: {e}\n")
-    
-    print("=" * 60)
-    print("Empty row removal complete!")
-    print("=" * 60 + "\n")
-
 
-
-def main():
+def main(workers=1):
     """
-    Main function to process special case CSV files
+    Main function: apply the special case rules and drop empty rows for every
+    *_edited.csv file, saving each as *_00.csv
     """
     print("=" * 60)
     print("CSV File Processor - Special Cases")
     print("=" * 60 + "\n")
     
-    # Define special case files and their processing functions
-    special_cases = [
-        ("KY_MS_edited.csv", "KY_MS_00.csv", process_ky_ms),
-        ("MN_MS_edited.csv", "MN_MS_00.csv", process_mn_ms),
-        ("OH_MS_edited.csv", "OH_MS_00.csv", process_oh_ms),
-        ("AL_MS_edited.csv", "AL_MS_00.csv", process_al),
-        ("HI_MS_edited.csv", "HI_MS_00.csv", process_hi),
-        ("MO_MS_edited.csv", "MO_MS_00.csv", process_mo),
-         ("MA_MS_edited.csv", "MA_MS_00.csv", process_ma_ms)
-    ]
+    rules = load_special_rules(rules_file)
     
-    # Process each special case
-    for input_filename, output_filename, process_func in special_cases:
-        input_path = os.path.join(data_folder, input_filename)
-        output_path = os.path.join(data_folder, output_filename)
+    # The _00.csv files are written to the run folder and published
+    # together at the end (see output_run)
+    with OutputRun(data_folder) as output_run:
+        jobs = []
+        for input_path in glob_current(data_folder, "*_edited.csv"):
+            stem = os.path.basename(input_path)[:-len("_edited.csv")]
+            output_path = os.path.join(output_run.directory, f"{stem}_00.csv")
+            jobs.append((input_path, output_path, rules.get(stem, [])))
         
-        # Check if input file exists
-        if os.path.exists(input_path):
-            try:
-                process_func(input_path, output_path)
-            except Exception as e:
-                print(f"Error processing {input_filename}: {e}\n")
-        else:
-            print(f"Warning: {input_filename} not found in {data_folder}\n")
-    
-    print("=" * 60)
-    print("Processing complete!")
-    print("=" * 60)
-
-     
-    # Process remaining files to remove empty rows
-    process_remaining_files(data_folder)
+        stems = {os.path.basename(input_path)[:-len("_edited.csv")] for input_path, _, _ in jobs}
+        for stem in rules:
+            if stem not in stems:
+                print(f"Warning: {stem}_edited.csv not found in {data_folder}\n")
+        
+        results = run_jobs(process_special_file, jobs, workers)
+        
+        run_stats = RunStats()
+        for (input_path, output_path, _), (state_stats, error) in zip(jobs, results):
+            if error is not None:
+                print(f"Error processing {os.path.basename(input_path)}: {error}\n")
+                output_run.remove(os.path.basename(output_path))
+                run_stats.fail(os.path.basename(input_path)[:-len("_edited.csv")], error)
+                continue
+            run_stats.add(os.path.basename(input_path)[:-len("_edited.csv")], state_stats)
+        
+        print("=" * 60)
+        print("Processing complete!")
+        print("=" * 60)
 
-    # Generate summary file
-    generate_summary(data_folder)
+        # Generate summary file
+        generate_summary(output_run.directory, run_stats)
+        run_stats.save(output_run.update(REPORT_NAME))
+    print(f"Published the new files to {data_folder}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Clean the special case files and drop empty rows")
+    parser.add_argument("--workers", type=int, default=1, help="number of files to process in parallel")
+    parser.add_argument("--run-log", help="append timing and memory records of every file to this JSON lines file")
+    parser.add_argument("--summary", action="store_true", help="print a table of the run log at the end")
+    args = parser.parse_args()
+    if args.run_log:
+        instrumentation.enable(args.run_log)
+    
+    main(args.workers)
+    if args.summary:
+        instrumentation.print_summary()
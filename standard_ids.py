@@ -0,0 +1,177 @@
+import argparse
+import csv
+import hashlib
+import re
+from typing import Callable, List
+
+import pandas as pd
+
+
+# Stable IDs for the standards of the corpus, so rebuilds, snapshot diffs and
+# joins can key on one column.
+#
+# A standard with an indicator code gets its ID from state + normalized indicator;
+# one without gets it from state + course + normalized text. Where one indicator
+# of a state is used for standards with different text (a heading-like indicator
+# such as AL's "RISE OF ABSOLUTISM 16B", or a bad split), the first of those texts
+# in the corpus keeps the indicator's key and the text is added to the key of the
+# others, so each standard gets its own ID and a standard keeps its ID when a
+# new text under its indicator turns up later in the sheet. The ID is the state
+# code and the start of a BLAKE2b hash of the key, e.g. "CA-3f9a0c51d2e7". It
+# only changes when the key does, so re-running the cleaning keeps the same IDs.
+#
+# Which text is first is all the keys know: if a new text is put in front of the
+# indicator's first text, or the first text is removed, the new first text takes
+# the indicator's ID and the old one gets an ID keyed on its text.
+#
+# So an ID stands for one standard text of one state. The same standard listed
+# under several keywords, or repeated in a sheet, keeps one ID; the ID plus the
+# keyword is not unique either, since a state can list a standard twice under
+# the same keyword.
+
+ID_DIGEST_SIZE = 6
+
+SPACE_PATTERN = re.compile(r"\s+")
+TEXT_PATTERN = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_indicator(indicator: str) -> str:
+    """
+    Indicator code with case, inner spaces and trailing punctuation evened out: " 6.1.2. " -> "6.1.2"
+    """
+    return SPACE_PATTERN.sub(" ", indicator).strip().rstrip(".:;,").upper()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Lowercase words only, so spacing and punctuation edits don't change the ID.
+    """
+    return TEXT_PATTERN.sub(" ", text.lower()).strip()
+
+
+def loose_indicator(indicator: str) -> str:
+    """
+    Indicator with only its letters and digits, used to spot near-collisions ("6.1a" / "6-1a").
+    """
+    return TEXT_PATTERN.sub("", indicator.lower())
+
+
+def map_unique(values: pd.Series, func: Callable[[str], str]) -> pd.Series:
+    """
+    Apply func once per distinct value of a column. The result is a str column,
+    also when the column is empty, so it can be joined with other str columns.
+    """
+    codes, uniques = pd.factorize(values.astype(str))
+    mapped = pd.Index([func(value) for value in uniques], dtype=object)
+    return pd.Series(mapped.take(codes), index=values.index, dtype=object).astype(str)
+
+
+def _digest(key: str) -> str:
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=ID_DIGEST_SIZE).hexdigest()
+
+
+def id_keys(corpus: pd.DataFrame) -> pd.Series:
+    """
+    The key each standard's ID is hashed from.
+    """
+    state = corpus['state'].astype(str)
+    indicator = map_unique(corpus['indicator'], normalize_indicator)
+    course = map_unique(corpus['course'], normalize_text)
+    text = map_unique(corpus['standard'], normalize_text)
+
+    by_indicator = 'i\x1f' + state + '\x1f' + indicator
+    # An indicator shared by standards with different text keeps its key for the
+    # first text; the other texts are added to the key
+    has_indicator = indicator != ''
+    first_text = pd.DataFrame({'key': by_indicator, 'text': text}).groupby('key')['text'].transform('first')
+    later = has_indicator & (text != first_text)
+    by_indicator = by_indicator.where(~later, by_indicator + '\x1f' + text)
+
+    by_text = 't\x1f' + state + '\x1f' + course + '\x1f' + text
+    return by_indicator.where(has_indicator, by_text)
+
+
+def standard_ids(corpus: pd.DataFrame) -> pd.Series:
+    """
+    Stable ID of every standard in the corpus, hashing each distinct key once.
+    Raises ValueError if two different keys hash to the same ID.
+    """
+    keys = id_keys(corpus)
+    ids = corpus['state'].astype(str) + '-' + map_unique(keys, _digest)
+
+    if ids.nunique() != keys.nunique():
+        clashes = pd.DataFrame({'id': ids, 'key': keys}).drop_duplicates().groupby('id')['key'].nunique()
+        raise ValueError(f"Standard ID hash collision for {', '.join(clashes[clashes > 1].index)}; "
+                         f"raise ID_DIGEST_SIZE")
+    return ids
+
+
+def id_report(corpus: pd.DataFrame) -> List[dict]:
+    """
+    Find the IDs worth checking by hand:
+      shared_indicator  one indicator used for standards with different text (each
+                        of them has its own ID; all but the first are keyed on the
+                        text as well)
+      near_collision    indicators of one state that differ only in punctuation or spacing
+    The corpus needs a standard_id column.
+    """
+    report = []
+    frame = pd.DataFrame({
+        'state': corpus['state'].astype(str),
+        'standard_id': corpus['standard_id'],
+        'indicator': map_unique(corpus['indicator'], normalize_indicator),
+        'text': map_unique(corpus['standard'], normalize_text),
+    })
+
+    with_indicator = frame[frame['indicator'] != ''].drop_duplicates()
+    texts = with_indicator.groupby(['state', 'indicator'])['text'].nunique()
+    for state, indicator in texts[texts > 1].index:
+        group = with_indicator[(with_indicator['state'] == state) & (with_indicator['indicator'] == indicator)]
+        report.append({
+            'kind': 'shared_indicator',
+            'state': state,
+            'standard_id': ' '.join(group['standard_id'].drop_duplicates()),
+            'indicators': indicator,
+            'count': len(group),
+        })
+
+    indicators = with_indicator[['state', 'indicator', 'standard_id']].drop_duplicates()
+    indicators = indicators.assign(loose=map_unique(indicators['indicator'], loose_indicator))
+    variants = indicators.groupby(['state', 'loose'])['indicator'].nunique()
+    for state, loose in variants[variants > 1].index:
+        group = indicators[(indicators['state'] == state) & (indicators['loose'] == loose)]
+        report.append({
+            'kind': 'near_collision',
+            'state': state,
+            'standard_id': ' '.join(group['standard_id']),
+            'indicators': ' | '.join(group['indicator']),
+            'count': len(group),
+        })
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report shared and nearly colliding indicators behind the standard IDs")
+    parser.add_argument("--corpus", default="ms_corpus.parquet")
+    parser.add_argument("--output", default="standard_id_report.csv")
+    args = parser.parse_args()
+
+    # merge_corpus imports from this module
+    from merge_corpus import load_corpus
+
+    corpus = load_corpus(args.corpus)
+    report = id_report(corpus)
+
+    with open(args.output, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=['kind', 'state', 'standard_id', 'indicators', 'count'])
+        writer.writeheader()
+        writer.writerows(report)
+
+    shared = sum(1 for entry in report if entry['kind'] == 'shared_indicator')
+    print(f"{corpus['standard_id'].nunique()} IDs for {len(corpus)} standards")
+    print(f"{shared} shared indicator(s), {len(report) - shared} near-collision(s), saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
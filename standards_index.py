@@ -0,0 +1,274 @@
+import argparse
+import math
+import pickle
+import re
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from grades import grade_mask
+from manifest import hash_rows
+from merge_corpus import STANDARD_WIDTH, iter_done_files
+from pipeline import standard_rows
+
+
+# Full-text index over the standard text of every state, to answer questions like
+# "which states mention X in which grades" without grepping 50 CSV files.
+#
+# The index is split into one segment per state. Each segment holds the state's
+# standards (keyword, grade, course, indicator, text) and a posting list per token:
+# token -> {standard number: [word positions]}. Rebuilding only re-tokenizes the
+# states whose rows changed since the last build.
+#
+# Query syntax:
+#   religious freedom          both words (AND)
+#   "religious freedom"        the exact phrase
+#   islam OR muslim            either side
+#   religion -holiday          leave out standards that mention holiday
+
+INDEX_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+QUERY_PATTERN = re.compile(r'(-?)"([^"]*)"|(\S+)')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercase word tokens of a text.
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def build_segment(rows: List[List[str]]) -> dict:
+    """
+    Index one state's standard rows.
+    """
+    standards = []
+    postings = defaultdict(dict)
+
+    for row in rows:
+        keyword, grade, course, indicator, text = (row + [''] * STANDARD_WIDTH)[:STANDARD_WIDTH]
+        number = len(standards)
+        standards.append((keyword, grade, course, indicator, text))
+
+        for position, token in enumerate(tokenize(text)):
+            postings[token].setdefault(number, []).append(position)
+
+    return {'standards': standards, 'postings': dict(postings)}
+
+
+class StandardsIndex:
+    """
+    Inverted index over the standard text of every state, one segment per state.
+    """
+
+    def __init__(self):
+        self.segments = {}
+        self.hashes = {}
+
+    @classmethod
+    def load(cls, path: str) -> 'StandardsIndex':
+        index = cls()
+        path = Path(path)
+        if path.exists():
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+            if data.get('version') == INDEX_VERSION:
+                index.segments = data['segments']
+                index.hashes = data['hashes']
+        return index
+
+    def save(self, path: str) -> None:
+        with open(path, 'wb') as f:
+            pickle.dump({'version': INDEX_VERSION, 'segments': self.segments, 'hashes': self.hashes},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def update(self, state_rows: Iterable[Tuple[str, List[List[str]]]]) -> Tuple[int, int]:
+        """
+        Re-index the states whose rows changed and drop states that are gone.
+        Returns the number of states re-indexed and kept.
+        """
+        rebuilt = kept = 0
+        seen = set()
+
+        for state, rows in state_rows:
+            rows = standard_rows(rows)
+            seen.add(state)
+            rows_hash = hash_rows(rows)
+            if self.hashes.get(state) == rows_hash:
+                kept += 1
+                continue
+
+            self.segments[state] = build_segment(rows)
+            self.hashes[state] = rows_hash
+            rebuilt += 1
+
+        for state in list(self.segments):
+            if state not in seen:
+                del self.segments[state]
+                del self.hashes[state]
+
+        return rebuilt, kept
+
+    def _document_frequency(self, terms: List[List[str]]) -> Dict[Tuple[str, ...], int]:
+        frequency = {}
+        for term in terms:
+            frequency[tuple(term)] = sum(len(self._matches(segment, term)) for segment in self.segments.values())
+        return frequency
+
+    @staticmethod
+    def _matches(segment: dict, term: List[str]) -> Dict[int, int]:
+        """
+        Standards of a segment containing a word or phrase, with the number of occurrences.
+        """
+        postings = segment['postings']
+        if len(term) == 1:
+            return {number: len(positions) for number, positions in postings.get(term[0], {}).items()}
+
+        # Phrase: every word must be present, at consecutive positions
+        lists = [postings.get(token) for token in term]
+        if not all(lists):
+            return {}
+
+        matches = {}
+        for number in set.intersection(*(set(p) for p in lists)):
+            starts = set(lists[0][number])
+            for offset, positions in enumerate(lists[1:], start=1):
+                starts &= {position - offset for position in positions[number]}
+            if starts:
+                matches[number] = len(starts)
+        return matches
+
+    def search(self, query: str, states: Optional[List[str]] = None, grade: Optional[str] = None,
+               keyword: Optional[str] = None, limit: Optional[int] = 20) -> List[dict]:
+        """
+        Run a query and return the matching standards, best first.
+        states filters on state codes; keyword on a case-insensitive substring.
+        grade is read like the grade column ("7", "6-8", "K", see grades), and a
+        standard matches if its grades cover any of those grades, as in corpus_query.
+        """
+        clauses = parse_query(query)
+        if not clauses:
+            return []
+
+        positive_terms = [term for include, _ in clauses for term in include]
+        frequency = self._document_frequency(positive_terms)
+        total = sum(len(segment['standards']) for segment in self.segments.values())
+        idf = {term: math.log(1 + total / (1 + count)) for term, count in frequency.items()}
+
+        wanted_states = {state.upper() for state in states} if states else None
+        wanted_grades = grade_mask(grade) if grade else None
+        keyword = keyword.lower() if keyword else None
+
+        results = []
+        for state, segment in self.segments.items():
+            if wanted_states and state.upper() not in wanted_states:
+                continue
+
+            scores = defaultdict(float)
+            for include, exclude in clauses:
+                # Every included term must match (AND) ...
+                clause_scores = None
+                for term in include:
+                    matches = self._matches(segment, term)
+                    weight = idf[tuple(term)]
+                    term_scores = {number: (1 + math.log(count)) * weight for number, count in matches.items()}
+                    if clause_scores is None:
+                        clause_scores = term_scores
+                    else:
+                        clause_scores = {number: score + term_scores[number]
+                                         for number, score in clause_scores.items() if number in term_scores}
+
+                # ... and no excluded term may
+                for term in exclude:
+                    for number in self._matches(segment, term):
+                        clause_scores.pop(number, None)
+
+                # Clauses are joined with OR
+                for number, score in clause_scores.items():
+                    scores[number] = max(scores[number], score)
+
+            for number, score in scores.items():
+                standard_keyword, standard_grade, course, indicator, text = segment['standards'][number]
+                if wanted_grades is not None and not grade_mask(standard_grade) & wanted_grades:
+                    continue
+                if keyword and keyword not in standard_keyword.lower():
+                    continue
+                results.append({
+                    'state': state, 'keyword': standard_keyword, 'grade': standard_grade,
+                    'course': course, 'indicator': indicator, 'standard': text, 'score': score,
+                })
+
+        results.sort(key=lambda result: (-result['score'], result['state'], result['indicator']))
+        return results[:limit] if limit else results
+
+
+def parse_query(query: str) -> List[Tuple[List[List[str]], List[List[str]]]]:
+    """
+    Split a query into OR clauses of (included terms, excluded terms).
+    A term is a list of tokens: one token for a word, several for a phrase.
+    """
+    clauses = []
+    include, exclude = [], []
+
+    for match in QUERY_PATTERN.finditer(query):
+        negate, phrase, word = match.groups()
+        if word == 'OR':
+            if include:
+                clauses.append((include, exclude))
+            include, exclude = [], []
+            continue
+        if word == 'AND':
+            continue
+
+        if word is not None:
+            negate = word.startswith('-')
+            tokens = tokenize(word)
+        else:
+            tokens = tokenize(phrase)
+
+        if tokens:
+            (exclude if negate else include).append(tokens)
+
+    if include:
+        clauses.append((include, exclude))
+    return clauses
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build and query a full-text index of the standards")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help="build or update the index from the _done.csv files")
+    build.add_argument("--folder", default="ms_2026")
+    build.add_argument("--suffix", default="_MS")
+    build.add_argument("--index", default="ms_index.pkl")
+
+    query = subparsers.add_parser('query', help="search the index")
+    query.add_argument("query", help='e.g. \'"religious freedom" OR islam -holiday\'')
+    query.add_argument("--index", default="ms_index.pkl")
+    query.add_argument("--state", action="append", help="only this state (can be given more than once)")
+    query.add_argument("--grade", help="only standards for these grades, e.g. 7, 6-8 or K")
+    query.add_argument("--keyword", help="only keywords containing this text")
+    query.add_argument("--limit", type=int, default=20)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = StandardsIndex.load(args.index)
+        rebuilt, kept = index.update(iter_done_files(args.folder, args.suffix))
+        index.save(args.index)
+        print(f"Indexed {rebuilt} states, {kept} unchanged, saved to {args.index}")
+        return
+
+    index = StandardsIndex.load(args.index)
+    results = index.search(args.query, args.state, args.grade, args.keyword, args.limit)
+    for result in results:
+        print(f"{result['state']} | {result['grade']} | {result['course']} | {result['indicator']} "
+              f"({result['score']:.2f})")
+        print(f"    {result['standard'][:200]}")
+    print(f"\n{len(results)} result(s)")
+
+
+if __name__ == "__main__":
+    main()
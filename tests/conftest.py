@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The scripts are run from the repository folder, so import them from there
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
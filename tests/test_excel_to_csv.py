@@ -0,0 +1,5 @@
+from excel_to_csv import clean_values
+
+
+def test_clean_values_keeps_equal_values_of_other_types_apart():
+    assert clean_values([True, 1, 1.0, 'x', True]) == ['True', '1', '1', 'x', 'True']
@@ -0,0 +1,29 @@
+import sys
+
+import pytest
+
+import grades
+from merge_corpus import build_corpus, write_corpus
+
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['grades.py', *args])
+    grades.main()
+
+
+def test_grade_option_reads_values_like_the_grade_column(tmp_path, monkeypatch, capsys):
+    corpus_path = str(tmp_path / "corpus.parquet")
+    write_corpus(build_corpus([
+        ("KY", [["Trade", "8", "US History", "8.1", "Explain trade routes."]]),
+        ("OH", [["Trade", "Grade 7", "World History", "", "Describe trade networks."]]),
+    ]), corpus_path)
+
+    run_main(monkeypatch, "--corpus", corpus_path, "--grade", "seventh")
+    assert "OH: 1" in capsys.readouterr().out
+    run_main(monkeypatch, "--corpus", corpus_path, "--grade", "6-8")
+    assert "2 standard(s) for grade 6-8" in capsys.readouterr().out
+
+    for value in ("13", "eighth period"):
+        with pytest.raises(SystemExit):
+            run_main(monkeypatch, "--corpus", corpus_path, "--grade", value)
+        assert "is not a grade" in capsys.readouterr().err
@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from excel_to_csv import iter_workbook_sheets, read_sheet_rows
+from indicator_grammar import DEFAULT_RULES, GrammarRule, IndicatorGrammar, load_grammars
+from pipeline import process_state_rows
+from process_states_cleaner import read_params_file
+from special_case_cleaning import SplitColumn, load_special_rules
+
+
+REPO = Path(__file__).resolve().parent.parent
+WORKBOOK = REPO / "2026-02-27 Middle School Data.xlsx"
+
+
+def read_sheet(name):
+    for sheet, rows in iter_workbook_sheets(str(WORKBOOK)):
+        if sheet == name:
+            return read_sheet_rows(rows)
+    raise KeyError(name)
+
+
+def test_mo_grammar_gives_the_same_rows_as_the_old_special_rule(tmp_path):
+    rows = read_sheet("MO")
+    params = read_params_file(str(REPO / "MS_params.csv"))["MO_MS.csv"]
+    grammars = load_grammars(str(REPO / "MS_indicator_grammar.csv"))
+    special_rules = load_special_rules(str(REPO / "MS_special_rules.csv"))
+    assert "MO_MS" in grammars and "MO_MS" not in special_rules
+
+    # MO before its split moved into the grammar: no split, then the '|' special rule
+    old_params = dict(params, split=False, special=True)
+    old_rules = {"MO_MS": [SplitColumn(3, "|", "blank_before")]}
+    expected = process_state_rows([list(row) for row in rows], "MO_MS", old_params, old_rules, tmp_path)
+
+    assert process_state_rows(rows, "MO_MS", params, special_rules, tmp_path, grammars=grammars) == expected
+
+
+def test_own_rules_are_only_checked_against_each_other():
+    grammar = load_grammars(str(REPO / "MS_indicator_grammar.csv"))["MO_MS"]
+    # The default indicator rule would split at "1.", but MO's pipe rule decides
+    assert grammar.split("1. History | E. Evaluate") == ("1. History ", " E. Evaluate", None)
+
+    rules = [GrammarRule('pipe', r"(?P<code>[^|]*)\|(?P<text>.*)"),
+             GrammarRule('colon', r"(?P<code>[^:|]*): (?P<text>.*)")]
+    grammar = IndicatorGrammar(rules + DEFAULT_RULES, len(rules))
+    assert grammar.split("A: b | c")[2] == ('ambiguous', ['pipe', 'colon'])
@@ -0,0 +1,7 @@
+from merge_corpus import CORPUS_COLUMNS, build_corpus
+
+
+def test_build_corpus_without_rows():
+    corpus = build_corpus([])
+    assert list(corpus.columns) == CORPUS_COLUMNS + ['grade_mask', 'standard_id']
+    assert len(corpus) == 0
@@ -0,0 +1,74 @@
+from output_run import OutputRun, current_files, current_path, glob_current, read_pointer
+
+
+def test_readers_see_the_last_published_run(tmp_path):
+    output_dir = tmp_path / "out"
+    output_dir.mkdir()
+    (output_dir / "a.csv").write_text("old a")
+    (output_dir / "b.csv").write_text("old b")
+
+    with OutputRun(output_dir) as run:
+        (run.directory / "a.csv").write_text("new a")
+        # Not published until the run is done
+        assert current_path(output_dir, "a.csv").read_text() == "old a"
+    assert current_path(output_dir, "a.csv").read_text() == "new a"
+    # Files no run has written are read from the folder itself
+    assert current_path(output_dir, "b.csv").read_text() == "old b"
+    assert [path.read_text() for path in glob_current(output_dir, "*.csv")] == ["new a", "old b"]
+
+    try:
+        with OutputRun(output_dir) as failed:
+            (failed.directory / "a.csv").write_text("half a")
+            (failed.directory / "b.csv").write_text("half b")
+            raise ValueError
+    except ValueError:
+        pass
+    assert {name: path.read_text() for name, path in current_files(output_dir).items()} == \
+        {"a.csv": "new a", "b.csv": "old b"}
+    assert not failed.directory.exists()
+
+
+def test_replaced_runs_are_removed(tmp_path):
+    output_dir = tmp_path / "out"
+    with OutputRun(output_dir) as first:
+        (first.directory / "a.csv").write_text("a 1")
+        (first.directory / "b.csv").write_text("b 1")
+    with OutputRun(output_dir) as second:
+        (second.directory / "a.csv").write_text("a 2")
+
+    assert read_pointer(output_dir) == {"a.csv": second.directory.name, "b.csv": first.directory.name}
+    assert not (first.directory / "a.csv").exists()
+    assert (first.directory / "b.csv").read_text() == "b 1"
+
+    with OutputRun(output_dir) as third:
+        (third.directory / "b.csv").write_text("b 3")
+    assert not first.directory.exists()
+    assert second.directory.exists()
+
+
+def test_resumable_run_keeps_its_files(tmp_path):
+    output_dir = tmp_path / "out"
+    try:
+        with OutputRun(output_dir, resumable=True) as run:
+            (run.directory / "a.csv").write_text("new a")
+            raise KeyboardInterrupt
+    except KeyboardInterrupt:
+        pass
+    assert not current_path(output_dir, "a.csv").exists()
+
+    # A plain run doesn't publish or keep another run's files
+    with OutputRun(output_dir) as plain:
+        assert plain.directory != run.directory
+    assert not run.directory.exists()
+
+    try:
+        with OutputRun(output_dir, resumable=True) as run:
+            (run.directory / "a.csv").write_text("new a")
+            raise KeyboardInterrupt
+    except KeyboardInterrupt:
+        pass
+    with OutputRun(output_dir, resumable=True) as resumed:
+        assert resumed.directory == run.directory
+        assert resumed.path("a.csv") == run.directory / "a.csv"
+    assert current_path(output_dir, "a.csv").read_text() == "new a"
+    assert not (run.directory / ".resumable").exists()
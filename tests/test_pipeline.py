@@ -0,0 +1,84 @@
+import json
+
+from openpyxl import Workbook
+
+from output_run import current_path
+from pipeline import run_pipeline
+
+
+PARAMS = """state,skip,fill,transpose,split,review,special,concat,grade
+KY_MS,0,0,0,0,,1,0,0
+OH_MS,0,0,0,0,,1,0,0
+"""
+
+RULES = """state,operation,columns,value,no_match
+KY_MS,concat_columns,2;3," + ",
+OH_MS,insert_blank_column,3,,
+"""
+
+
+def add_sheet(workbook, state, rows):
+    """
+    A state sheet: the state name, the three metadata rows, then the rows.
+    """
+    sheet = workbook.create_sheet(state)
+    sheet.append([state])
+    for metadata in ("Last updated", "Document length", "Format"):
+        sheet.append([metadata])
+    for row in rows:
+        sheet.append(row)
+
+
+def write_workbook(path):
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    add_sheet(workbook, "KY", [
+        ["Keyword", "Grade", "Course", "Course part", "Indicator", "Standard"],
+        ["Trade", "8", "US History", "Unit 1", "8.1", "Explain trade routes."],
+    ])
+    add_sheet(workbook, "OH", [
+        ["Keyword", "Grade", "Course", "Standard"],
+        ["Trade", "7", "World History", "Describe trade networks."],
+    ])
+    workbook.save(path)
+
+
+def run(tmp_path):
+    run_pipeline(str(tmp_path / "data.xlsx"), str(tmp_path / "params.csv"), str(tmp_path / "out"),
+                 special_rules_file=str(tmp_path / "rules.csv"),
+                 indicator_grammar_file=str(tmp_path / "grammar.csv"))
+
+
+def test_special_rule_edit_rebuilds_only_that_state(tmp_path, capsys):
+    write_workbook(tmp_path / "data.xlsx")
+    (tmp_path / "params.csv").write_text(PARAMS)
+    (tmp_path / "rules.csv").write_text(RULES)
+    (tmp_path / "grammar.csv").write_text("state,name,pattern,fallback\n")
+    run(tmp_path)
+    capsys.readouterr()
+
+    (tmp_path / "rules.csv").write_text(RULES.replace('" + "', '" / "'))
+    run(tmp_path)
+    output = capsys.readouterr().out
+
+    assert "keeping OH_MS_done.csv" in output
+    assert "keeping KY_MS_done.csv" not in output
+    assert "US History / Unit 1" in current_path(tmp_path / "out", "KY_MS_done.csv").read_text()
+
+
+def test_failed_state_withdraws_its_last_done_file(tmp_path):
+    write_workbook(tmp_path / "data.xlsx")
+    (tmp_path / "params.csv").write_text(PARAMS)
+    (tmp_path / "rules.csv").write_text(RULES)
+    (tmp_path / "grammar.csv").write_text("state,name,pattern,fallback\n")
+    run(tmp_path)
+    assert current_path(tmp_path / "out", "KY_MS_done.csv").exists()
+
+    # Without its concat rule KY has text after the fifth column and fails the schema check
+    (tmp_path / "rules.csv").write_text(RULES.replace('KY_MS,concat_columns,2;3," + ",\n', ''))
+    run(tmp_path)
+
+    assert not current_path(tmp_path / "out", "KY_MS_done.csv").exists()
+    assert current_path(tmp_path / "out", "OH_MS_done.csv").exists()
+    report = json.loads(current_path(tmp_path / "out", "run_report.json").read_text())
+    assert "KY_MS" in report['failed']
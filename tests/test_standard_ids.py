@@ -0,0 +1,37 @@
+import pandas as pd
+
+from standard_ids import standard_ids
+
+
+def corpus(rows):
+    return pd.DataFrame(rows, columns=['state', 'course', 'indicator', 'standard'])
+
+
+def test_standard_keeps_its_id_when_its_indicator_gets_a_second_text():
+    before = corpus([
+        ['AL', 'World History', '16B', 'Describe the rise of absolutism.'],
+        ['AL', 'World History', '17', 'Explain the Reformation.'],
+    ])
+    after = corpus([
+        ['AL', 'World History', '16B', 'Describe the rise of absolutism.'],
+        ['AL', 'World History', '16B', 'Compare absolute monarchs.'],
+        ['AL', 'World History', '17', 'Explain the Reformation.'],
+    ])
+
+    before_ids, after_ids = standard_ids(before), standard_ids(after)
+    assert after_ids[0] == before_ids[0]
+    assert after_ids[2] == before_ids[1]
+    assert after_ids.nunique() == 3
+
+
+def test_new_text_in_front_of_the_first_one_takes_the_indicator_id():
+    # The limitation documented in standard_ids: only the first text keeps the indicator's key
+    before = corpus([['AL', 'World History', '16B', 'Describe the rise of absolutism.']])
+    after = corpus([
+        ['AL', 'World History', '16B', 'Compare absolute monarchs.'],
+        ['AL', 'World History', '16B', 'Describe the rise of absolutism.'],
+    ])
+
+    before_ids, after_ids = standard_ids(before), standard_ids(after)
+    assert after_ids[0] == before_ids[0]
+    assert after_ids[1] != before_ids[0]
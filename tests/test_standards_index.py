@@ -0,0 +1,15 @@
+from standards_index import StandardsIndex
+
+
+def test_grade_filter_uses_the_normalized_grades(tmp_path):
+    index = StandardsIndex.load(str(tmp_path / "index.pkl"))
+    index.update([("AA", [
+        ["Keyword", "Grade", "Course", "Indicator", "Standard"],
+        ["Islam", "6-8", "World History", "1.1", "Describe the spread of Islam."],
+        ["Islam", "10", "World History", "2.1", "Explain Islam in the Ottoman Empire."],
+        ["Islam", "1", "Communities", "3.1", "Name holidays of Islam."],
+    ])])
+
+    assert [result['indicator'] for result in index.search("islam", grade="7")] == ["1.1"]
+    assert [result['indicator'] for result in index.search("islam", grade="1")] == ["3.1"]
+    assert index.search("islam", grade="not a grade") == []
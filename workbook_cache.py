@@ -0,0 +1,208 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+import openpyxl
+from openpyxl import load_workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    pa = None
+
+
+# Cache of the raw cell grid of every sheet, so a workbook is only parsed once.
+#
+# Parsing the 2.5 MB workbook with openpyxl is the slowest step of a run. The
+# first time a workbook is read, each sheet's cells are saved as an Arrow IPC
+# file (one string column per sheet column, empty cells as nulls), keyed by a
+# hash of the workbook's content, the sheet name and READER_VERSION; a small
+# JSON file per workbook lists its sheets in order. Later runs (pipeline,
+# batch_runner, snapshot_diff, excel_to_csv) load the sheets from there.
+#
+# The cells are stored before cleaning, as the text str() gives for them (whole
+# numbers without the .0), so the cleaning options still apply when they are
+# read back. Change READER_VERSION when that conversion changes.
+#
+# Files not used for max_age_days are removed, then the least recently used ones
+# until the cache is under max_mb. Needs the pyarrow package; without it every
+# run parses the workbook.
+
+READER_VERSION = f"1-openpyxl-{openpyxl.__version__}"
+CACHE_DIR = ".workbook_cache"
+MAX_CACHE_MB = 500
+MAX_AGE_DAYS = 30
+HASH_CHUNK = 1 << 20
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def raw_text(value) -> Optional[str]:
+    """
+    The text of a raw cell value as it is cached: None for an empty cell,
+    whole-number floats without the trailing .0.
+    """
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def raw_rows(worksheet) -> List[Tuple[Optional[str], ...]]:
+    return [tuple(raw_text(value) for value in row) for row in worksheet.iter_rows(values_only=True)]
+
+
+class WorkbookCache:
+    """
+    Raw sheet grids keyed by workbook content hash + sheet name + reader version.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR, max_mb: float = MAX_CACHE_MB,
+                 max_age_days: float = MAX_AGE_DAYS):
+        self.directory = Path(directory)
+        self.max_bytes = max_mb * 2**20
+        self.max_age = max_age_days * 86400
+
+    def _key(self, *parts: str) -> str:
+        return hashlib.sha256('\x1f'.join(parts + (READER_VERSION,)).encode('utf-8')).hexdigest()[:32]
+
+    def _index_path(self, workbook_hash: str) -> Path:
+        return self.directory / f"{self._key(workbook_hash)}.json"
+
+    def iter_raw_sheets(self, excel_file: str) -> Iterator[Tuple[str, List[Tuple[Optional[str], ...]]]]:
+        """
+        Yield (sheet name, raw rows) for every sheet, from the cache when it has
+        the workbook and from the workbook (filling the cache) when it doesn't.
+        """
+        workbook_hash = file_hash(excel_file)
+        index_path = self._index_path(workbook_hash)
+        sheets = self._cached_sheets(index_path)
+        if sheets is not None:
+            for sheet, name in sheets:
+                yield sheet, self._load(self.directory / name)
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        sheets = []
+        workbook = load_workbook(excel_file, read_only=True, data_only=True, keep_links=False)
+        try:
+            for sheet in workbook.sheetnames:
+                rows = raw_rows(workbook[sheet])
+                name = f"{self._key(workbook_hash, sheet)}.arrow"
+                self._store(self.directory / name, rows)
+                sheets.append((sheet, name))
+                yield sheet, rows
+        finally:
+            workbook.close()
+
+        # The index is written last, so a workbook read only partly is parsed again next time
+        temp_path = index_path.parent / f"temp_{index_path.name}"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'workbook': os.path.basename(excel_file), 'sheets': sheets}, f)
+        os.replace(temp_path, index_path)
+        self.evict()
+
+    def _cached_sheets(self, index_path: Path) -> Optional[List[Tuple[str, str]]]:
+        if not index_path.exists():
+            return None
+        with open(index_path, 'r', encoding='utf-8') as f:
+            sheets = [tuple(entry) for entry in json.load(f)['sheets']]
+        if not all((self.directory / name).exists() for _, name in sheets):
+            return None
+        now = time.time()
+        for path in [index_path] + [self.directory / name for _, name in sheets]:
+            os.utime(path, (now, now))
+        return sheets
+
+    def _store(self, path: Path, rows: List[Tuple[Optional[str], ...]]) -> None:
+        width = max((len(row) for row in rows), default=0)
+        columns = [[row[column] if column < len(row) else None for row in rows] for column in range(width)]
+        table = pa.table({f"c{column}": pa.array(values, type=pa.string()) for column, values in enumerate(columns)})
+        temp_path = path.parent / f"temp_{path.name}"
+        feather.write_feather(table, temp_path, compression='lz4')
+        os.replace(temp_path, path)
+
+    def _load(self, path: Path) -> List[Tuple[Optional[str], ...]]:
+        table = feather.read_table(path, memory_map=True)
+        return list(zip(*(column.to_pylist() for column in table.columns)))
+
+    def evict(self) -> None:
+        """
+        Remove files unused for max_age_days, then the least recently used until under max_mb.
+        """
+        if not self.directory.exists():
+            return
+        now = time.time()
+        files = []
+        for path in self.directory.iterdir():
+            stat = path.stat()
+            if now - stat.st_mtime > self.max_age:
+                path.unlink()
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            path.unlink()
+            total -= size
+
+    def size_mb(self) -> float:
+        if not self.directory.exists():
+            return 0.0
+        return sum(path.stat().st_size for path in self.directory.iterdir()) / 2**20
+
+    def clear(self) -> None:
+        if self.directory.exists():
+            for path in self.directory.iterdir():
+                path.unlink()
+
+
+def open_cache(directory: Optional[str]) -> Optional[WorkbookCache]:
+    """
+    The cache for a --workbook-cache option: None (parse every time) if the
+    option is empty or pyarrow isn't installed.
+    """
+    if not directory:
+        return None
+    if pa is None:
+        print("pyarrow is not installed, the workbook cache is off")
+        return None
+    return WorkbookCache(directory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill or manage the parsed-workbook cache")
+    parser.add_argument("excel_files", nargs='*', help="workbooks to parse into the cache")
+    parser.add_argument("--cache-dir", default=CACHE_DIR)
+    parser.add_argument("--max-mb", type=float, default=MAX_CACHE_MB)
+    parser.add_argument("--max-age-days", type=float, default=MAX_AGE_DAYS)
+    parser.add_argument("--clear", action="store_true", help="empty the cache")
+    args = parser.parse_args()
+
+    cache = WorkbookCache(args.cache_dir, args.max_mb, args.max_age_days)
+    if args.clear:
+        cache.clear()
+    for excel_file in args.excel_files:
+        start = time.perf_counter()
+        sheets = sum(1 for _ in cache.iter_raw_sheets(excel_file))
+        print(f"{excel_file}: {sheets} sheets in {time.perf_counter() - start:.2f}s")
+    cache.evict()
+    print(f"Cache {args.cache_dir}: {cache.size_mb():.1f} MB")
+
+
+if __name__ == "__main__":
+    main()